@@ -0,0 +1,261 @@
+"""Load generator simulating a market maker updating rates every block.
+
+Random walk prices of N tokens are set through Reserve.set_rates at a
+target rate while trades, creating imbalance, are sent by the network
+account. The report gives the throughput, the transaction backlog, the rate
+update lag in blocks and the CPU use for every token count::
+
+    python -m benchmarks.load --tokens 5 20 50 --rate 2 --updates 30
+    python -m benchmarks.load --block-time 1 --output load.json
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+from eth_tester import EthereumTester, PyEVMBackend
+from eth_utils import keccak
+from web3 import Web3, EthereumTesterProvider
+
+from reserve_sdk import Deployer, Reserve
+from reserve_sdk.contract import TokenSpec
+from reserve_sdk.imbalance import ETH_ADDRESS
+from reserve_sdk.nonce import NonceManager
+from reserve_sdk.testing import ERC20_TOKEN_CODE
+from reserve_sdk.utils import call_contract, deploy_contract, token_wei
+
+
+# Gas limit of trades, they may depend on transactions not mined yet.
+TRADE_GAS = 500000
+
+
+class LocalChain:
+    """LocalChain is an eth_tester chain mining every transaction, or
+    mining a block every block_time seconds.
+
+    Requests are serialized, eth_tester does not support concurrent ones.
+    With interval mining, raw transactions are kept in a local mempool until
+    the next block: eth_tester rejects a transaction whose sender already has
+    one waiting.
+    """
+
+    def __init__(self, block_time=None):
+        backend = PyEVMBackend()
+        self.tester = EthereumTester(backend)
+        self.provider = EthereumTesterProvider(self.tester)
+        self.w3 = Web3(self.provider)
+        self.accounts = [self.w3.eth.account.privateKeyToAccount(key.to_hex())
+                         for key in backend.account_keys[:2]]
+        self.block_time = block_time
+        self.__lock = threading.RLock()
+        self.__stopped = threading.Event()
+        self.__mempool = None
+        make_request = self.provider.make_request
+
+        def locked_make_request(method, params):
+            with self.__lock:
+                if (method == 'eth_sendRawTransaction' and
+                        self.__mempool is not None):
+                    raw_tx = Web3.toBytes(hexstr=params[0])
+                    self.__mempool.append(raw_tx)
+                    return {'result': Web3.toHex(keccak(raw_tx))}
+                return make_request(method, params)
+        self.provider.make_request = locked_make_request
+
+    def start_mining(self):
+        """Start interval mining, if a block time is set."""
+        if self.block_time is None:
+            return
+        self.__mempool = []
+        threading.Thread(target=self.__mine, daemon=True).start()
+
+    def stop_mining(self):
+        self.__stopped.set()
+
+    def __mine(self):
+        while not self.__stopped.wait(self.block_time):
+            with self.__lock:
+                # applied in order to the pending block, then mined at once
+                for raw_tx in self.__mempool:
+                    self.tester.backend.send_raw_transaction(raw_tx)
+                self.__mempool = []
+                self.tester.mine_blocks()
+
+
+class LoadGenerator:
+    """LoadGenerator drives rate updates and trades on a local reserve."""
+
+    def __init__(self, num_tokens, block_time=None, volatility=0.01,
+                 trades_per_update=1):
+        """Deploy a reserve listing num_tokens tokens.
+
+        :arg int num_tokens: number of tokens whose rates are updated
+        :arg float block_time: seconds between blocks, every transaction is
+            mined at once if not given
+        :arg float volatility: standard deviation of a price step
+        :arg int trades_per_update: number of trades sent with an update
+        """
+        self.chain = LocalChain(block_time)
+        self.volatility = volatility
+        self.trades_per_update = trades_per_update
+        w3 = self.chain.w3
+        operator, self.network = self.chain.accounts
+
+        addresses = Deployer(self.chain.provider, operator).deploy(
+            self.network.address)
+        self.reserve = Reserve(self.chain.provider, operator, addresses)
+        pricing = self.reserve.pricing
+        pricing.add_operator(operator.address)
+        pricing.set_valid_rate_duration_in_blocks(10**6)
+        self.reserve.fund.enable_trade()
+
+        token_code = ERC20_TOKEN_CODE
+        self.tokens = [
+            deploy_contract(w3, operator, token_code,
+                            ['T{}'.format(i), 'T{}'.format(i), 18])
+            for i in range(num_tokens)
+        ]
+        self.prices = {token: 500.0 for token in self.tokens}
+        flat = ([token_wei(10**6, 18)], [0], [token_wei(10**6, 18)], [0])
+        pricing.add_new_tokens([
+            TokenSpec(token, token_wei(0.0001, 18), token_wei(10**6, 18),
+                      token_wei(10**7, 18), flat, flat, self.rates(token))
+            for token in self.tokens
+        ])
+
+        # fund the reserve and the network account, which trades both ways
+        for token in self.tokens:
+            contract = w3.eth.contract(address=token, abi=token_code.abi)
+            for func in (contract.functions.transfer(addresses.reserve,
+                                                     token_wei(10**6, 18)),
+                         contract.functions.transfer(self.network.address,
+                                                     token_wei(10**5, 18))):
+                call_contract(w3, operator, func)
+            call_contract(w3, self.network, contract.functions.approve(
+                addresses.reserve, token_wei(10**5, 18)))
+        w3.eth.sendTransaction({
+            'from': operator.address, 'to': addresses.reserve,
+            'value': token_wei(1000, 18)})
+        self.trade_nonces = NonceManager()
+
+    def rates(self, token):
+        """Return (buy, sell) rates in wei of the current token price."""
+        price = self.prices[token]
+        return token_wei(price, 18), token_wei(1 / price, 18)
+
+    def step_prices(self):
+        for token in self.tokens:
+            self.prices[token] *= 1 + random.gauss(0, self.volatility)
+
+    def trade(self):
+        """Send a random trade from the network account."""
+        w3 = self.chain.w3
+        token = random.choice(self.tokens)
+        buy = random.random() < 0.5
+        fund = self.reserve.fund.contract.functions
+        if buy:
+            amount = token_wei(0.01, 18)
+            rate = self.reserve.pricing.get_buy_rate(token, amount)
+            func = fund.trade(ETH_ADDRESS, amount, token,
+                              self.network.address, rate, True)
+        else:
+            amount = token_wei(5, 18)
+            rate = self.reserve.pricing.get_sell_rate(token, amount)
+            func = fund.trade(token, amount, ETH_ADDRESS,
+                              self.network.address, rate, True)
+        address = self.network.address
+        with self.trade_nonces.lock(address):
+            nonce = self.trade_nonces.next_nonce(w3, address)
+            tx = func.buildTransaction({
+                'nonce': nonce, 'gas': TRADE_GAS,
+                'value': amount if buy else 0})
+            signed_tx = w3.eth.account.signTransaction(
+                tx, self.network.privateKey)
+            return w3.eth.sendRawTransaction(signed_tx.rawTransaction)
+
+    def run(self, updates, rate):
+        """Send updates at rate per second and report how it went.
+
+        :return: dict of the measures
+        """
+        pricing = self.reserve.pricing
+        metrics = pricing.enable_latency_metrics(confirmations=0)
+        interval = 1 / rate
+        self.chain.start_mining()
+        start_block = self.chain.w3.eth.blockNumber
+        start, start_cpu = time.time(), time.process_time()
+        late, backlogs, trade_hashes = 0, [], []
+
+        for idx in range(updates):
+            delay = start + idx * interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            elif -delay > interval:
+                late += 1
+            self.step_prices()
+            buy_rates, sell_rates = zip(*map(self.rates, self.tokens))
+            pricing.set_rates(self.tokens, buy_rates, sell_rates)
+            for _ in range(self.trades_per_update):
+                trade_hashes.append(self.trade())
+            # updates sent but not included yet
+            backlogs.append(metrics.snapshot()['pending'])
+
+        sent = time.time()
+        trades = pricing.track(trade_hashes)
+        trades.wait()
+        while metrics.snapshot()['pending']:
+            time.sleep(0.1)
+        elapsed, cpu = time.time() - start, time.process_time() - start_cpu
+        self.chain.stop_mining()
+
+        snapshot = metrics.snapshot()
+        blocks = self.chain.w3.eth.blockNumber - start_block
+        return {
+            'tokens': len(self.tokens),
+            'updates': updates,
+            'target_rate': rate,
+            'updates_per_second': updates / (sent - start),
+            'updates_per_block': updates / max(blocks, 1),
+            'late_updates': late,
+            'backlog_max': max(backlogs),
+            'lag_blocks': snapshot['blocks'],
+            'lag_seconds': snapshot['seconds'],
+            'failed_updates': snapshot['failed'],
+            'trades': len(trade_hashes),
+            'failed_trades': len(trades.failures()),
+            'cpu_ratio': cpu / elapsed,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tokens', type=int, nargs='+', default=[5, 20],
+                        help='token counts to run with')
+    parser.add_argument('--updates', type=int, default=20,
+                        help='number of rate updates per run')
+    parser.add_argument('--rate', type=float, default=2,
+                        help='target rate updates per second')
+    parser.add_argument('--block-time', type=float,
+                        help='mine a block every given seconds instead of '
+                             'every transaction')
+    parser.add_argument('--trades', type=int, default=1,
+                        help='trades sent with every update')
+    parser.add_argument('--output', help='JSON file to write reports to')
+    args = parser.parse_args()
+
+    random.seed(0)
+    reports = []
+    for num_tokens in args.tokens:
+        generator = LoadGenerator(num_tokens, args.block_time,
+                                  trades_per_update=args.trades)
+        report = generator.run(args.updates, args.rate)
+        reports.append(report)
+        print(json.dumps(report, sort_keys=True))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""Benchmarks of reserve_sdk hot paths on a local eth_tester chain.
+
+Every benchmark reports its wall time, the JSON-RPC requests and gas used
+per operation and the peak memory allocated by an operation. Run it from
+the repository root::
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --output new.json --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+from eth_tester import EthereumTester, PyEVMBackend
+from web3 import Web3, EthereumTesterProvider
+
+from reserve_sdk import Deployer, Reserve
+from reserve_sdk.contract import (
+    TokenIndex, TokenSpec, RateBatch, get_compact_data, build_compact_price)
+from reserve_sdk.testing import ERC20_TOKEN_CODE
+from reserve_sdk.utils import deploy_contract, token_wei
+
+
+NETWORK_ADDR = '0x91a502C678605fbCe581eae053319747482276b9'
+
+
+class RequestProbe:
+    """RequestProbe counts requests reaching a provider, from any web3
+    instance, and the transactions sent through it.
+    """
+
+    def __init__(self, provider):
+        self.count = 0
+        self.tx_hashes = []
+        make_request = provider.make_request
+
+        def counting_make_request(method, params):
+            self.count += 1
+            response = make_request(method, params)
+            if method == 'eth_sendRawTransaction' and 'result' in response:
+                self.tx_hashes.append(response['result'])
+            return response
+        provider.make_request = counting_make_request
+
+    def reset(self):
+        self.count = 0
+        self.tx_hashes = []
+
+
+class Bench:
+    """Bench runs benchmarks on a fresh eth_tester chain."""
+
+    def __init__(self, repeat_scale=1):
+        backend = PyEVMBackend()
+        self.provider = EthereumTesterProvider(EthereumTester(backend))
+        self.w3 = Web3(self.provider)
+        self.account = self.w3.eth.account.privateKeyToAccount(
+            backend.account_keys[0].to_hex())
+        self.probe = RequestProbe(self.provider)
+        self.repeat_scale = repeat_scale
+        self.results = []
+        self.token_code = ERC20_TOKEN_CODE
+
+    def run(self, name, params, operation, repeat):
+        """Run operation repeat times and record its measures."""
+        repeat = max(1, int(repeat * self.repeat_scale))
+        seconds, requests, gas = [], 0, 0
+        for _ in range(repeat):
+            self.probe.reset()
+            start = time.perf_counter()
+            operation()
+            seconds.append(time.perf_counter() - start)
+            requests += self.probe.count
+            gas += sum(self.w3.eth.getTransactionReceipt(tx_hash)['gasUsed']
+                       for tx_hash in self.probe.tx_hashes)
+
+        # memory is measured apart, tracing slows the operation down
+        tracemalloc.start()
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        result = {
+            'name': name,
+            'params': params,
+            'repeat': repeat,
+            'seconds_mean': sum(seconds) / repeat,
+            'seconds_min': min(seconds),
+            'rpc_per_op': requests / repeat,
+            'gas_per_op': gas / repeat,
+            'peak_memory_kb': peak / 1024,
+        }
+        self.results.append(result)
+        print('{name} {params}: {seconds_mean:.4f}s, {rpc_per_op:.1f} rpc, '
+              '{gas_per_op:.0f} gas, {peak_memory_kb:.0f} KB'.format(
+                  **result))
+        return result
+
+    def deploy_reserve(self):
+        addresses = Deployer(self.provider, self.account).deploy(
+            NETWORK_ADDR)
+        reserve = Reserve(self.provider, self.account, addresses)
+        reserve.pricing.add_operator(self.account.address)
+        reserve.pricing.set_valid_rate_duration_in_blocks(1000)
+        return reserve
+
+    def list_tokens(self, reserve, count):
+        tokens = [
+            deploy_contract(self.w3, self.account, self.token_code,
+                            ['T{}'.format(i), 'T{}'.format(i), 18])
+            for i in range(count)
+        ]
+        flat = ([token_wei(10**6, 18)], [0], [token_wei(10**6, 18)], [0])
+        reserve.pricing.add_new_tokens([
+            TokenSpec(token, token_wei(0.0001, 18), token_wei(439.79, 18),
+                      token_wei(922.36, 18), flat, flat,
+                      (token_wei(500, 18), token_wei(0.002, 18)))
+            for token in tokens
+        ])
+        return tokens
+
+
+def bench_compact_data(bench, sizes):
+    for size in sizes:
+        tokens = ['token{}'.format(i) for i in range(size)]
+        token_indices = {token: TokenIndex(*divmod(idx, 14))
+                         for idx, token in enumerate(tokens)}
+        rates = [(random.uniform(400, 600), random.uniform(400, 600))
+                 for _ in tokens]
+
+        def compact_data():
+            return [get_compact_data(rate, base) for rate, base in rates]
+
+        prices = [{
+            'token': token,
+            'compact_buy': data.compact,
+            'compact_sell': data.compact
+        } for token, data in zip(tokens, compact_data())]
+
+        bench.run('get_compact_data', {'tokens': size}, compact_data, 20)
+        bench.run('build_compact_price', {'tokens': size},
+                  lambda: build_compact_price(prices, token_indices), 20)
+
+        bases = [base for _, base in rates]
+        batch = RateBatch(tokens, [rate for rate, _ in rates],
+                          [rate for rate, _ in rates])
+
+        def compact_batch():
+            return get_compact_data(batch, (bases, bases))
+
+        compact_batch()
+        bench.run('get_compact_data', {'tokens': size, 'batch': True},
+                  compact_batch, 20)
+        bench.run('build_compact_price', {'tokens': size, 'batch': True},
+                  lambda: build_compact_price(batch, token_indices), 20)
+
+
+def bench_deploy(bench):
+    bench.run('deploy', {}, lambda: Deployer(
+        bench.provider, bench.account).deploy(NETWORK_ADDR), 3)
+
+
+def bench_set_rates(bench, sizes):
+    for size in sizes:
+        reserve = bench.deploy_reserve()
+        tokens = bench.list_tokens(reserve, size)
+        rates = {token: [token_wei(500, 18), token_wei(0.002, 18)]
+                 for token in tokens}
+
+        def set_rates():
+            # random walk, with some rates leaving the compact data range
+            for token in tokens:
+                step = random.choice([0.99, 1.01, 1.2])
+                rates[token] = [int(rate * step) for rate in rates[token]]
+            reserve.pricing.set_rates(
+                tokens, [rates[t][0] for t in tokens],
+                [rates[t][1] for t in tokens])
+
+        bench.run('set_rates', {'tokens': size}, set_rates, 5)
+
+
+def bench_reads(bench):
+    reserve = bench.deploy_reserve()
+    token = bench.list_tokens(reserve, 1)[0]
+    bench.run('get_balance', {},
+              lambda: reserve.fund.get_balance(token), 50)
+    bench.run('get_buy_rate', {},
+              lambda: reserve.pricing.get_buy_rate(token, 10**17), 50)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(__file__)).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print the measures of results relative to a baseline."""
+    def key(result):
+        return result['name'], json.dumps(result['params'], sort_keys=True)
+
+    previous = {key(result): result for result in baseline['results']}
+    print('\nrelative to {}:'.format(baseline.get('commit')))
+    for result in results['results']:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        print('{} {}: time x{:.2f}, rpc {:+.1f}, gas {:+.0f}'.format(
+            result['name'], result['params'],
+            result['seconds_mean'] / old['seconds_mean'],
+            result['rpc_per_op'] - old['rpc_per_op'],
+            result['gas_per_op'] - old['gas_per_op']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='JSON file to write results to')
+    parser.add_argument('--compare', help='JSON results to compare with')
+    parser.add_argument('--quick', action='store_true',
+                        help='fewer repetitions and smaller sizes')
+    args = parser.parse_args()
+
+    random.seed(0)
+    bench = Bench(repeat_scale=0.2 if args.quick else 1)
+    bench_compact_data(bench, [10, 100] if args.quick else [10, 100, 1000])
+    bench_deploy(bench)
+    bench_set_rates(bench, [1, 10] if args.quick else [1, 10, 50])
+    bench_reads(bench)
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'time': time.time(),
+        'results': bench.results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
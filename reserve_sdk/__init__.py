@@ -2,3 +2,4 @@ from .deployer import Deployer
 from .contract import (
     ReserveContract, ConversionRatesContract, SanityRatesContract, Reserve)
 from .addresses import Addresses
+from .fleet import ReserveFleet
@@ -0,0 +1,34 @@
+class AccountPool:
+    """AccountPool spreads transactions over several accounts.
+
+    Every account has its own nonce sequence, transactions of different
+    accounts are mined independently. A transaction is routed by a key, a
+    token address or a compact data array index, to always the same account,
+    so transactions of a key are mined in the order they are sent.
+    """
+
+    def __init__(self, accounts):
+        """Create an AccountPool.
+
+        :arg list accounts: the local accounts signing transactions
+        :raise ValueError: if no account is given
+        """
+        if not accounts:
+            raise ValueError('account pool is empty')
+        self.accounts = list(accounts)
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def lane(self, key):
+        """Return the index of the account of key.
+
+        :arg key: a token address, or a compact data array index
+        """
+        if isinstance(key, str):
+            key = int(key, 16)
+        return key % len(self.accounts)
+
+    def account_for(self, key):
+        """Return the account sending the transactions of key."""
+        return self.accounts[self.lane(key)]
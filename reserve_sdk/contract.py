@@ -1,16 +1,209 @@
-from collections import namedtuple
+import itertools
+import threading
+import time
+from array import array
+from collections import namedtuple, OrderedDict
 from concurrent import futures
 
 from web3 import Web3
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from .contract_code import (
     RESERVE_CODE, CONVERSION_RATES_CODE, SANITY_RATES_CODE)
+from .gas import (
+    estimate_rate_update_gas, OVERFLOW_GAS, ADD_TOKEN_GAS_LIMIT,
+    SET_TOKEN_CONTROL_INFO_GAS_LIMIT, ENABLE_TOKEN_TRADE_GAS_LIMIT,
+    step_function_gas_limit, initial_rates_gas_limit)
+from .accounts import AccountPool
+from .error import WithdrawRejected, AccountNotOperator
+from .imbalance import ImbalanceTracker
+from .metrics import (
+    RPCCounter, LatencyMetrics, READS_DONE, SIGNED, BROADCAST, INCLUDED,
+    CONFIRMED)
+from .nonce import NonceManager
+from .read_cache import ReadCache
+from .receipts import ReceiptTracker
+from .roles import RoleCache
+from .sanity import SanitySync
+from .state_cache import (
+    BASE_RATES, CONTROL_INFO, QTY_STEP_FUNCTION, IMBALANCE_STEP_FUNCTION)
 from .utils import hexlify, call_contract
+from .withdraw import WithdrawApprovals, withdraw_key
 
 
 """Show token position in the compact data."""
 TokenIndex = namedtuple('TokenIndex', ('array_idx', 'field_idx'))
 CompactData = namedtuple('CompactData', ('base', 'compact', 'base_changed'))
+"""Transactions chosen to set an update of rates.
+
+    * strategy: name of the chosen combination
+    * updates: list of price lists, one per transaction
+    * gas: the estimated gas used by the transactions
+    * gas_saved: the estimated gas of a single transaction minus the gas of
+      the chosen transactions, negative if they cost more
+    * expected_overflow_cost: the expected cost of the tokens left about to
+      overflow in later updates, not included in gas or gas_saved
+"""
+RatePlan = namedtuple('RatePlan', (
+    'strategy', 'updates', 'gas', 'gas_saved', 'expected_overflow_cost'))
+
+ControlInfo = namedtuple('ControlInfo', (
+    'minimal_record_resolution', 'max_per_block_imbalance',
+    'max_total_imbalance'))
+"""State of a listed token on pricing contract.
+
+    * index: TokenIndex of token in compact data
+    * listed, enabled: the token basic data
+    * control_info: ControlInfo of token
+    * base_buy, base_sell: the base rates
+    * compact_buy, compact_sell: the signed compact offsets
+    * rate_update_block: the block number rates were last updated at
+"""
+TokenState = namedtuple('TokenState', (
+    'index', 'listed', 'enabled', 'control_info', 'base_buy', 'base_sell',
+    'compact_buy', 'compact_sell', 'rate_update_block'))
+"""Snapshot of the pricing state of a reserve.
+
+    * block_number: the block the state was read at
+    * tokens: OrderedDict of token address to TokenState, in listing order
+    * elapsed: the time spent reading the state, in seconds
+    * rpc_count: the number of JSON-RPC requests made
+"""
+ReserveState = namedtuple('ReserveState', (
+    'block_number', 'tokens', 'elapsed', 'rpc_count'))
+"""Settings of a token to list on pricing contract.
+
+    * token: the token address
+    * minimal_record_resolution, max_per_block_imbalance,
+      max_total_imbalance: the token control info
+    * qty_step_function, imbalance_step_function: optional
+      (x_buy, y_buy, x_sell, y_sell) step functions
+    * rates: optional initial (buy, sell) rates
+"""
+TokenSpec = namedtuple('TokenSpec', (
+    'token', 'minimal_record_resolution', 'max_per_block_imbalance',
+    'max_total_imbalance', 'qty_step_function', 'imbalance_step_function',
+    'rates'))
+TokenSpec.__new__.__defaults__ = (None, None, None)
+
+# Compact values from this offset are considered about to overflow.
+REBASE_THRESHOLD = 96
+# Number of tokens in one bytes14 compact data array.
+TOKENS_PER_ARRAY = 14
+# Number of blocks whose sampled rates are kept.
+RATE_CACHE_BLOCKS = 8
+
+
+class RateBatch:
+    """RateBatch holds the price data of many tokens in parallel columns.
+
+    It is the columnar form of a list of build_price dicts: row i of every
+    column belongs to tokens[i]. Rates and base rates are uint256 values and
+    are kept in lists, compact values and base_changed flags in byte arrays.
+
+    A new batch sets every rate as base rate, get_compact_data fills the
+    base, compact and base_changed columns from the current base rates.
+    """
+
+    __slots__ = ('tokens', 'buy_rates', 'sell_rates', 'base_buy',
+                 'base_sell', 'compact_buy', 'compact_sell', 'base_changed')
+
+    def __init__(self, tokens, buy_rates, sell_rates):
+        """Create a RateBatch.
+
+        :arg list(str) tokens: the token addresses
+        :arg list(int) buy_rates: the new buy rates
+        :arg list(int) sell_rates: the new sell rates
+        """
+        self.tokens = list(tokens)
+        self.buy_rates = list(buy_rates)
+        self.sell_rates = list(sell_rates)
+        size = len(self.tokens)
+        self.base_buy = list(self.buy_rates)
+        self.base_sell = list(self.sell_rates)
+        self.compact_buy = array('B', bytes(size))
+        self.compact_sell = array('B', bytes(size))
+        self.base_changed = array('B', b'\x01' * size)
+
+    @classmethod
+    def from_prices(cls, prices):
+        """Create a RateBatch from a list of build_price dicts.
+
+        The new rates are not part of price data, the base rates are used.
+        """
+        batch = cls([p['token'] for p in prices],
+                    [p.get('base_buy') for p in prices],
+                    [p.get('base_sell') for p in prices])
+        batch.compact_buy = array('B', [p['compact_buy'] for p in prices])
+        batch.compact_sell = array('B', [p['compact_sell'] for p in prices])
+        batch.base_changed = array(
+            'B', [bool(p.get('base_changed')) for p in prices])
+        return batch
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def to_prices(self):
+        """Return the batch as a list of build_price dicts."""
+        return [{
+            'token': self.tokens[i],
+            'base_buy': self.base_buy[i],
+            'base_sell': self.base_sell[i],
+            'compact_buy': self.compact_buy[i],
+            'compact_sell': self.compact_sell[i],
+            'base_changed': bool(self.base_changed[i])
+        } for i in range(len(self.tokens))]
+
+    def take(self, indices):
+        """Return a new RateBatch of the rows at given indices."""
+        batch = RateBatch.__new__(RateBatch)
+        for name in RateBatch.__slots__:
+            column = getattr(self, name)
+            values = [column[i] for i in indices]
+            if isinstance(column, array):
+                values = array(column.typecode, values)
+            setattr(batch, name, values)
+        return batch
+
+    def rebased(self, indices):
+        """Return a copy setting the rates of given rows as base rates."""
+        batch = self.take(range(len(self.tokens)))
+        for i in indices:
+            batch.base_buy[i] = batch.buy_rates[i]
+            batch.base_sell[i] = batch.sell_rates[i]
+            batch.compact_buy[i] = 0
+            batch.compact_sell[i] = 0
+            batch.base_changed[i] = 1
+        return batch
+
+
+def _compact_of(rate, base):
+    """Return the CompactData of one rate against its base rate."""
+    if base == 0:
+        return CompactData(rate, 0, base_changed=(base != rate))
+
+    compact = int((rate/base - 1) * 1000)
+    if compact <= -128 or compact >= 127:  # not fit in a byte
+        return CompactData(rate, 0, base_changed=True)
+    # handle negative value to convert to byte
+    return CompactData(base, compact % 256, base_changed=False)
+
+
+def _compact_column(rates, bases, compacts, changed):
+    """Compute compact values of rates in place, with the rule of
+    _compact_of, and return the new bases."""
+    new_bases = []
+    for i, (rate, base) in enumerate(zip(rates, bases)):
+        data = _compact_of(rate, base)
+        new_bases.append(data.base)
+        compacts[i] = data.compact
+        if data.base_changed:
+            changed[i] = 1
+    return new_bases
 
 
 def get_compact_data(rate, base):
@@ -18,31 +211,48 @@ def get_compact_data(rate, base):
     Calculate compact data from new rate and base rate.
 
     Args:
-        rate: value of new sell/buy price
-        base: value of current sell/buy price at contract
+        rate: value of new sell/buy price, or a RateBatch
+        base: value of current sell/buy price at contract, or a
+            (base_buy, base_sell) pair of lists for a RateBatch
 
     Returns:
         compact_data which include new base rate & compact value which is the
         different between rate and base in bps unit.
+        For a RateBatch, its base, compact and base_changed columns are
+        computed in place and the batch is returned.
     """
-    if base == 0:
-        return CompactData(rate, 0, base_changed=(base != rate))
+    if isinstance(rate, RateBatch):
+        batch = rate
+        base_buy, base_sell = base
+        changed = array('B', bytes(len(batch)))
+        batch.base_buy = _compact_column(
+            batch.buy_rates, base_buy, batch.compact_buy, changed)
+        batch.base_sell = _compact_column(
+            batch.sell_rates, base_sell, batch.compact_sell, changed)
+        batch.base_changed = changed
+        return batch
 
-    compact = int((rate/base - 1) * 1000)
-    if compact <= -128 or compact >= 127:  # not fit in a byte
-        return CompactData(rate, 0, base_changed=True)
-    else:
-        # handle negative value to convert to byte
-        if compact < 0:
-            compact += 256
-        return CompactData(base, compact, base_changed=False)
+    return _compact_of(rate, base)
+
+
+def _as_rate_batch(prices):
+    if isinstance(prices, RateBatch):
+        return prices
+    return RateBatch.from_prices(prices)
+
+
+def _take(prices, indices):
+    if isinstance(prices, RateBatch):
+        return prices.take(indices)
+    return [prices[i] for i in indices]
 
 
 def build_compact_price(prices, token_indices):
     """Prepare compact price to setCompactData through pricing contract.
 
     Args:
-        prices: price change in bps unit
+        prices: price change in bps unit, a list of price data or a
+            RateBatch
         token_indices: index of token in compact data on contract
 
     Return:
@@ -50,63 +260,288 @@ def build_compact_price(prices, token_indices):
         sell: sell prices change in bps unit, encoded in hex
         indices: the index of block token in compact data on contract
     """
-    result = {}
-
-    for p in prices:
-        array_idx = token_indices[p['token']].array_idx
-        field_idx = token_indices[p['token']].field_idx
+    if isinstance(prices, RateBatch):
+        rows = zip(prices.tokens, prices.compact_buy, prices.compact_sell)
+    else:
+        rows = ((p['token'], p['compact_buy'], p['compact_sell'])
+                for p in prices)
 
+    result = OrderedDict()
+    for token, compact_buy, compact_sell in rows:
+        array_idx, field_idx = token_indices[token]
         if array_idx not in result:
-            result[array_idx] = {
-                'buy': [0] * 14,
-                'sell': [0] * 14
-            }
-
-        result[array_idx]['buy'][field_idx] = p['compact_buy']
-        result[array_idx]['sell'][field_idx] = p['compact_sell']
+            result[array_idx] = (bytearray(TOKENS_PER_ARRAY),
+                                 bytearray(TOKENS_PER_ARRAY))
+        buy, sell = result[array_idx]
+        buy[field_idx] = compact_buy
+        sell[field_idx] = compact_sell
 
     buy = []
     sell = []
     indices = []
 
-    for k, v in result.items():
-        buy.append(hexlify(v['buy']))
-        sell.append(hexlify(v['sell']))
+    for k, (v_buy, v_sell) in result.items():
+        buy.append(hexlify(v_buy))
+        sell.append(hexlify(v_sell))
         indices.append(k)
 
     return buy, sell, indices
 
 
+def split_prices(prices, token_indices, max_gas):
+    """Split prices into updates whose estimated gas is under max_gas.
+
+    Prices of tokens sharing a compact data array are always kept in the same
+    update, an array exceeding max_gas on its own is sent alone.
+
+    Args:
+        prices: list of price data, as returned by build_price, or a
+            RateBatch
+        token_indices: index of token in compact data on contract
+        max_gas: the gas ceiling of an update
+
+    Returns:
+        list of price lists, or of RateBatch, ordered by compact data array
+        index.
+    """
+    batch = _as_rate_batch(prices)
+    arrays = {}
+    for i, token in enumerate(batch.tokens):
+        arrays.setdefault(token_indices[token].array_idx, []).append(i)
+
+    chunks = []
+    chunk, num_base_tokens, num_arrays = [], 0, 0
+    for array_idx in sorted(arrays):
+        array_rows = arrays[array_idx]
+        array_base_tokens = sum(
+            1 for i in array_rows if batch.base_changed[i])
+        gas = estimate_rate_update_gas(
+            num_base_tokens + array_base_tokens, num_arrays + 1)
+        if chunk and gas > max_gas:
+            chunks.append(chunk)
+            chunk, num_base_tokens, num_arrays = [], 0, 0
+        chunk = chunk + array_rows
+        num_base_tokens += array_base_tokens
+        num_arrays += 1
+
+    if chunk:
+        chunks.append(chunk)
+    return [_take(prices, chunk) for chunk in chunks]
+
+
+def compact_to_offset(compact):
+    """Convert a compact value byte to its signed offset."""
+    return compact - 256 if compact >= 128 else compact
+
+
+def rebase_price(price, buy, sell):
+    """Return price data setting given rates as new base rates."""
+    return {
+        'token': price['token'],
+        'base_buy': buy,
+        'base_sell': sell,
+        'compact_buy': 0,
+        'compact_sell': 0,
+        'base_changed': True
+    }
+
+
+def plan_rate_update(prices, rates, token_indices,
+                     rebase_threshold=REBASE_THRESHOLD):
+    """Choose the cheapest combination of transactions setting prices.
+
+    The candidates are:
+
+        * single: one setBaseRate or setCompactData transaction
+        * rebase: a single transaction also re-basing tokens whose compact
+          offset reached rebase_threshold, if a base rate is changed anyway
+        * rebase_arrays: a single transaction re-basing every token of the
+          arrays holding base changed tokens
+
+    The cost of a candidate is its estimated gas plus the expected cost of
+    the tokens left about to overflow.
+
+    Args:
+        prices: list of price data, as returned by build_price, or a
+            RateBatch
+        rates: dict of token address to new (buy, sell) rates, may be None
+            for a RateBatch, which holds the new rates
+        token_indices: index of token in compact data on contract
+        rebase_threshold: compact offset considered about to overflow
+
+    Returns:
+        RatePlan of the cheapest candidate, whose updates are price lists or
+        RateBatch, as prices is.
+    """
+    batch = _as_rate_batch(prices)
+    array_of = [token_indices[token].array_idx for token in batch.tokens]
+    near_overflow = set(
+        i for i, (changed, buy, sell) in enumerate(zip(
+            batch.base_changed, batch.compact_buy, batch.compact_sell))
+        if not changed and max(
+            abs(compact_to_offset(buy)), abs(compact_to_offset(sell))
+        ) >= rebase_threshold)
+
+    # a candidate update is a list of rows and the set of rows re-based
+    def gas_of(updates):
+        return sum(estimate_rate_update_gas(
+            sum(1 for i in rows if i in rebase or batch.base_changed[i]),
+            len(set(array_of[i] for i in rows))
+        ) for rows, rebase in updates)
+
+    def overflow_cost_of(updates):
+        return OVERFLOW_GAS * sum(
+            1 for rows, rebase in updates for i in rows
+            if i in near_overflow and i not in rebase)
+
+    def cost_of(updates):
+        return gas_of(updates) + overflow_cost_of(updates)
+
+    def build(rows, rebase):
+        if not isinstance(prices, RateBatch):
+            return [rebase_price(prices[i], *rates[prices[i]['token']])
+                    if i in rebase else prices[i] for i in rows]
+        if rebase:
+            return prices.rebased(rebase).take(rows)
+        if len(rows) == len(prices):
+            return prices
+        return prices.take(rows)
+
+    all_rows = list(range(len(batch)))
+    candidates = [('single', [(all_rows, set())])]
+    base_arrays = set(array_of[i] for i in all_rows if batch.base_changed[i])
+    if base_arrays:
+        base_rows = [i for i in all_rows if array_of[i] in base_arrays]
+        candidates.append(('rebase', [(all_rows, near_overflow)]))
+        candidates.append(('rebase_arrays', [(all_rows, set(base_rows))]))
+
+    single_gas = gas_of(candidates[0][1])
+    strategy, updates = min(candidates, key=lambda c: cost_of(c[1]))
+    gas = gas_of(updates)
+    return RatePlan(strategy, [build(*update) for update in updates],
+                    gas, single_gas - gas, overflow_cost_of(updates))
+
+
 class BaseContract:
     """BaseContract contains common methods for all contracts of a KyberNetwork
     reserve.
     """
 
-    def __init__(self, provider, account, address, abi):
-        """Create new BaseContract instance."""
+    def __init__(self, provider, account, address, abi, nonce_manager=None):
+        """Create new BaseContract instance.
+
+        :arg nonce_manager: NonceManager shared with other contracts signing
+            with the same accounts, a new one is created if not given
+        """
         self.w3 = Web3(provider)
         self.contract = self.w3.eth.contract(address=address, abi=abi)
         self.account = account
         self.w3.eth.defaultAccount = account.address
+        self.nonce_manager = nonce_manager or NonceManager()
+        self.rpc_counter = RPCCounter()
+        self.w3.middleware_stack.add(self.rpc_counter)
+        self.receipt_tracker = ReceiptTracker(self.w3)
+        self.read_cache = None
+        self.role_cache = None
+        self.account_pool = None
+
+    def enable_account_pool(self, accounts):
+        """Send routed transactions from several operator accounts, each
+        with its own nonce sequence.
+
+        :arg list accounts: the local accounts of the pool
+        :return: the AccountPool
+        :raise AccountNotOperator: if any account is not operator of the
+            contract, its addresses attribute lists them
+        """
+        operators = self.operators()
+        missing = [account.address for account in accounts
+                   if account.address not in operators]
+        if missing:
+            raise AccountNotOperator(missing)
+        self.account_pool = AccountPool(accounts)
+        return self.account_pool
+
+    def account_for(self, route=None):
+        """Return the account sending transactions of route, the account
+        of the contract if there is no account pool or route."""
+        if self.account_pool is None or route is None:
+            return self.account
+        return self.account_pool.account_for(route)
+
+    def enable_role_cache(self, sync_interval=1):
+        """Keep roles of contract in memory, updated from role events.
+
+        :arg float sync_interval: time between two polls of role events, in
+            seconds
+        :return: the RoleCache
+        """
+        self.role_cache = RoleCache(self.w3, self.contract, sync_interval)
+        return self.role_cache
+
+    def enable_read_cache(self, read_cache=None):
+        """Cache results of read functions.
+
+        :arg read_cache: ReadCache shared with other contracts, a new one is
+            created if not given
+        :return: the ReadCache
+        """
+        self.read_cache = read_cache or ReadCache()
+        return self.read_cache
+
+    def read(self, func, block_number=None):
+        """Call a read function of contract, through the read cache if
+        enabled.
+
+        :arg func: the contract function with parameters
+        :arg int block_number: the block the result is read at, default to
+            the latest block
+        """
+        if self.read_cache is None:
+            if block_number is None:
+                return func.call()
+            return func.call(block_identifier=block_number)
+        return self.read_cache.call(
+            self.w3, self.contract.address, func, block_number)
 
     def admin(self):
         """Get current admin address of contract."""
-        return self.contract.functions.admin().call()
+        if self.role_cache is not None:
+            return self.role_cache.admin()
+        return self.read(self.contract.functions.admin())
 
     def pending_admin(self):
         """Get pending admin address of contract.
         An admin address is placed in pending if it is tranfered but
         hasnt been claimed yet.
         """
-        return self.contract.functions.pendingAdmin().call()
+        if self.role_cache is not None:
+            return self.role_cache.pending_admin()
+        return self.read(self.contract.functions.pendingAdmin())
 
     def operators(self):
         """Get operator addresses of contract."""
-        return self.contract.functions.getOperators().call()
+        if self.role_cache is not None:
+            return self.role_cache.operators()
+        return self.read(self.contract.functions.getOperators())
 
     def alerters(self):
         """Get alerter addresses of contract."""
-        return self.contract.functions.getAlerters().call()
+        if self.role_cache is not None:
+            return self.role_cache.alerters()
+        return self.read(self.contract.functions.getAlerters())
+
+    def is_admin(self, address=None):
+        """Return true if address, default to the account, is admin."""
+        return (address or self.account.address) == self.admin()
+
+    def is_operator(self, address=None):
+        """Return true if address, default to the account, is operator."""
+        return (address or self.account.address) in self.operators()
+
+    def is_alerter(self, address=None):
+        """Return true if address, default to the account, is alerter."""
+        return (address or self.account.address) in self.alerters()
 
     def transfer_admin(self, address):
         """Transfer admin privilege to given address.
@@ -173,25 +608,105 @@ class BaseContract:
         self.account = account
         self.w3.eth.defaultAccount = account.address
 
-    def call_contract_func(self, func):
+    def call_contract_func(self, func, gas=None, on_signed=None, route=None):
         """Send transaction to execute contract function.
 
         :arg function func: The contract function with parameters
+        :arg int gas: The gas limit, estimated if not given
+        :arg on_signed: function called with the signed transaction before
+            it is broadcast
+        :arg route: token address or compact data array index the
+            transaction is routed by, when an account pool is enabled
         :return: The transaction hash
         """
-        return call_contract(self.w3, self.account, func)
+        account = self.account_for(route)
+        address = account.address
+        with self.nonce_manager.lock(address):
+            nonce = self.nonce_manager.next_nonce(self.w3, address)
+            try:
+                return call_contract(
+                    self.w3, account, func, nonce=nonce, gas=gas,
+                    on_signed=on_signed)
+            except Exception:
+                self.nonce_manager.reset(address)
+                raise
+
+    def track(self, tx_hashes):
+        """Track transactions sent by this contract.
+
+        :arg tx_hashes: a transaction hash or a list of transaction hashes
+        :return: a concurrent.futures.Future resolved with the receipt of a
+            single transaction, or a TxBatch for a list
+        """
+        if isinstance(tx_hashes, list):
+            return self.receipt_tracker.track_many(tx_hashes)
+        return self.receipt_tracker.track(tx_hashes)
+
+    def call_contract_funcs(self, funcs, gas=None, on_signed=None,
+                            routes=None):
+        """Send transactions to execute contract functions in order.
+
+        The transactions use consecutive nonces and are broadcast back to back
+        without waiting for any of them to be mined.
+
+        :arg list funcs: The contract functions with parameters
+        :arg list(int) gas: The gas limits of the transactions, estimated if
+            not given. A transaction depending on an earlier one of the list
+            needs an explicit limit, its estimation would fail.
+        :arg on_signed: function called with every signed transaction before
+            it is broadcast
+        :arg list routes: token addresses or compact data array indices the
+            transactions are routed by. With an account pool, every pool
+            account sends its transactions with its own consecutive nonces,
+            only transactions of the same account keep their order.
+        :return: The list of transaction hashes
+        """
+        if gas is None:
+            gas = [None] * len(funcs)
+        if routes is None:
+            routes = [None] * len(funcs)
+        lanes = OrderedDict()
+        for idx, route in enumerate(routes):
+            account = self.account_for(route)
+            lanes.setdefault(account.address, (account, []))[1].append(idx)
+
+        tx_hashes = [None] * len(funcs)
+        for account, indices in lanes.values():
+            lane_hashes = self.__send_lane(
+                account, [funcs[idx] for idx in indices],
+                [gas[idx] for idx in indices], on_signed)
+            for idx, tx_hash in zip(indices, lane_hashes):
+                tx_hashes[idx] = tx_hash
+        return tx_hashes
+
+    def __send_lane(self, account, funcs, gas, on_signed):
+        address = account.address
+        with self.nonce_manager.lock(address):
+            nonces = self.nonce_manager.allocate(self.w3, address, len(funcs))
+            try:
+                return [
+                    call_contract(self.w3, account, func, nonce=nonce,
+                                  gas=func_gas, on_signed=on_signed)
+                    for func, nonce, func_gas in zip(funcs, nonces, gas)
+                ]
+            except Exception:
+                self.nonce_manager.reset(address)
+                raise
 
 
 class ReserveContract(BaseContract):
     """ReserveContract represent the KyberNetwork reserve smart contract."""
 
-    def __init__(self, provider, account, address):
+    def __init__(self, provider, account, address, nonce_manager=None):
         """Create ReserveContract instance given an address."""
-        super().__init__(provider, account, address, RESERVE_CODE.abi)
+        super().__init__(provider, account, address, RESERVE_CODE.abi,
+                         nonce_manager)
+        self.withdraw_approvals = None
+        self.executor = futures.ThreadPoolExecutor(max_workers=4)
 
     def trade_enabled(self):
         """Return true if the reserve is tradable."""
-        return self.contract.functions.tradeEnabled().call()
+        return self.read(self.contract.functions.tradeEnabled())
 
     def approved_withdraw_addresses(self, address, token):
         """Return true if the given address is allowed to withdraw from reserve
@@ -200,8 +715,23 @@ class ReserveContract(BaseContract):
         :arg str address: Account address
         :arg str token: The Token address
         """
-        sha = Web3.soliditySha3(['address', 'address'], [token, address])
-        return self.contract.functions.approvedWithdrawAddresses(sha).call()
+        return self.read(self.contract.functions.approvedWithdrawAddresses(
+            withdraw_key(token, address)))
+
+    def approved_withdraw_matrix(self, addresses, tokens):
+        """Return withdraw approvals of every address for every token.
+
+        Approvals are read once, concurrently, then kept current from
+        WithdrawAddressApproved events, repeated checks need no request.
+
+        :arg list(str) addresses: Destination addresses
+        :arg list(str) tokens: Token addresses
+        :return: list of rows, one per address, of booleans, one per token
+        """
+        if self.withdraw_approvals is None:
+            self.withdraw_approvals = WithdrawApprovals(
+                self.w3, self.contract)
+        return self.withdraw_approvals.matrix(addresses, tokens)
 
     def get_balance(self, token):
         """Return balance of given token.
@@ -209,7 +739,7 @@ class ReserveContract(BaseContract):
         :arg str token: Token address
         :return: The balance of token
         """
-        return self.contract.functions.getBalance(token).call()
+        return self.read(self.contract.functions.getBalance(token))
 
     def enable_trade(self):
         """Enable trading feature for reserve contract."""
@@ -258,6 +788,53 @@ class ReserveContract(BaseContract):
             self.contract.functions.withdraw(token, amount, dest)
         )
 
+    def withdraw_many(self, withdrawals):
+        """Withdraw many token amounts from reserve.
+
+        Approvals, balances and the operator role are checked before sending
+        anything. The withdrawals are then sent with consecutive nonces
+        without waiting for each other, by the pool account of their token if
+        an account pool is enabled.
+
+        :arg list withdrawals: (token, amount, dest) tuples
+        :return: TxBatch of the withdrawals, in the given order. Its failures
+            method reports each withdrawal failed on chain.
+        :raise WithdrawRejected: if any withdrawal can not be executed, its
+            rejected attribute maps the positions of these withdrawals in
+            withdrawals to the reason
+        """
+        withdrawals = [tuple(w) for w in withdrawals]
+        tokens = list(OrderedDict.fromkeys(w[0] for w in withdrawals))
+        dests = list(OrderedDict.fromkeys(w[2] for w in withdrawals))
+        approvals = self.approved_withdraw_matrix(dests, tokens)
+        balances = dict(zip(tokens, self.executor.map(
+            self.get_balance, tokens)))
+
+        rejected = OrderedDict()
+        operators = self.operators()
+        for idx, (token, _, _) in enumerate(withdrawals):
+            # checked for the account sending the withdrawal
+            if self.account_for(token).address not in operators:
+                rejected[idx] = 'account is not operator'
+        for idx, (token, amount, dest) in enumerate(withdrawals):
+            if not approvals[dests.index(dest)][tokens.index(token)]:
+                rejected.setdefault(idx, 'destination not approved')
+            elif amount > balances[token]:
+                rejected.setdefault(idx, 'insufficient balance')
+            balances[token] -= amount
+        if rejected:
+            raise WithdrawRejected(rejected)
+
+        tokens_of = [w[0] for w in withdrawals]
+        funcs = [self.contract.functions.withdraw(*w) for w in withdrawals]
+        # estimated from the account sending every withdrawal
+        gas = list(self.executor.map(
+            lambda func, token: func.estimateGas(
+                {'from': self.account_for(token).address}),
+            funcs, tokens_of))
+        return self.track(self.call_contract_funcs(
+            funcs, gas, routes=tokens_of))
+
     def set_contracts(self, network, rates, sanity_rates):
         """Update relevant address to reserve.
 
@@ -270,13 +847,14 @@ class ReserveContract(BaseContract):
         )
 
     def get_sanity_rates_address(self):
-        return self.contract.functions.sanityRatesContract().call()
+        return self.read(self.contract.functions.sanityRatesContract())
 
     def get_network_address(self):
-        return self.contract.functions.kyberNetwork().call()
+        return self.read(self.contract.functions.kyberNetwork())
 
     def get_conversion_rates_address(self):
-        return self.contract.functions.conversionRatesContract().call()
+        return self.read(
+            self.contract.functions.conversionRatesContract())
 
 
 class ConversionRatesContract(BaseContract):
@@ -284,16 +862,56 @@ class ConversionRatesContract(BaseContract):
     smart contract.
     """
 
-    def __init__(self, provider, account, address):
+    def __init__(self, provider, account, address, nonce_manager=None,
+                 state_cache=None):
         """Create new ConversionRatesContract instance.
 
         :arg provider: A web3 provider
         :arg account: Account to sign transactions.
         :arg str address: The address of smart contract
+        :arg nonce_manager: NonceManager to assign transaction nonces
+        :arg state_cache: StateCache persisting token indices and the state
+            set by this instance. The base rates it holds are used by
+            set_rates instead of reading them while the rate update block of
+            their token is the one they were set at.
         """
-        super().__init__(provider, account, address, CONVERSION_RATES_CODE.abi)
+        super().__init__(provider, account, address, CONVERSION_RATES_CODE.abi,
+                         nonce_manager)
         self.token_indices = {}
+        self.state_cache = state_cache
+        if state_cache is not None:
+            for token, index in state_cache.load_token_indices(
+                    address).items():
+                self.token_indices[token] = TokenIndex(*index)
+        # last known step functions, keyed by (field, token)
+        self.step_functions = {}
+        # base rates set by successful transactions, with a state cache
+        self.base_rates = {}
+        # (rate update block, send order) of the base rates, the send order
+        # of base rates loaded from the state cache is 0
+        self.__base_rate_versions = {}
+        self.__base_rates_lock = threading.Lock()
+        self.__send_order = itertools.count(1)
+        if state_cache is not None:
+            for field in (QTY_STEP_FUNCTION, IMBALANCE_STEP_FUNCTION):
+                for token, (_, value) in state_cache.load_token_state(
+                        address, field).items():
+                    self.step_functions[field, token] = value
+            for token, (block, value) in state_cache.load_token_state(
+                    address, BASE_RATES).items():
+                self.base_rates[token] = tuple(value)
+                self.__base_rate_versions[token] = (block, 0)
         self.executor = futures.ThreadPoolExecutor(max_workers=4)
+        self.max_gas_per_tx = None
+        self.optimize_gas = False
+        self.last_rate_plan = None
+        self.rebase_planner = None
+        self.sanity_sync = None
+        self.rate_keepalive = None
+        self.latency_metrics = None
+        self.__confirmation_tracker = None
+        # block number to the sampled rates, keyed by (token, qty, buy)
+        self.__rate_cache = OrderedDict()
 
     def get_buy_rate(self, token, qty, block_number=0):
         """Return the buying rate (ETH based). The rate might be vary with
@@ -302,14 +920,15 @@ class ConversionRatesContract(BaseContract):
         :arg str token: Token address
         :arg int qty: The amount to buy
         :arg int block_number: The block number to get rate from, default value
-            0 means latest block number
+            0 means latest block number. The rate is read at the state of the
+            latest block.
         """
-        return self.contract.functions.getRate(
+        return self.read(self.contract.functions.getRate(
             token,
             block_number,
             True,  # buy = True
             qty
-        ).call()
+        ))
 
     def get_sell_rate(self, token, qty, block_number=0):
         """Return the selling rate (ETH based). The rate might be vary with
@@ -318,14 +937,57 @@ class ConversionRatesContract(BaseContract):
         :arg str token: Token address
         :arg int qty: The amount to sell
         :arg int block_number: The block number to get rate from, default value
-            0 means latest block number
+            0 means latest block number. The rate is read at the state of the
+            latest block.
         """
-        return self.contract.functions.getRate(
+        return self.read(self.contract.functions.getRate(
             token,
             block_number,
             False,  # buy = False -> sell
             qty
-        ).call()
+        ))
+
+    def sample_rate_curves(self, tokens, qtys, side='buy', block=None,
+                           dtype=None):
+        """Return the rates of tokens for every quantity, at the same block.
+
+        Rates not sampled yet at the block are read concurrently, the rates
+        of the last RATE_CACHE_BLOCKS blocks are kept.
+
+        :arg list(str) tokens: the token addresses
+        :arg list(int) qtys: the quantities to sample
+        :arg str side: 'buy' or 'sell'
+        :arg int block: the block number to get rates at, default to the
+            latest block
+        :arg dtype: the numpy dtype of the result, eg: float
+        :return: a numpy array, or a list of lists if numpy is not installed,
+            with one row per token and one column per quantity
+        """
+        if side not in ('buy', 'sell'):
+            raise ValueError('side must be buy or sell: {}'.format(side))
+        buy = side == 'buy'
+        if block is None:
+            block = self.w3.eth.blockNumber
+
+        rates = self.__rate_cache.setdefault(block, {})
+        self.__rate_cache.move_to_end(block)
+        while len(self.__rate_cache) > RATE_CACHE_BLOCKS:
+            self.__rate_cache.popitem(last=False)
+
+        missing = [(token, qty, buy) for token in tokens for qty in qtys
+                   if (token, qty, buy) not in rates]
+        functions = self.contract.functions
+        for key, rate in zip(missing, self.executor.map(
+                lambda key: functions.getRate(
+                    key[0], block, key[2], key[1]
+                ).call(block_identifier=block), missing)):
+            rates[key] = rate
+
+        curves = [[rates[token, qty, buy] for qty in qtys]
+                  for token in tokens]
+        if numpy is None:
+            return curves
+        return numpy.array(curves, dtype=dtype)
 
     def get_token_indices(self, token):
         """Get token index in pricing contract compact data.
@@ -338,6 +1000,9 @@ class ConversionRatesContract(BaseContract):
             arr_idx, field_idx, _, _ = self.contract.functions.getCompactData(
                 token).call()
             self.token_indices[token] = TokenIndex(arr_idx, field_idx)
+            if self.state_cache is not None:
+                self.state_cache.save_token_indices(
+                    self.contract.address, {token: (arr_idx, field_idx)})
         return self.token_indices[token]
 
     def build_price(self, token, buy, sell):
@@ -377,11 +1042,13 @@ class ConversionRatesContract(BaseContract):
             'base_changed': base_changed
         }
 
-    def set_rates(self, token_addresses, buy_rates, sell_rates):
+    def set_rates(self, token_addresses, buy_rates=None, sell_rates=None,
+                  max_gas_per_tx=None, optimize_gas=None, rebase_tokens=None):
         """Setting rates for tokens.
 
         :arg list(str) token_addresses: list of token contract addresses
-            supported by your reserve
+            supported by your reserve, or a RateBatch holding the tokens and
+            their new rates, whose base and compact columns are filled
 
         :arg list(int) buy_rates: list of buy rates in token wei
             eg: 1 ETH = 500 KNC -> 500 * (10**18)
@@ -389,57 +1056,318 @@ class ConversionRatesContract(BaseContract):
         :arg list(int) sell_rates: list of sell rates in token wei
             eg: 1 KNC = 0.00182 ETH -> 0.00182 * (10**18)
 
-        """
+        :arg int max_gas_per_tx: the estimated gas ceiling of a transaction,
+            default to the max_gas_per_tx attribute. If set, the update is
+            split along compact data arrays into several transactions sent
+            with consecutive nonces.
+
+        :arg bool optimize_gas: default to the optimize_gas attribute. If
+            true, the cheapest combination of transactions is chosen by
+            plan_rate_update and stored in the last_rate_plan attribute.
 
-        token_indices = {}
-        for idx, indices in enumerate(self.executor.map(
-                self.get_token_indices, token_addresses)):
-            token_indices[token_addresses[idx]] = indices
+        :arg list(str) rebase_tokens: tokens whose new rates are set as base
+            rates even if they fit in compact data
 
-        prices = list(self.executor.map(lambda p: self.build_price(*p), zip(
-            token_addresses, buy_rates, sell_rates)))
+        With an account pool, the update is split by the pool account of
+        every compact data array, the accounts send their transactions with
+        their own nonces.
 
-        tokens = []
-        base_buy = []
-        base_sell = []
-        for price in prices:
-            if price['base_changed']:
-                tokens.append(price['token'])
-                base_buy.append(price['base_buy'])
-                base_sell.append(price['base_sell'])
+        If the sanity_sync attribute is set, the drifted sanity rates are
+        sent right after the rates, its last_tx_hash is the transaction. A
+        sanity update failing does not fail the rate update, the exception
+        is kept in its last_error attribute.
+
+        If the rate_keepalive attribute is set, the compact data arrays sent
+        are recorded by the RateKeepalive.
+
+        :return: the transaction hash, or the list of transaction hashes if
+            max_gas_per_tx or optimize_gas is set or several transactions
+            are sent
+        """
+        if isinstance(token_addresses, RateBatch):
+            batch = token_addresses
+        else:
+            batch = RateBatch(token_addresses, buy_rates, sell_rates)
+        tokens = batch.tokens
+
+        trace = None
+        if self.latency_metrics is not None:
+            trace = self.latency_metrics.begin(tokens)
+
+        # an update failing before broadcast is never included
+        try:
+            token_indices = dict(zip(tokens, self.executor.map(
+                self.get_token_indices, tokens)))
+
+            bases = self.__base_rates_of(tokens)
+            get_compact_data(batch, ([base[0] for base in bases],
+                                     [base[1] for base in bases]))
+
+            if max_gas_per_tx is None:
+                max_gas_per_tx = self.max_gas_per_tx
+            if optimize_gas is None:
+                optimize_gas = self.optimize_gas
+
+            if rebase_tokens:
+                batch = batch.rebased([i for i, token in enumerate(tokens)
+                                       if token in rebase_tokens])
+
+            updates = [batch]
+            if optimize_gas:
+                self.last_rate_plan = plan_rate_update(
+                    batch, None, token_indices)
+                updates = self.last_rate_plan.updates
+            if max_gas_per_tx is not None:
+                updates = [
+                    chunk for update in updates
+                    for chunk in split_prices(update, token_indices,
+                                              max_gas_per_tx)
+                ]
+            routes = [None] * len(updates)
+            if self.account_pool is not None:
+                # an array is always sent by the same account
+                updates = [
+                    lane_update for update in updates
+                    for lane_update in self.__split_lanes(
+                        update, token_indices)
+                ]
+                routes = [token_indices[update.tokens[0]].array_idx
+                          for update in updates]
+
+            block_number = self.w3.eth.blockNumber
+            funcs = [self.__build_rates_func(update, token_indices,
+                                             block_number)
+                     for update in updates]
+
+            on_signed = None
+            if trace is not None:
+                trace.mark(READS_DONE, block_number)
+
+                def on_signed(signed_tx):
+                    trace.mark(SIGNED)
+
+            # current sanity rates are read before the nonce lock is taken
+            sanity_rates = None
+            if self.sanity_sync is not None:
+                try:
+                    sanity_rates = self.sanity_sync.drifted(
+                        tokens, batch.buy_rates, batch.sell_rates)
+                except Exception as e:
+                    self.sanity_sync.last_error = e
+
+            # the sanity rates follow the rates with the next nonce
+            with self.nonce_manager.lock(self.account.address):
+                if len(funcs) == 1 and max_gas_per_tx is None and \
+                        not optimize_gas:
+                    tx_hash = self.call_contract_func(
+                        funcs[0], on_signed=on_signed, route=routes[0])
+                else:
+                    tx_hash = self.call_contract_funcs(
+                        funcs, on_signed=on_signed, routes=routes)
+                if trace is not None:
+                    trace.mark(BROADCAST)
+                if self.rate_keepalive is not None:
+                    tx_hashes = tx_hash if isinstance(tx_hash, list) \
+                        else [tx_hash]
+                    for update, update_tx_hash in zip(updates, tx_hashes):
+                        buy, sell, indices = build_compact_price(
+                            update, token_indices)
+                        self.rate_keepalive.observe(
+                            buy, sell, indices, block_number, update_tx_hash)
+                # the rates are sent, a failing sanity update is only kept
+                if sanity_rates is not None:
+                    try:
+                        self.sanity_sync.send(*sanity_rates)
+                    except Exception as e:
+                        self.sanity_sync.last_error = e
+        except Exception:
+            if trace is not None:
+                self.latency_metrics.failure(trace)
+            raise
+
+        if trace is not None:
+            self.__trace_receipts(trace, tx_hash)
+
+        if self.state_cache is not None:
+            tx_hashes = tx_hash if isinstance(tx_hash, list) else [tx_hash]
+            for update, update_tx_hash in zip(updates, tx_hashes):
+                # the rate update block of every token sent is block_number
+                base_rates = [
+                    (token, [buy, sell]) for token, buy, sell in zip(
+                        update.tokens, update.base_buy, update.base_sell)]
+                self.track(update_tx_hash).add_done_callback(
+                    self.__base_rates_callback(
+                        base_rates, block_number, next(self.__send_order)))
+
+        if self.rebase_planner is not None:
+            for update in updates:
+                for row in zip(update.tokens, update.base_buy,
+                               update.base_sell, update.buy_rates,
+                               update.sell_rates):
+                    self.rebase_planner.observe(row[0], block_number, *row[1:])
+        return tx_hash
+
+    def __base_rates_of(self, tokens):
+        """Return the (base buy, base sell) rates of tokens.
+
+        Base rates set through the state cache are not read again if the
+        rate update block of their token is still the one they were set at.
+        The others, set by another sender or by a transaction whose receipt
+        was not seen, are read again.
+        """
+        with self.__base_rates_lock:
+            cached = {token: (self.base_rates[token],
+                              self.__base_rate_versions[token][0])
+                      for token in tokens if token in self.base_rates}
+        functions = self.contract.functions
+        update_blocks = self.executor.map(
+            lambda token: self.read(functions.getRateUpdateBlock(token)),
+            list(cached))
+        known = {}
+        for (token, (value, block)), update_block in zip(
+                cached.items(), update_blocks):
+            if block == update_block:
+                known[token] = value
+            else:
+                self.__forget_base_rates(token, block)
+
+        unknown = [token for token in tokens if token not in known]
+        base_buy = self.executor.map(
+            lambda token: self.get_basic_rate(token, True), unknown)
+        base_sell = self.executor.map(
+            lambda token: self.get_basic_rate(token, False), unknown)
+        known.update(zip(unknown, zip(base_buy, base_sell)))
+        return [known[token] for token in tokens]
+
+    def __forget_base_rates(self, token, block):
+        """Forget stale base rates of token, unless set again since."""
+        with self.__base_rates_lock:
+            version = self.__base_rate_versions.get(token)
+            if version is not None and version[0] == block:
+                del self.base_rates[token]
+                del self.__base_rate_versions[token]
+
+    def __base_rates_callback(self, base_rates, block_number, order):
+        """Return a receipt callback persisting base rates once set at rate
+        update block block_number, unless a later update set them."""
+        def callback(future):
+            if future.exception() is not None:
+                return
+            for token, value in base_rates:
+                self.__save_base_rates(token, value, block_number, order)
+        return callback
+
+    def __save_base_rates(self, token, value, block_number, order=0):
+        with self.__base_rates_lock:
+            version = self.__base_rate_versions.get(token)
+            if version is not None and version > (block_number, order):
+                return
+            self.base_rates[token] = tuple(value)
+            self.__base_rate_versions[token] = (block_number, order)
+            self.state_cache.save_token_state(
+                self.contract.address, token, BASE_RATES, value,
+                block_number)
+
+    def enable_latency_metrics(self, metrics=None, confirmations=6):
+        """Record the latency of rate updates sent by set_rates.
+
+        :arg metrics: LatencyMetrics to record to, a new one is created if
+            not given
+        :arg int confirmations: number of blocks mined on top of an update
+            before it is confirmed
+        :return: the LatencyMetrics
+        """
+        self.latency_metrics = metrics or LatencyMetrics()
+        self.__confirmation_tracker = ReceiptTracker(
+            self.w3, confirmations=confirmations)
+        return self.latency_metrics
+
+    def __trace_receipts(self, trace, tx_hashes):
+        """Mark the update included, then confirmed, once all its
+        transactions are."""
+        if not isinstance(tx_hashes, list):
+            tx_hashes = [tx_hashes]
+        metrics = self.latency_metrics
+        confirmations = self.__confirmation_tracker.confirmations
+        lock = threading.Lock()
+        reached = set()
+
+        def on_stage(stage, batch):
+            def callback(_):
+                with lock:
+                    if not batch.done() or stage in reached:
+                        return
+                    reached.add(stage)
+                receipts = batch.result(0)
+                if None in receipts:
+                    if stage == INCLUDED:
+                        metrics.failure(trace)
+                    return
+                block = max(r['blockNumber'] for r in receipts)
+                if stage == CONFIRMED:
+                    block += confirmations
+                trace.mark(stage, block)
+            return callback
+
+        for stage, tracker in ((INCLUDED, self.receipt_tracker),
+                               (CONFIRMED, self.__confirmation_tracker)):
+            batch = tracker.track_many(tx_hashes)
+            for future in batch.futures:
+                future.add_done_callback(on_stage(stage, batch))
+
+    def __split_lanes(self, prices, token_indices):
+        """Split a RateBatch by the pool account of the token arrays."""
+        lanes = OrderedDict()
+        for idx, token in enumerate(prices.tokens):
+            lane = self.account_pool.lane(token_indices[token].array_idx)
+            lanes.setdefault(lane, []).append(idx)
+        if len(lanes) == 1:
+            return [prices]
+        return [prices.take(indices) for indices in lanes.values()]
+
+    def __build_rates_func(self, prices, token_indices, block_number):
+        """Build the contract function setting the prices of a RateBatch.
+
+        setBaseRate is used if any token base rate changed, setCompactData
+        otherwise.
+        """
+        changed = [i for i, flag in enumerate(prices.base_changed) if flag]
+        tokens = [prices.tokens[i] for i in changed]
+        base_buy = [prices.base_buy[i] for i in changed]
+        base_sell = [prices.base_sell[i] for i in changed]
 
         compact_buy, compact_sell, indices = build_compact_price(
             prices, token_indices)
 
         if tokens:
             """Set base rate"""
-            tx_hash = self.call_contract_func(
-                self.contract.functions.setBaseRate(
-                    tokens,
-                    base_buy,  # base buy
-                    base_sell,  # base sell
-                    compact_buy,  # compact data
-                    compact_sell,  # compact data
-                    self.w3.eth.blockNumber,  # most recent block number
-                    indices,  # indicies
-                )
+            return self.contract.functions.setBaseRate(
+                tokens,
+                base_buy,  # base buy
+                base_sell,  # base sell
+                compact_buy,  # compact data
+                compact_sell,  # compact data
+                block_number,  # most recent block number
+                indices,  # indicies
             )
         else:
             """Set compact rate"""
-            tx_hash = self.call_contract_func(
-                self.contract.functions.setCompactData(
-                    compact_buy,
-                    compact_sell,
-                    self.w3.eth.blockNumber,
-                    indices
-                )
+            return self.contract.functions.setCompactData(
+                compact_buy,
+                compact_sell,
+                block_number,
+                indices
             )
-        return tx_hash
+
+    def get_listed_tokens(self):
+        """Return addresses of tokens listed on pricing contract, in listing
+        order."""
+        return self.read(self.contract.functions.getListedTokens())
 
     def get_basic_rate(self, token_address, buy=True):
         """Get basic rate from pricing contract."""
-        return self.contract.functions.getBasicRate(
-            token_address, buy).call()
+        return self.read(self.contract.functions.getBasicRate(
+            token_address, buy))
 
     def enable_token_trade(self, token):
         return self.call_contract_func(
@@ -468,7 +1396,7 @@ class ConversionRatesContract(BaseContract):
                                minimal_record_resolution,
                                max_per_block_imbalance,
                                max_total_imbalance):
-        return self.call_contract_func(
+        tx_hash = self.call_contract_func(
             self.contract.functions.setTokenControlInfo(
                 token,
                 minimal_record_resolution,
@@ -476,9 +1404,15 @@ class ConversionRatesContract(BaseContract):
                 max_total_imbalance
             )
         )
+        self.__save_token_state(tx_hash, token, CONTROL_INFO, [
+            minimal_record_resolution,
+            max_per_block_imbalance,
+            max_total_imbalance
+        ])
+        return tx_hash
 
     def set_qty_step_function(self, token, x_buy, y_buy, x_sell, y_sell):
-        return self.call_contract_func(
+        tx_hash = self.call_contract_func(
             self.contract.functions.setQtyStepFunction(
                 token,
                 x_buy,
@@ -487,9 +1421,14 @@ class ConversionRatesContract(BaseContract):
                 y_sell
             )
         )
+        value = [x_buy, y_buy, x_sell, y_sell]
+        self.step_functions[QTY_STEP_FUNCTION, token] = value
+        self.track(tx_hash).add_done_callback(
+            self.__step_function_callback(QTY_STEP_FUNCTION, token, value))
+        return tx_hash
 
     def set_imbalance_step_function(self, token, x_buy, y_buy, x_sell, y_sell):
-        return self.call_contract_func(
+        tx_hash = self.call_contract_func(
             self.contract.functions.setImbalanceStepFunction(
                 token,
                 x_buy,
@@ -498,6 +1437,122 @@ class ConversionRatesContract(BaseContract):
                 y_sell
             )
         )
+        value = [x_buy, y_buy, x_sell, y_sell]
+        self.step_functions[IMBALANCE_STEP_FUNCTION, token] = value
+        self.track(tx_hash).add_done_callback(self.__step_function_callback(
+            IMBALANCE_STEP_FUNCTION, token, value))
+        return tx_hash
+
+    def get_step_functions(self, tokens, imbalance=False):
+        """Read step functions of tokens from pricing contract.
+
+        All values are read concurrently at the same block.
+
+        :arg list(str) tokens: the token addresses
+        :arg bool imbalance: read imbalance step functions instead of
+            quantity step functions
+        :return: dict of token address to [x_buy, y_buy, x_sell, y_sell]
+        """
+        functions = self.contract.functions
+        block = self.w3.eth.blockNumber
+        # getStepFunctionData commands: even ones return array lengths, odd
+        # ones array items, imbalance step functions start from 8
+        offset = 8 if imbalance else 0
+
+        def read(call):
+            return functions.getStepFunctionData(*call).call(
+                block_identifier=block)
+
+        length_calls = [(token, offset + 2 * arr, 0)
+                        for token in tokens for arr in range(4)]
+        lengths = list(self.executor.map(read, length_calls))
+        item_calls = [(token, command + 1, idx)
+                      for (token, command, _), length in zip(
+                          length_calls, lengths)
+                      for idx in range(length)]
+        items = iter(self.executor.map(read, item_calls))
+
+        step_functions = {}
+        for (token, _, _), length in zip(length_calls, lengths):
+            step_functions.setdefault(token, []).append(
+                [next(items) for _ in range(length)])
+        return step_functions
+
+    def set_step_functions(self, qty_step_functions=None,
+                           imbalance_step_functions=None):
+        """Set step functions of many tokens.
+
+        Step functions equal to the last known ones are skipped, the step
+        functions of tokens not known yet are read from pricing contract. The
+        others are sent with consecutive nonces without waiting for each
+        other, by the pool account of their token if an account pool is
+        enabled.
+
+        :arg dict qty_step_functions: token address to its quantity
+            (x_buy, y_buy, x_sell, y_sell) step function
+        :arg dict imbalance_step_functions: token address to its imbalance
+            (x_buy, y_buy, x_sell, y_sell) step function
+        :return: TxBatch of the sent transactions
+        """
+        functions = self.contract.functions
+        updates = []
+        for field, func, step_functions in (
+                (QTY_STEP_FUNCTION, functions.setQtyStepFunction,
+                 qty_step_functions or {}),
+                (IMBALANCE_STEP_FUNCTION, functions.setImbalanceStepFunction,
+                 imbalance_step_functions or {})):
+            unknown = [token for token in step_functions
+                       if (field, token) not in self.step_functions]
+            if unknown:
+                for token, value in self.get_step_functions(
+                        unknown, field == IMBALANCE_STEP_FUNCTION).items():
+                    self.step_functions[field, token] = value
+            for token, step_function in step_functions.items():
+                value = [list(points) for points in step_function]
+                if self.step_functions[field, token] != value:
+                    updates.append((field, token, value, func))
+
+        tx_hashes = []
+        if updates:
+            tx_hashes = self.call_contract_funcs(
+                [func(token, *value) for _, token, value, func in updates],
+                [step_function_gas_limit(max(len(points) for points in value))
+                 for _, _, value, _ in updates],
+                routes=[token for _, token, _, _ in updates])
+        batch = self.track(tx_hashes)
+
+        for (field, token, value, _), future in zip(updates, batch.futures):
+            self.step_functions[field, token] = value
+            future.add_done_callback(
+                self.__step_function_callback(field, token, value))
+        return batch
+
+    def __step_function_callback(self, field, token, value):
+        """Return a receipt callback persisting a step function once set, or
+        forgetting it if its transaction failed.
+        """
+        def callback(future):
+            if future.exception() is not None:
+                if self.step_functions.get((field, token)) == value:
+                    del self.step_functions[field, token]
+            elif self.state_cache is not None:
+                self.state_cache.save_token_state(
+                    self.contract.address, token, field, value,
+                    future.result()['blockNumber'])
+        return callback
+
+    def __save_token_state(self, tx_hash, token, field, value):
+        """Persist token state set by a transaction to the state cache, once
+        the transaction succeeded."""
+        if self.state_cache is None:
+            return
+
+        def callback(future):
+            if future.exception() is None:
+                self.state_cache.save_token_state(
+                    self.contract.address, token, field, value,
+                    future.result()['blockNumber'])
+        self.track(tx_hash).add_done_callback(callback)
 
     def set_compact_data(self, buy, sell, indices):
         return self.call_contract_func(
@@ -510,7 +1565,7 @@ class ConversionRatesContract(BaseContract):
         )
 
     def get_compact_data(self, token):
-        return self.contract.functions.getCompactData(token).call()
+        return self.read(self.contract.functions.getCompactData(token))
 
     def set_reserve_address(self, reserve_addr):
         """Update reserve address."""
@@ -519,14 +1574,14 @@ class ConversionRatesContract(BaseContract):
         )
 
     def get_reserve_address(self):
-        return self.contract.functions.reserveContract().call()
+        return self.read(self.contract.functions.reserveContract())
 
     def get_step_function_data(self, token, command, param):
-        return self.contract.functions.getStepFunctionData(
+        return self.read(self.contract.functions.getStepFunctionData(
             token,
             command,
             param
-        ).call()
+        ))
 
     def add_new_token(self, token, minimal_record_resolution,
                       max_per_block_imbalance, max_total_imbalance):
@@ -548,6 +1603,147 @@ class ConversionRatesContract(BaseContract):
         self.enable_token_trade(token)
         self.get_token_indices(token)
 
+    def add_new_tokens(self, specs, timeout=None):
+        """Add new tokens to pricing contract.
+
+        All listing transactions, with the optional step functions and a
+        single setBaseRate for initial rates, are sent with consecutive nonces
+        without waiting for each other, then their receipts are waited for
+        together. The account should be both admin and operator of the
+        contract if step functions or rates are given.
+
+        The token indices cache is filled from the listing order, without
+        reading compact data of every token.
+
+        :arg list specs: TokenSpec, or tuples of its fields, of the tokens
+        :arg int timeout: time to wait for the receipts, default to the
+            receipt tracker timeout
+        :return: the TxBatch of sent transactions. It is not done if the
+            timeout elapsed, only the state set by successful transactions
+            is cached.
+        """
+        specs = [TokenSpec(*spec) for spec in specs]
+        functions = self.contract.functions
+        listed = self.get_listed_tokens()
+        indices = {
+            spec.token: TokenIndex(
+                *divmod(len(listed) + idx, TOKENS_PER_ARRAY))
+            for idx, spec in enumerate(specs)
+        }
+
+        # the token and state field set by every transaction
+        funcs, gas, fields = [], [], []
+        for spec in specs:
+            fields.extend([(spec.token, None), (spec.token, CONTROL_INFO),
+                           (spec.token, None)])
+            funcs.extend([
+                functions.addToken(spec.token),
+                functions.setTokenControlInfo(
+                    spec.token, spec.minimal_record_resolution,
+                    spec.max_per_block_imbalance, spec.max_total_imbalance),
+                functions.enableTokenTrade(spec.token),
+            ])
+            gas.extend([ADD_TOKEN_GAS_LIMIT, SET_TOKEN_CONTROL_INFO_GAS_LIMIT,
+                        ENABLE_TOKEN_TRADE_GAS_LIMIT])
+            for step_func, field, step_function in (
+                    (functions.setQtyStepFunction, QTY_STEP_FUNCTION,
+                     spec.qty_step_function),
+                    (functions.setImbalanceStepFunction,
+                     IMBALANCE_STEP_FUNCTION, spec.imbalance_step_function)):
+                if step_function is not None:
+                    fields.append((spec.token, field))
+                    funcs.append(step_func(spec.token, *step_function))
+                    gas.append(step_function_gas_limit(
+                        max(len(points) for points in step_function)))
+
+        rated = [spec for spec in specs if spec.rates is not None]
+        if rated:
+            rates_block = self.w3.eth.blockNumber
+            func, num_arrays = self.__build_initial_rates_func(
+                rated, indices, listed, rates_block)
+            fields.append((None, BASE_RATES))
+            funcs.append(func)
+            gas.append(initial_rates_gas_limit(len(rated), num_arrays))
+
+        batch = self.track(self.call_contract_funcs(funcs, gas))
+        batch.wait(timeout)
+        succeeded = [f.done() and f.exception(0) is None
+                     for f in batch.futures]
+        set_fields = set(
+            (token, field) for (token, field), ok in zip(fields, succeeded)
+            if ok and field is not None)
+        rates_set = (None, BASE_RATES) in set_fields
+
+        if not all(succeeded):
+            # later tokens may be shifted, read the actual listing order
+            listed = self.get_listed_tokens()
+            tokens = set(indices)
+            indices = {
+                token: TokenIndex(*divmod(idx, TOKENS_PER_ARRAY))
+                for idx, token in enumerate(listed) if token in tokens
+            }
+        self.token_indices.update(indices)
+        for spec in specs:
+            if spec.token not in indices:
+                continue
+            for field, value in (
+                    (QTY_STEP_FUNCTION, spec.qty_step_function),
+                    (IMBALANCE_STEP_FUNCTION, spec.imbalance_step_function)):
+                if (spec.token, field) in set_fields:
+                    self.step_functions[field, spec.token] = [
+                        list(points) for points in value]
+
+        if self.state_cache is not None:
+            address = self.contract.address
+            block = self.w3.eth.blockNumber
+            self.state_cache.save_token_indices(address, indices)
+            for spec in specs:
+                if spec.token not in indices:
+                    continue
+                for field, value in (
+                        (CONTROL_INFO, [spec.minimal_record_resolution,
+                                        spec.max_per_block_imbalance,
+                                        spec.max_total_imbalance]),
+                        (QTY_STEP_FUNCTION, spec.qty_step_function),
+                        (IMBALANCE_STEP_FUNCTION,
+                         spec.imbalance_step_function)):
+                    if (spec.token, field) in set_fields:
+                        self.state_cache.save_token_state(
+                            address, spec.token, field, list(value), block)
+                if rates_set and spec.rates is not None:
+                    self.__save_base_rates(
+                        spec.token, list(spec.rates), rates_block)
+        return batch
+
+    def __build_initial_rates_func(self, specs, indices, listed,
+                                   block_number):
+        """Build the setBaseRate setting initial rates of new tokens.
+
+        Compact data of tokens already listed in the written arrays is kept.
+
+        :return: the contract function and the number of arrays it writes
+        """
+        arrays = sorted(set(indices[spec.token].array_idx for spec in specs))
+        compact = {arr: ([0] * TOKENS_PER_ARRAY, [0] * TOKENS_PER_ARRAY)
+                   for arr in arrays}
+        sharing = [token for idx, token in enumerate(listed)
+                   if idx // TOKENS_PER_ARRAY in compact]
+        for arr, field, buy, sell in self.executor.map(
+                self.get_compact_data, sharing):
+            compact[arr][0][field] = buy[0]
+            compact[arr][1][field] = sell[0]
+
+        func = self.contract.functions.setBaseRate(
+            [spec.token for spec in specs],
+            [spec.rates[0] for spec in specs],
+            [spec.rates[1] for spec in specs],
+            [hexlify(compact[arr][0]) for arr in arrays],
+            [hexlify(compact[arr][1]) for arr in arrays],
+            block_number,
+            arrays
+        )
+        return func, len(arrays)
+
 
 class SanityRatesContract(BaseContract):
     """SanityRatesContract represents the KyberNetwork sanity rates contract.
@@ -555,14 +1751,16 @@ class SanityRatesContract(BaseContract):
     used.
     """
 
-    def __init__(self, provider, account, address):
+    def __init__(self, provider, account, address, nonce_manager=None):
         """Create new SanityRatesContract instance.
 
         :arg str provider: web3 provider
         :arg account: the account to sign transaction
         :arg str address: the address of sanity rates contract
+        :arg nonce_manager: NonceManager to assign transaction nonces
         """
-        super().__init__(provider, account, address, SANITY_RATES_CODE.abi)
+        super().__init__(provider, account, address, SANITY_RATES_CODE.abi,
+                         nonce_manager)
 
     def set_sanity_rates(self, tokens, rates):
         """Set the sanity rates for a list of tokens.
@@ -576,7 +1774,7 @@ class SanityRatesContract(BaseContract):
 
     def get_sanity_rates(self, src, dst):
         """Get the sanity rates for 1 token vs. ETH."""
-        return self.contract.functions.getSanityRate(src, dst).call()
+        return self.read(self.contract.functions.getSanityRate(src, dst))
 
     def set_reasonable_diff(self, tokens, diff):
         """Set reasonable conversion rate difference in percentage. Any rate
@@ -591,7 +1789,8 @@ class SanityRatesContract(BaseContract):
 
     def get_reasonable_diff_in_bps(self, token):
         """Get the reasonable difference in basis points for token."""
-        return self.contract.functions.reasonableDiffInBps(token).call()
+        return self.read(
+            self.contract.functions.reasonableDiffInBps(token))
 
 
 class Reserve:
@@ -605,16 +1804,156 @@ class Reserve:
         * Enable/Disable trading function
     """
 
-    def __init__(self, provider, account, addresses):
+    def __init__(self, provider, account, addresses, nonce_manager=None,
+                 state_cache=None):
         """Create a Reserve instance.
 
         :arg provider: web3 provider
         :arg addresses: addresses of deployed smart contracts
+        :arg nonce_manager: NonceManager shared by the reserve contracts, a
+            new one is created if not given
+        :arg state_cache: StateCache persisting the pricing contract state
         """
+        self.addresses = addresses
+        self.nonce_manager = nonce_manager or NonceManager()
         self.fund = ReserveContract(
-            provider, account, addresses.reserve)
+            provider, account, addresses.reserve, self.nonce_manager)
         self.pricing = ConversionRatesContract(
-            provider, account, addresses.conversion_rates)
+            provider, account, addresses.conversion_rates,
+            self.nonce_manager, state_cache)
         self.sanity = SanityRatesContract(
-            provider, account, addresses.sanity_rates
+            provider, account, addresses.sanity_rates, self.nonce_manager
         )
+        # one polling loop for the transactions of all reserve contracts
+        self.fund.receipt_tracker = self.pricing.receipt_tracker
+        self.sanity.receipt_tracker = self.pricing.receipt_tracker
+        self.imbalance_tracker = None
+
+    def enable_read_cache(self, read_cache=None):
+        """Cache results of read functions of all reserve contracts.
+
+        :arg read_cache: ReadCache to use, a new one is created if not given
+        :return: the ReadCache shared by the reserve contracts
+        """
+        read_cache = self.pricing.enable_read_cache(read_cache)
+        self.fund.enable_read_cache(read_cache)
+        self.sanity.enable_read_cache(read_cache)
+        return read_cache
+
+    def enable_imbalance_tracker(self, tokens, sync_interval=1):
+        """Keep the imbalance of tokens in memory, updated from trade
+        events.
+
+        :arg list(str) tokens: the tracked token addresses
+        :arg float sync_interval: time between two polls of trade events,
+            in seconds
+        :return: the ImbalanceTracker
+        """
+        self.imbalance_tracker = ImbalanceTracker(
+            self.fund, self.pricing, tokens, sync_interval)
+        return self.imbalance_tracker
+
+    def enable_sanity_sync(self, slack_bps=0, threshold_bps=50):
+        """Send sanity rates derived from the rates set by pricing contract,
+        right after them.
+
+        :arg int slack_bps: raise of the sanity rates over the midpoint of
+            buy and sell rates, in basis points
+        :arg int threshold_bps: drift of a sanity rate to send a new one, in
+            basis points
+        :return: the SanitySync
+        """
+        self.pricing.sanity_sync = SanitySync(
+            self.sanity, slack_bps, threshold_bps)
+        return self.pricing.sanity_sync
+
+    def enable_rate_keepalive(self, margin_blocks=10, poll_interval=1):
+        """Refresh compact data arrays of pricing contract before their
+        rates expire, following the rates it sets.
+
+        The arrays are read from the current state, the background thread is
+        started with the start method of the returned RateKeepalive.
+
+        :arg int margin_blocks: number of blocks before expiry an array is
+            refreshed at
+        :arg float poll_interval: time between two checks of the background
+            thread, in seconds
+        :return: the RateKeepalive
+        """
+        # keepalive depends on this module
+        from .keepalive import RateKeepalive
+        self.pricing.rate_keepalive = RateKeepalive(
+            self.pricing, self.load_state(), margin_blocks, poll_interval)
+        return self.pricing.rate_keepalive
+
+    def enable_account_pool(self, accounts):
+        """Spread rate updates, step functions and withdrawals over several
+        operator accounts of the reserve and pricing contracts.
+
+        Step functions and withdrawals are routed by token address, while
+        rate updates are routed by compact data array index, so the updates
+        of a token may go through two accounts.
+
+        :arg list accounts: the local accounts of the pool
+        :return: the AccountPool
+        :raise AccountNotOperator: if any account is not operator of both
+            contracts
+        """
+        pool = self.pricing.enable_account_pool(accounts)
+        try:
+            self.fund.enable_account_pool(accounts)
+        except AccountNotOperator:
+            self.pricing.account_pool = None
+            raise
+        return pool
+
+    def enable_role_cache(self, sync_interval=1):
+        """Keep roles of all reserve contracts in memory."""
+        for contract in (self.fund, self.pricing, self.sanity):
+            contract.enable_role_cache(sync_interval)
+
+    def load_state(self):
+        """Read the pricing state of all listed tokens.
+
+        The listed tokens are discovered from pricing contract, then their
+        state is read concurrently at the same block. The token indices cache
+        of pricing contract is filled on the way.
+
+        :return: ReserveState
+        """
+        pricing = self.pricing
+        start = time.time()
+        rpc_count = pricing.rpc_counter.count
+        block = pricing.w3.eth.blockNumber
+        functions = pricing.contract.functions
+
+        tokens = functions.getListedTokens().call(block_identifier=block)
+        calls = []
+        for token in tokens:
+            calls.extend([
+                functions.getCompactData(token),
+                functions.getTokenBasicData(token),
+                functions.getTokenControlInfo(token),
+                functions.getBasicRate(token, True),
+                functions.getBasicRate(token, False),
+                functions.getRateUpdateBlock(token),
+            ])
+        results = list(pricing.executor.map(
+            lambda func: func.call(block_identifier=block), calls))
+
+        states = OrderedDict()
+        for idx, token in enumerate(tokens):
+            (compact, basic, control_info, base_buy, base_sell,
+             rate_update_block) = results[idx * 6:idx * 6 + 6]
+            index = TokenIndex(compact[0], compact[1])
+            pricing.token_indices[token] = index
+            states[token] = TokenState(
+                index, basic[0], basic[1], ControlInfo(*control_info),
+                base_buy, base_sell,
+                int.from_bytes(compact[2], byteorder='little', signed=True),
+                int.from_bytes(compact[3], byteorder='little', signed=True),
+                rate_update_block
+            )
+
+        return ReserveState(block, states, time.time() - start,
+                            pricing.rpc_counter.count - rpc_count)
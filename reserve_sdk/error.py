@@ -1,2 +1,38 @@
 class Error(Exception):
     """Base-class for all exceptions raised by this module"""
+
+
+class TransactionFailed(Error):
+    """Raised when a transaction is mined with a failure status."""
+
+    def __init__(self, receipt):
+        super().__init__('transaction {} failed'.format(
+            receipt['transactionHash'].hex()))
+        self.receipt = receipt
+
+
+class TransactionTimeout(Error):
+    """Raised when a transaction is not confirmed in time."""
+
+    def __init__(self, tx_hash):
+        super().__init__('transaction {} not confirmed in time'.format(
+            tx_hash))
+        self.tx_hash = tx_hash
+
+
+class WithdrawRejected(Error):
+    """Raised when withdrawals can not be executed by the reserve."""
+
+    def __init__(self, rejected):
+        super().__init__('{} withdrawals rejected'.format(len(rejected)))
+        self.rejected = rejected
+
+
+class AccountNotOperator(Error):
+    """Raised when accounts sending operator transactions are not operators
+    of the contract."""
+
+    def __init__(self, addresses):
+        super().__init__('{} accounts are not operators'.format(
+            len(addresses)))
+        self.addresses = addresses
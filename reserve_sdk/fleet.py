@@ -0,0 +1,139 @@
+import time
+from collections import OrderedDict, namedtuple
+from concurrent import futures
+
+from .contract import Reserve
+from .nonce import NonceManager
+
+
+"""Outcome of an operation executed on one reserve of a fleet.
+
+    * name: the reserve name in the fleet
+    * result: the value returned by the operation, None if it failed
+    * error: the raised exception, None if it succeeded
+    * latency: the time spent on the operation, in seconds
+"""
+FleetResult = namedtuple('FleetResult', ('name', 'result', 'error', 'latency'))
+
+
+class ReserveFleet:
+    """ReserveFleet manages many reserves operated by the same service.
+
+    Reserves of a fleet share web3 providers, a NonceManager and the token
+    indices cache of their pricing contracts. Operations are fanned out
+    concurrently across reserves, while operations of reserves signing with
+    the same account are executed one after another to keep their
+    transactions ordered.
+    """
+
+    def __init__(self, max_workers=8):
+        """Create an empty fleet.
+
+        :arg int max_workers: the maximum number of reserves operated at the
+            same time
+        """
+        self.reserves = OrderedDict()
+        self.nonce_manager = NonceManager()
+        self.executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.__providers = {}
+        self.__token_indices = {}
+        self.__accounts = {}
+
+    def add(self, name, provider, account, addresses):
+        """Add a reserve to the fleet.
+
+        :arg str name: the unique name of reserve in the fleet
+        :arg provider: web3 provider, providers with the same endpoint are
+            shared between reserves
+        :arg account: the account to sign transactions of this reserve
+        :arg addresses: addresses of deployed reserve contracts
+        :return: the Reserve instance
+        """
+        if name in self.reserves:
+            raise ValueError('reserve {} already in fleet'.format(name))
+
+        endpoint = getattr(provider, 'endpoint_uri', None)
+        if endpoint is not None:
+            provider = self.__providers.setdefault(endpoint, provider)
+
+        reserve = Reserve(provider, account, addresses, self.nonce_manager)
+        reserve.pricing.token_indices = self.__token_indices.setdefault(
+            addresses.conversion_rates, {})
+
+        self.reserves[name] = reserve
+        self.__accounts[name] = account.address
+        return reserve
+
+    def remove(self, name):
+        """Remove a reserve from the fleet."""
+        del self.__accounts[name]
+        return self.reserves.pop(name)
+
+    def execute(self, operation, names=None):
+        """Execute a state changing operation on reserves.
+
+        Reserves signing with different accounts are operated concurrently,
+        the ones sharing an account are operated in the order they were added
+        to the fleet.
+
+        :arg operation: function called with the reserve name and instance
+        :arg list(str) names: reserves to operate, all reserves if not given
+        :return: OrderedDict of reserve name to FleetResult
+        """
+        names = self.__names(names)
+        lanes = OrderedDict()
+        for name in names:
+            lanes.setdefault(self.__accounts[name], []).append(name)
+
+        def run_lane(lane):
+            return [self.__run(operation, name) for name in lane]
+
+        results = {}
+        for lane_results in self.executor.map(run_lane, lanes.values()):
+            for result in lane_results:
+                results[result.name] = result
+        return OrderedDict((name, results[name]) for name in names)
+
+    def read(self, operation, names=None):
+        """Execute a read only operation on all reserves concurrently.
+
+        :arg operation: function called with the reserve name and instance
+        :arg list(str) names: reserves to read, all reserves if not given
+        :return: OrderedDict of reserve name to FleetResult
+        """
+        names = self.__names(names)
+        results = self.executor.map(
+            lambda name: self.__run(operation, name), names)
+        return OrderedDict((result.name, result) for result in results)
+
+    def set_rates(self, rates):
+        """Set rates of many reserves.
+
+        :arg dict rates: reserve name to a tuple of token addresses, buy
+            rates and sell rates, as accepted by
+            ConversionRatesContract.set_rates
+        :return: OrderedDict of reserve name to FleetResult holding the
+            transaction hash
+        """
+        return self.execute(
+            lambda name, reserve: reserve.pricing.set_rates(*rates[name]),
+            names=list(rates)
+        )
+
+    def __names(self, names):
+        if names is None:
+            return list(self.reserves)
+        for name in names:
+            if name not in self.reserves:
+                raise KeyError('reserve {} not in fleet'.format(name))
+        return list(names)
+
+    def __run(self, operation, name):
+        start = time.time()
+        try:
+            result = operation(name, self.reserves[name])
+            error = None
+        except Exception as e:
+            result = None
+            error = e
+        return FleetResult(name, result, error, time.time() - start)
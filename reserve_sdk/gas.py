@@ -0,0 +1,98 @@
+"""Gas cost model of the conversion rates contract rate updates.
+
+The constants are measured from steady state updates, where every written
+storage slot already holds a value. The first write to a slot costs more.
+"""
+
+# Fixed cost of a setCompactData transaction, intrinsic gas included.
+SET_COMPACT_DATA_GAS = 24100
+# Fixed cost of a setBaseRate transaction, intrinsic gas included.
+SET_BASE_RATE_GAS = 34600
+# Cost of writing one bytes14 buy/sell array pair.
+COMPACT_ARRAY_GAS = 8100
+# Cost of writing base buy/sell rates of one token.
+BASE_RATE_TOKEN_GAS = 13600
+# Transaction data cost of zero and non-zero bytes.
+ZERO_BYTE_GAS = 4
+NONZERO_BYTE_GAS = 68
+# Expected extra cost of a token drifting out of the compact data range in a
+# later update: a setBaseRate replaces the setCompactData of that update.
+OVERFLOW_GAS = SET_BASE_RATE_GAS - SET_COMPACT_DATA_GAS + BASE_RATE_TOKEN_GAS
+
+# Gas limits of token listing transactions. They are sent before the previous
+# ones are mined so their gas can not be estimated, the limits are measured
+# from first writes with a margin.
+ADD_TOKEN_GAS_LIMIT = 300000
+SET_TOKEN_CONTROL_INFO_GAS_LIMIT = 110000
+ENABLE_TOKEN_TRADE_GAS_LIMIT = 50000
+STEP_FUNCTION_GAS_LIMIT = 160000
+STEP_FUNCTION_POINT_GAS_LIMIT = 46000
+# First write costs of base rates of a token and of a bytes14 array pair.
+BASE_RATE_TOKEN_FIRST_GAS = 45000
+COMPACT_ARRAY_FIRST_GAS = 25000
+
+
+def estimate_set_compact_data_gas(num_arrays):
+    """Estimate gas used by setCompactData.
+
+    :arg int num_arrays: number of bytes14 arrays written
+    """
+    return SET_COMPACT_DATA_GAS + num_arrays * COMPACT_ARRAY_GAS
+
+
+def estimate_set_base_rate_gas(num_tokens, num_arrays):
+    """Estimate gas used by setBaseRate.
+
+    :arg int num_tokens: number of tokens whose base rates are written
+    :arg int num_arrays: number of bytes14 arrays written
+    """
+    return (SET_BASE_RATE_GAS +
+            num_tokens * BASE_RATE_TOKEN_GAS +
+            num_arrays * COMPACT_ARRAY_GAS)
+
+
+def estimate_rate_update_gas(num_base_tokens, num_arrays):
+    """Estimate gas of the transaction setting the given update.
+
+    setBaseRate is used if any token base rate is changed, setCompactData
+    otherwise.
+    """
+    if num_base_tokens:
+        return estimate_set_base_rate_gas(num_base_tokens, num_arrays)
+    return estimate_set_compact_data_gas(num_arrays)
+
+
+def estimate_compact_data_calldata_gas(num_arrays):
+    """Estimate the calldata gas of a setCompactData transaction.
+
+    Every bytes14 value is counted as 14 non-zero bytes, indices and array
+    lengths as one non-zero byte.
+
+    :arg int num_arrays: number of bytes14 arrays written
+    """
+    # selector, 3 array offsets, block number and 3 array lengths
+    zero_bytes = 3 * 31 + 29 + 3 * 31
+    nonzero_bytes = 4 + 3 + 3 + 3
+    # buy and sell bytes14 values, array index
+    zero_bytes += num_arrays * (2 * 18 + 31)
+    nonzero_bytes += num_arrays * (2 * 14 + 1)
+    return zero_bytes * ZERO_BYTE_GAS + nonzero_bytes * NONZERO_BYTE_GAS
+
+
+def step_function_gas_limit(num_points):
+    """Return the gas limit of setQtyStepFunction or setImbalanceStepFunction.
+
+    :arg int num_points: the length of the longest step function array
+    """
+    return STEP_FUNCTION_GAS_LIMIT + num_points * STEP_FUNCTION_POINT_GAS_LIMIT
+
+
+def initial_rates_gas_limit(num_tokens, num_arrays):
+    """Return the gas limit of a setBaseRate writing rates of new tokens.
+
+    :arg int num_tokens: number of tokens whose base rates are written
+    :arg int num_arrays: number of bytes14 arrays written
+    """
+    return (SET_BASE_RATE_GAS +
+            num_tokens * BASE_RATE_TOKEN_FIRST_GAS +
+            num_arrays * COMPACT_ARRAY_FIRST_GAS)
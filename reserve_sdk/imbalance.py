@@ -0,0 +1,245 @@
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from concurrent import futures
+
+# Number of block records of a token kept by the pricing contract.
+SLIDING_WINDOW_SIZE = 5
+ETH_ADDRESS = '0xEeeeeEeeeEeEeeEeEeEeeEEEeeeeEeeeeeeeEEeE'
+# Rate update blocks kept, keyed by (token, block).
+RATE_UPDATE_BLOCKS = 1024
+
+__MASK_64 = 2**64 - 1
+
+"""Imbalance record of a token for one block, as packed in
+tokenImbalanceData. Imbalances are in minimal record resolution units.
+
+    * last_block_imbalance: imbalance recorded in last_block
+    * last_block: the block of the record
+    * total_imbalance: imbalance since last_rate_update_block, up to
+      last_block included
+    * last_rate_update_block: the rate update block of the record
+"""
+ImbalanceRecord = namedtuple('ImbalanceRecord', (
+    'last_block_imbalance', 'last_block', 'total_imbalance',
+    'last_rate_update_block'))
+"""Imbalance of a token at a block, in token wei.
+
+    * total: imbalance since the last rate update, positive when the reserve
+      sold more tokens than it bought
+    * block: imbalance of the block
+    * buy_headroom: largest quantity of tokens the reserve can sell
+    * sell_headroom: largest quantity of tokens the reserve can buy
+"""
+Imbalance = namedtuple('Imbalance', (
+    'total', 'block', 'buy_headroom', 'sell_headroom'))
+
+
+def _int64(value):
+    return value - 2**64 if value >= 2**63 else value
+
+
+def decode_imbalance_record(data):
+    """Decode a tokenImbalanceData value into an ImbalanceRecord."""
+    return ImbalanceRecord(
+        _int64(data & __MASK_64),
+        (data >> 64) & __MASK_64,
+        _int64((data >> 128) & __MASK_64),
+        data >> 192)
+
+
+def encode_imbalance_record(record):
+    """Pack an ImbalanceRecord as tokenImbalanceData does."""
+    return ((record.last_block_imbalance & __MASK_64) |
+            record.last_block << 64 |
+            (record.total_imbalance & __MASK_64) << 128 |
+            record.last_rate_update_block << 192)
+
+
+def imbalance_in_range(records, start_block, end_block):
+    """Return the sum of imbalances of records in a block range."""
+    return sum(r.last_block_imbalance for r in records
+               if start_block <= r.last_block <= end_block)
+
+
+def imbalance_since_rate_update(records, rate_update_block, block):
+    """Return the (total, block) imbalances, in units, the pricing contract
+    computes at block for given rate update block."""
+    total, block_imbalance, latest_block = 0, 0, 0
+    for record in records:
+        if record.last_rate_update_block != rate_update_block or \
+                record.last_block < latest_block:
+            continue
+        latest_block = record.last_block
+        total = record.total_imbalance
+        if record.last_block == block:
+            block_imbalance = record.last_block_imbalance
+    if total == 0:
+        total = imbalance_in_range(records, rate_update_block, block)
+    return total, block_imbalance
+
+
+def add_imbalance(records, units, rate_update_block, block):
+    """Record units of imbalance at block in records, as recordImbalance of
+    the pricing contract does."""
+    idx = block % SLIDING_WINDOW_SIZE
+    record = records[idx]
+    if record.last_block == block:
+        if record.last_rate_update_block == rate_update_block:
+            record = record._replace(
+                last_block_imbalance=record.last_block_imbalance + units,
+                total_imbalance=record.total_imbalance + units)
+        else:
+            # rates were updated in the middle of the block
+            record = ImbalanceRecord(
+                record.last_block_imbalance + units, block,
+                imbalance_in_range(records, rate_update_block, block) +
+                units, rate_update_block)
+    else:
+        total, _ = imbalance_since_rate_update(
+            records, rate_update_block, block)
+        record = ImbalanceRecord(units, block, total + units,
+                                 rate_update_block)
+    records[idx] = record
+
+
+class ImbalanceTracker:
+    """ImbalanceTracker keeps the imbalance of tokens in memory.
+
+    The imbalance records of the tokens are read and decoded once, then
+    updated from TradeExecute events of the reserve contract, polled through
+    a log filter at most once per sync_interval.
+
+    The rate update block of a token at a trade is read at the end of the
+    block of the trade, a rate update following a trade in its block is not
+    told apart.
+    """
+
+    def __init__(self, fund, pricing, tokens, sync_interval=1,
+                 max_workers=4):
+        """Create an ImbalanceTracker and read the imbalance records.
+
+        :arg fund: the ReserveContract emitting trade events
+        :arg pricing: the ConversionRatesContract recording imbalances
+        :arg list(str) tokens: the tracked token addresses
+        :arg float sync_interval: time between two polls of trade events,
+            in seconds
+        :arg int max_workers: number of concurrent reads
+        """
+        self.fund = fund
+        self.pricing = pricing
+        self.tokens = list(tokens)
+        self.sync_interval = sync_interval
+        self.executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.__lock = threading.RLock()
+        self.__rate_update_blocks = OrderedDict()
+        self.reload()
+
+    def reload(self):
+        """Read the imbalance records and control info of the tokens, and
+        poll trade events from there."""
+        with self.__lock:
+            w3 = self.pricing.w3
+            block = w3.eth.blockNumber
+            functions = self.pricing.contract.functions
+            calls = []
+            for token in self.tokens:
+                calls.append(functions.getTokenControlInfo(token))
+                calls.extend(functions.tokenImbalanceData(token, idx)
+                             for idx in range(SLIDING_WINDOW_SIZE))
+            results = list(self.executor.map(
+                lambda func: func.call(block_identifier=block), calls))
+
+            step = SLIDING_WINDOW_SIZE + 1
+            self.__control_info = {}
+            self.__records = {}
+            for idx, token in enumerate(self.tokens):
+                token_results = results[idx * step:idx * step + step]
+                self.__control_info[token] = token_results[0]
+                self.__records[token] = [
+                    decode_imbalance_record(data)
+                    for data in token_results[1:]]
+            self.__filter = self.fund.contract.events.TradeExecute \
+                .createFilter(fromBlock=block + 1)
+            self.__block = block
+            self.__last_sync = time.time()
+
+    def sync(self):
+        """Apply trades of the blocks mined since the last sync.
+
+        The records are read again if the log filter is lost by the node.
+        """
+        with self.__lock:
+            block = self.pricing.w3.eth.blockNumber
+            try:
+                entries = self.__filter.get_new_entries()
+            except ValueError:
+                self.reload()
+                return
+            self.__last_sync = time.time()
+            for event in sorted(entries, key=lambda e: (
+                    e['blockNumber'], e['logIndex'])):
+                args = event['args']
+                if args['src'] == ETH_ADDRESS:
+                    token, amount = args['destToken'], args['destAmount']
+                else:
+                    token, amount = args['src'], -args['srcAmount']
+                if token not in self.__records:
+                    continue
+                # solidity division truncates toward zero
+                resolution = self.__control_info[token][0]
+                units = abs(amount) // resolution
+                event_block = event['blockNumber']
+                add_imbalance(
+                    self.__records[token], units if amount > 0 else -units,
+                    self.__rate_update_block(token, event_block),
+                    event_block)
+                block = max(block, event_block)
+            self.__block = block
+
+    def __rate_update_block(self, token, block):
+        key = token, block
+        if key not in self.__rate_update_blocks:
+            self.__rate_update_blocks[key] = \
+                self.pricing.contract.functions.getRateUpdateBlock(
+                    token).call(block_identifier=block)
+            while len(self.__rate_update_blocks) > RATE_UPDATE_BLOCKS:
+                self.__rate_update_blocks.popitem(last=False)
+        return self.__rate_update_blocks[key]
+
+    def __synced(self):
+        if time.time() - self.__last_sync >= self.sync_interval:
+            self.sync()
+
+    def records(self, token):
+        """Return the ImbalanceRecord list of token, in window order."""
+        with self.__lock:
+            self.__synced()
+            return list(self.__records[token])
+
+    def imbalance(self, token, block=None):
+        """Return the Imbalance of token for a trade at block.
+
+        :arg str token: the token address
+        :arg int block: the block of the trade, default to the block after
+            the last synced one
+        """
+        with self.__lock:
+            self.__synced()
+            if block is None:
+                block = self.__block + 1
+            resolution, max_per_block, max_total = \
+                self.__control_info[token]
+            rate_update_block = self.__rate_update_block(
+                token, min(block, self.__block))
+            total, block_imbalance = imbalance_since_rate_update(
+                self.__records[token], rate_update_block, block)
+        total *= resolution
+        block_imbalance *= resolution
+        # a trade is rejected once an imbalance reaches its limit
+        return Imbalance(
+            total, block_imbalance,
+            max(0, min(max_total - total,
+                       max_per_block - block_imbalance) - 1),
+            max(0, min(max_total + total,
+                       max_per_block + block_imbalance) - 1))
@@ -0,0 +1,228 @@
+import threading
+from collections import OrderedDict
+
+from .contract import TOKENS_PER_ARRAY
+from .utils import hexlify
+
+
+class RateKeepalive:
+    """RateKeepalive refreshes compact data arrays before their rates
+    expire.
+
+    Rates of a token are valid for validRateDurationInBlocks blocks after the
+    rate update block of its bytes14 compact data array. The arrays whose
+    rates expire within margin_blocks are sent again in one setCompactData
+    transaction per sending account, with the bytes last sent, so the
+    keepalive gas grows with the number of quiet arrays only.
+
+    The arrays are read from a ReserveState, then followed from the updates
+    sent by the pricing contract set_rates, once its rate_keepalive attribute
+    is set. The bytes and the rate update block of an array whose update
+    fails are read again from chain, for the tokens in the token indices of
+    the pricing contract. Arrays already expired are never refreshed, that
+    would bring back rates left to expire.
+
+    Connection errors of the background thread are retried on the next
+    poll, other exceptions are kept in the last_error attribute.
+    """
+
+    def __init__(self, pricing, state, margin_blocks=10, poll_interval=1):
+        """Create a RateKeepalive.
+
+        :arg pricing: ConversionRatesContract sending the refreshes
+        :arg state: ReserveState of the reserve, from Reserve.load_state
+        :arg int margin_blocks: number of blocks before expiry an array is
+            refreshed at
+        :arg float poll_interval: time between two checks of the background
+            thread, in seconds
+        """
+        self.pricing = pricing
+        self.margin_blocks = margin_blocks
+        self.poll_interval = poll_interval
+        self.last_tx_hash = None
+        self.last_error = None
+        self.__lock = threading.RLock()
+        self.__stopped = threading.Event()
+        self.__thread = None
+        self.reload(state)
+
+    def reload(self, state):
+        """Replace the compact data arrays and their rate update blocks by
+        the on-chain ones, and read the valid rate duration.
+
+        :arg state: ReserveState of the reserve
+        """
+        duration = self.pricing.contract.functions \
+            .validRateDurationInBlocks().call(
+                block_identifier=state.block_number)
+        arrays = {}
+        for token_state in state.tokens.values():
+            array_idx, field_idx = token_state.index
+            if array_idx not in arrays:
+                arrays[array_idx] = (bytearray(TOKENS_PER_ARRAY),
+                                     bytearray(TOKENS_PER_ARRAY),
+                                     token_state.rate_update_block)
+            buy, sell, _ = arrays[array_idx]
+            buy[field_idx] = token_state.compact_buy % 256
+            sell[field_idx] = token_state.compact_sell % 256
+        with self.__lock:
+            self.duration = duration
+            self.__arrays = {
+                array_idx: (hexlify(buy), hexlify(sell), block)
+                for array_idx, (buy, sell, block) in arrays.items()
+            }
+
+    def observe(self, buy, sell, indices, block_number, tx_hash):
+        """Record compact data arrays sent by a transaction.
+
+        :arg list(str) buy, sell: the hex encoded bytes14 arrays
+        :arg list(int) indices: the indices of the arrays
+        :arg int block_number: the rate update block sent
+        :arg tx_hash: the transaction hash
+        """
+        with self.__lock:
+            for array_idx, array_buy, array_sell in zip(indices, buy, sell):
+                self.__arrays[array_idx] = (array_buy, array_sell,
+                                            block_number)
+        self.pricing.track(tx_hash).add_done_callback(
+            self.__callback(indices, block_number))
+
+    def rate_update_block(self, array_idx):
+        """Return the rate update block of an array, None if unknown."""
+        with self.__lock:
+            if array_idx not in self.__arrays:
+                return None
+            return self.__arrays[array_idx][2]
+
+    def expiring(self, block):
+        """Return the sorted indices of the arrays to refresh at block."""
+        with self.__lock:
+            return sorted(
+                array_idx
+                for array_idx, (_, _, update) in self.__arrays.items()
+                if update + self.duration - self.margin_blocks <= block <
+                update + self.duration)
+
+    def next_refresh_block(self, block):
+        """Return the first block from block an array is to be refreshed
+        at, or None if all arrays expired."""
+        with self.__lock:
+            due = [max(block, update + self.duration - self.margin_blocks)
+                   for _, _, update in self.__arrays.values()
+                   if block < update + self.duration]
+        return min(due) if due else None
+
+    def refresh(self, block=None):
+        """Send the expiring arrays again.
+
+        With an account pool on the pricing contract, every pool account
+        sends the expiring arrays it updates in its own transaction.
+
+        :arg int block: the latest block number, read if not given
+        :return: the transaction hash, the list of transaction hashes if
+            several accounts send arrays, or None if no array is expiring
+        """
+        pricing = self.pricing
+        # set_rates records its arrays under the same lock, a refresh never
+        # overwrites a newer update
+        with pricing.nonce_manager.lock(pricing.account.address):
+            if block is None:
+                block = pricing.w3.eth.blockNumber
+            lanes = OrderedDict()
+            with self.__lock:
+                for array_idx in self.expiring(block):
+                    address = pricing.account_for(array_idx).address
+                    lanes.setdefault(address, []).append(array_idx)
+                arrays = [([self.__arrays[idx][0] for idx in indices],
+                           [self.__arrays[idx][1] for idx in indices],
+                           indices)
+                          for indices in lanes.values()]
+            if not arrays:
+                return None
+            funcs = [pricing.contract.functions.setCompactData(
+                buy, sell, block, indices) for buy, sell, indices in arrays]
+            routes = [indices[0] for indices in lanes.values()]
+            if len(funcs) == 1:
+                tx_hashes = [pricing.call_contract_func(
+                    funcs[0], route=routes[0])]
+            else:
+                tx_hashes = pricing.call_contract_funcs(funcs, routes=routes)
+            for (buy, sell, indices), tx_hash in zip(arrays, tx_hashes):
+                self.observe(buy, sell, indices, block, tx_hash)
+        tx_hash = tx_hashes[0] if len(tx_hashes) == 1 else tx_hashes
+        self.last_tx_hash = tx_hash
+        return tx_hash
+
+    def start(self):
+        """Refresh the expiring arrays in a background thread."""
+        with self.__lock:
+            if self.__thread is not None:
+                return
+            self.__stopped.clear()
+            self.__thread = threading.Thread(target=self.__run, daemon=True)
+            self.__thread.start()
+
+    def stop(self):
+        """Stop the background thread."""
+        with self.__lock:
+            thread, self.__thread = self.__thread, None
+        if thread is not None:
+            self.__stopped.set()
+            thread.join()
+
+    def __run(self):
+        while not self.__stopped.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except OSError:
+                # connection errors are retried on the next poll
+                pass
+            except Exception as e:
+                self.last_error = e
+
+    def __callback(self, indices, block_number):
+        """Return a receipt callback reading again the arrays of a failed
+        transaction."""
+        def callback(future):
+            if future.exception() is None:
+                return
+            for array_idx in indices:
+                try:
+                    self.__reload_array(array_idx, block_number)
+                except Exception as e:
+                    # the bytes on chain are not known, the array is dropped
+                    self.last_error = e
+                    self.__drop_array(array_idx, block_number)
+        return callback
+
+    def __reload_array(self, array_idx, block_number):
+        """Read an array from chain, unless it was sent again since the
+        update of block_number."""
+        pricing = self.pricing
+        functions = pricing.contract.functions
+        tokens = [(token, index.field_idx)
+                  for token, index in list(pricing.token_indices.items())
+                  if index.array_idx == array_idx]
+        if not tokens:
+            self.__drop_array(array_idx, block_number)
+            return
+        block = pricing.w3.eth.blockNumber
+        buy, sell = bytearray(TOKENS_PER_ARRAY), bytearray(TOKENS_PER_ARRAY)
+        for token, field_idx in tokens:
+            _, _, compact_buy, compact_sell = functions.getCompactData(
+                token).call(block_identifier=block)
+            buy[field_idx] = compact_buy[0]
+            sell[field_idx] = compact_sell[0]
+        update = functions.getRateUpdateBlock(tokens[0][0]).call(
+            block_identifier=block)
+        with self.__lock:
+            array = self.__arrays.get(array_idx)
+            if array is not None and array[2] == block_number:
+                self.__arrays[array_idx] = (hexlify(buy), hexlify(sell),
+                                            update)
+
+    def __drop_array(self, array_idx, block_number):
+        with self.__lock:
+            array = self.__arrays.get(array_idx)
+            if array is not None and array[2] == block_number:
+                del self.__arrays[array_idx]
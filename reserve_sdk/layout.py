@@ -0,0 +1,118 @@
+from collections import namedtuple
+
+from .contract import TokenIndex, TOKENS_PER_ARRAY
+from .gas import (
+    estimate_set_compact_data_gas, estimate_compact_data_calldata_gas)
+
+
+"""Cost of an update set for a slot layout.
+
+    * arrays: number of compact data arrays written by the update
+    * calldata_gas: the estimated calldata gas of the setCompactData
+    * gas: the estimated gas used by the setCompactData
+"""
+UpdateCost = namedtuple('UpdateCost', ('arrays', 'calldata_gas', 'gas'))
+
+
+def predict_token_indices(tokens, listed_count=0):
+    """Predict the compact data slots of tokens listed in given order.
+
+    The conversion rates contract gives the next free field of the last
+    array to every added token.
+
+    :arg list(str) tokens: token addresses in listing order
+    :arg int listed_count: number of tokens already listed
+    :return: dict of token address to TokenIndex
+    """
+    return {
+        token: TokenIndex(*divmod(listed_count + idx, TOKENS_PER_ARRAY))
+        for idx, token in enumerate(tokens)
+    }
+
+
+def plan_token_layout(tokens, frequencies=None, groups=None, listed_count=0):
+    """Choose the listing order of tokens so tokens updated together share
+    compact data arrays.
+
+    Arrays are filled in listing order. The most frequently updated group
+    fitting in the free fields of the current array is placed next, co-update
+    groups are split only if no group fits the fields left.
+
+    :arg list(str) tokens: token addresses to list
+    :arg dict frequencies: token address to its expected update frequency,
+        tokens missing are never updated
+    :arg list(list(str)) groups: tokens updated together, tokens not in any
+        group are placed on their own
+    :arg int listed_count: number of tokens already listed
+    :return: the list of token addresses in listing order
+    """
+    frequencies = frequencies or {}
+    grouped = set()
+    units = []
+    for group in groups or []:
+        unit = [t for t in group if t in tokens and t not in grouped]
+        grouped.update(unit)
+        # groups larger than an array are split into full arrays
+        for start in range(0, len(unit), TOKENS_PER_ARRAY):
+            units.append(unit[start:start + TOKENS_PER_ARRAY])
+    units.extend([t] for t in tokens if t not in grouped)
+
+    def unit_frequency(unit):
+        return sum(frequencies.get(t, 0) for t in unit)
+
+    # hottest units first, bigger units first on ties
+    units.sort(key=lambda unit: (-unit_frequency(unit), -len(unit)))
+
+    order = []
+    space = TOKENS_PER_ARRAY - listed_count % TOKENS_PER_ARRAY
+    while units:
+        for idx, unit in enumerate(units):
+            if len(unit) <= space:
+                del units[idx]
+                break
+        else:
+            # no unit fits the fields left, split the hottest one
+            unit, units[0] = units[0][:space], units[0][space:]
+        order.extend(unit)
+        space -= len(unit)
+        if space == 0:
+            space = TOKENS_PER_ARRAY
+
+    return order
+
+
+def update_cost(update_set, token_indices):
+    """Return the cost of updating given tokens together.
+
+    :arg list(str) update_set: token addresses updated together
+    :arg dict token_indices: token address to TokenIndex
+    :return: UpdateCost
+    """
+    arrays = len(set(token_indices[t].array_idx for t in update_set))
+    return UpdateCost(arrays,
+                      estimate_compact_data_calldata_gas(arrays),
+                      estimate_set_compact_data_gas(arrays))
+
+
+def onboard_tokens(pricing, specs, order):
+    """List tokens on pricing contract in given order.
+
+    The listing transactions are pipelined by add_new_tokens, so the listing
+    order is kept if every transaction succeeds.
+
+    :arg pricing: ConversionRatesContract listing the tokens
+    :arg dict specs: token address to its (minimal_record_resolution,
+        max_per_block_imbalance, max_total_imbalance)
+    :arg list(str) order: token addresses in listing order, usually from
+        plan_token_layout
+    :return: dict of token address to TokenIndex
+    :raise: TransactionFailed or TransactionTimeout of the first failed
+        listing transaction
+    """
+    batch = pricing.add_new_tokens(
+        [(token,) + tuple(specs[token]) for token in order])
+    failures = batch.failures()
+    for tx_hash in batch.tx_hashes:
+        if tx_hash in failures:
+            raise failures[tx_hash]
+    return {token: pricing.token_indices[token] for token in order}
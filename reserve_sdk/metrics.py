@@ -0,0 +1,181 @@
+import json
+import math
+import threading
+import time
+from collections import Counter, deque
+
+
+class RPCCounter:
+    """RPCCounter is a web3 middleware counting JSON-RPC requests.
+
+    Install it with ``w3.middleware_stack.add(counter)``.
+    """
+
+    def __init__(self):
+        """Create a counter with no request counted."""
+        self.__lock = threading.Lock()
+        self.count = 0
+        self.methods = Counter()
+
+    def __call__(self, make_request, w3):
+        def middleware(method, params):
+            with self.__lock:
+                self.count += 1
+                self.methods[method] += 1
+            return make_request(method, params)
+        return middleware
+
+    def reset(self):
+        """Reset all counters to zero."""
+        with self.__lock:
+            self.count = 0
+            self.methods.clear()
+
+
+# Stages of a rate update, in order.
+INTENT = 'intent'
+READS_DONE = 'reads_done'
+SIGNED = 'signed'
+BROADCAST = 'broadcast'
+INCLUDED = 'included'
+CONFIRMED = 'confirmed'
+STAGES = (INTENT, READS_DONE, SIGNED, BROADCAST, INCLUDED, CONFIRMED)
+# Percentiles reported by snapshots.
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, q):
+    """Return the q-th percentile of values, by nearest rank.
+
+    :arg list values: the values, not empty
+    :arg float q: the percentile, between 0 and 100
+    """
+    ordered = sorted(values)
+    rank = int(math.ceil(q / 100 * len(ordered)))
+    return ordered[max(rank, 1) - 1]
+
+
+def summarize(values):
+    """Return percentiles and max of values, None for no values."""
+    if not values:
+        return None
+    summary = {'p{}'.format(q): percentile(values, q) for q in PERCENTILES}
+    summary['max'] = max(values)
+    return summary
+
+
+class UpdateTrace:
+    """UpdateTrace records when a rate update reached each stage."""
+
+    def __init__(self, tokens, on_included=None):
+        """Create a trace of an update received now.
+
+        :arg list(str) tokens: the tokens of the update
+        :arg on_included: function called with the trace once included
+        """
+        self.tokens = tuple(tokens)
+        self.times = {INTENT: time.time()}
+        self.blocks = {}
+        self.failed = False
+        self.__on_included = on_included
+
+    def mark(self, stage, block=None):
+        """Record the update reached stage now, at block if known."""
+        self.times[stage] = time.time()
+        if block is not None:
+            self.blocks[stage] = block
+        if stage == INCLUDED and self.__on_included is not None:
+            self.__on_included(self)
+
+    def fail(self):
+        """Record the update transactions failed."""
+        self.failed = True
+
+    def seconds(self, stage=INCLUDED):
+        """Return the time from intent to stage, None if not reached."""
+        if stage not in self.times:
+            return None
+        return self.times[stage] - self.times[INTENT]
+
+    def block_count(self, stage=INCLUDED):
+        """Return the blocks from the block rates were computed at to stage,
+        None if not reached."""
+        if stage not in self.blocks or READS_DONE not in self.blocks:
+            return None
+        return self.blocks[stage] - self.blocks[READS_DONE]
+
+
+class LatencyMetrics:
+    """LatencyMetrics keeps the latency of the last included rate updates,
+    from the update intent to its inclusion in a block.
+    """
+
+    def __init__(self, window=1000):
+        """Create LatencyMetrics.
+
+        :arg int window: number of included updates kept
+        """
+        self.__lock = threading.Lock()
+        self.__traces = deque(maxlen=window)
+        self.__pending = set()
+        self.failed = 0
+
+    def begin(self, tokens):
+        """Start the trace of an update of tokens.
+
+        :return: UpdateTrace
+        """
+        trace = UpdateTrace(tokens, self.__included)
+        with self.__lock:
+            self.__pending.add(trace)
+        return trace
+
+    def __included(self, trace):
+        with self.__lock:
+            self.__pending.discard(trace)
+            self.__traces.append(trace)
+
+    def failure(self, trace):
+        """Record the failure of a traced update."""
+        trace.fail()
+        with self.__lock:
+            self.__pending.discard(trace)
+            self.failed += 1
+
+    def snapshot(self, tokens=None):
+        """Return latency percentiles of the kept updates.
+
+        :arg list(str) tokens: only count updates of any of these tokens
+        :return: JSON serializable dict of
+
+            * count: number of included updates counted
+            * pending: number of updates not included yet
+            * failed: number of failed updates
+            * seconds, blocks: percentiles and max of intent to inclusion
+              latency, in seconds and in blocks
+            * stages: percentiles of time from intent to every stage
+        """
+        with self.__lock:
+            traces = list(self.__traces)
+            pending = len(self.__pending)
+        if tokens is not None:
+            tokens = set(tokens)
+            traces = [t for t in traces if tokens.intersection(t.tokens)]
+
+        blocks = [t.block_count() for t in traces]
+        return {
+            'count': len(traces),
+            'pending': pending,
+            'failed': self.failed,
+            'seconds': summarize([t.seconds() for t in traces]),
+            'blocks': summarize([b for b in blocks if b is not None]),
+            'stages': {
+                stage: summarize([t.seconds(stage) for t in traces
+                                  if stage in t.times])
+                for stage in STAGES[1:]
+            },
+        }
+
+    def export(self, fp, tokens=None):
+        """Write a snapshot as JSON to a file object."""
+        json.dump(self.snapshot(tokens), fp)
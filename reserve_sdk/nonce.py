@@ -0,0 +1,65 @@
+import threading
+
+
+class NonceManager:
+    """NonceManager hands out transaction nonces of local accounts.
+
+    Nonces are tracked per account address, so every contract sharing a
+    manager and a signing key sends transactions in one ordered sequence.
+    The next nonce is the highest of the locally tracked one and the pending
+    transaction count on chain, transactions sent outside of the manager are
+    therefore still accounted for.
+    """
+
+    def __init__(self):
+        """Create an empty NonceManager."""
+        self.__lock = threading.Lock()
+        self.__account_locks = {}
+        self.__nonces = {}
+
+    def lock(self, address):
+        """Return the lock serializing transactions of given address.
+
+        Hold it while assigning a nonce and broadcasting the transaction to
+        keep per-account ordering.
+        """
+        with self.__lock:
+            if address not in self.__account_locks:
+                self.__account_locks[address] = threading.RLock()
+            return self.__account_locks[address]
+
+    def next_nonce(self, w3, address):
+        """Return the next nonce of given address and reserve it.
+
+        :arg w3: web3 instance
+        :arg str address: account address
+        """
+        return self.allocate(w3, address, 1)[0]
+
+    def allocate(self, w3, address, count):
+        """Reserve a range of consecutive nonces for given address.
+
+        Only one RPC is used no matter how many nonces are reserved, which
+        allows pipelining transactions without waiting for them to be mined.
+
+        :arg w3: web3 instance
+        :arg str address: account address
+        :arg int count: number of nonces to reserve
+        :return: list of nonces
+        """
+        with self.lock(address):
+            nonce = max(
+                w3.eth.getTransactionCount(address, 'pending'),
+                self.__nonces.get(address, 0)
+            )
+            self.__nonces[address] = nonce + count
+            return list(range(nonce, nonce + count))
+
+    def reset(self, address):
+        """Forget the locally tracked nonce of given address.
+
+        Should be called when a transaction using a reserved nonce could not
+        be broadcast, so the next nonce is read from chain again.
+        """
+        with self.lock(address):
+            self.__nonces.pop(address, None)
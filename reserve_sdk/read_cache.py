@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ReadCache:
+    """ReadCache keeps results of contract read functions.
+
+    Results read at the latest block are keyed by the block number the node
+    reports and read at that block, they are dropped once a new block is
+    seen. Results read at an explicit block number never change and are kept
+    until evicted by newer ones. Both are bounded least recently used stores.
+
+    A ReadCache can be shared by contracts of the same chain.
+    """
+
+    def __init__(self, maxsize=1024, block_interval=0):
+        """Create an empty ReadCache.
+
+        :arg int maxsize: maximum number of results kept for the latest block,
+            and for explicit block numbers
+        :arg float block_interval: time the latest block number is trusted
+            before being read again, in seconds. By default it is read before
+            every read, a positive interval serves results of the previous
+            block for up to that time after a new block.
+        """
+        self.maxsize = maxsize
+        self.block_interval = block_interval
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        self.__latest = OrderedDict()
+        self.__historical = OrderedDict()
+        self.__block = None
+        self.__block_time = 0
+
+    def block_number(self, w3):
+        """Return the latest block number, read at most once per
+        block_interval.
+        """
+        with self.__lock:
+            if self.__block is not None and \
+                    time.time() - self.__block_time < self.block_interval:
+                return self.__block
+        block = w3.eth.blockNumber
+        self.set_block_number(block)
+        return block
+
+    def set_block_number(self, block):
+        """Set the latest block number, results of older blocks expire."""
+        with self.__lock:
+            self.__block_time = time.time()
+            if block != self.__block:
+                self.__block = block
+                self.__latest.clear()
+
+    def call(self, w3, address, func, block_number=None):
+        """Return the result of a contract read function, from the cache if
+        it was read already.
+
+        :arg w3: web3 instance
+        :arg str address: the contract address
+        :arg func: the contract function with parameters
+        :arg int block_number: the block to read at, default to the latest
+            block
+        """
+        if block_number is None:
+            store = self.__latest
+            block = self.block_number(w3)
+        else:
+            store = self.__historical
+            block = block_number
+        key = (address, func.fn_name, repr(func.args), block)
+
+        with self.__lock:
+            if key in store:
+                store.move_to_end(key)
+                self.hits += 1
+                return store[key]
+            self.misses += 1
+
+        result = func.call(block_identifier=block)
+        with self.__lock:
+            if block_number is not None or block == self.__block:
+                store[key] = result
+                while len(store) > self.maxsize:
+                    store.popitem(last=False)
+        return result
+
+    def clear(self):
+        """Drop all results and reset the counters."""
+        with self.__lock:
+            self.__latest.clear()
+            self.__historical.clear()
+            self.hits = 0
+            self.misses = 0
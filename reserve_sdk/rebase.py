@@ -0,0 +1,217 @@
+from collections import deque, namedtuple, OrderedDict
+
+from .contract import get_compact_data, REBASE_THRESHOLD
+from .gas import estimate_rate_update_gas
+
+
+"""Result of a simulated rate update series.
+
+    * blocks: number of simulated blocks
+    * updates: number of rate update transactions
+    * base_rate_updates: number of setBaseRate transactions in price updates
+    * rebase_updates: number of setBaseRate transactions sent by the planner
+    * gas: the estimated gas used by all transactions
+"""
+SimulationResult = namedtuple('SimulationResult', (
+    'blocks', 'updates', 'base_rate_updates', 'rebase_updates', 'gas'))
+
+# A compact offset overflows from these values, in thousandths.
+MAX_OFFSET = 127
+MIN_OFFSET = -128
+
+
+def rate_offset(rate, base):
+    """Return the offset of rate from base, in thousandths."""
+    if base == 0:
+        return 0
+    return (rate / base - 1) * 1000
+
+
+class RebasePlanner:
+    """RebasePlanner re-bases drifting tokens before their compact offset
+    overflows.
+
+    The offsets of every rate update are recorded, tokens whose offset is
+    predicted to overflow within the horizon are re-based in quiet blocks so
+    updates on the hot path stay on the cheap setCompactData.
+    """
+
+    def __init__(self, token_indices, horizon=20, window=10,
+                 threshold=REBASE_THRESHOLD):
+        """Create a RebasePlanner.
+
+        :arg dict token_indices: token address to TokenIndex, usually the
+            token_indices attribute of ConversionRatesContract
+        :arg int horizon: re-base tokens predicted to overflow within this
+            number of blocks
+        :arg int window: number of recorded updates used to predict drift
+        :arg int threshold: re-base tokens whose offset reached this value
+        """
+        self.token_indices = token_indices
+        self.horizon = horizon
+        self.window = window
+        self.threshold = threshold
+        self.__history = {}
+
+    def observe(self, token, block, base_buy, base_sell, buy, sell):
+        """Record an update of token rates.
+
+        :arg str token: token address
+        :arg int block: block number of the update
+        :arg int base_buy: the base buy rate on contract
+        :arg int base_sell: the base sell rate on contract
+        :arg int buy: the new buy rate
+        :arg int sell: the new sell rate
+        """
+        if token not in self.__history:
+            self.__history[token] = deque(maxlen=self.window)
+        history = self.__history[token]
+        # a new base starts a new drift
+        if history and history[-1][1] != (base_buy, base_sell):
+            history.clear()
+        history.append((block, (base_buy, base_sell), (
+            rate_offset(buy, base_buy), rate_offset(sell, base_sell))))
+
+    def blocks_to_overflow(self, token):
+        """Predict the number of blocks before the offset of token overflows.
+
+        The drift is the least squares slope of the recorded offsets.
+
+        :return: the number of blocks, None if the token does not drift
+            towards an overflow
+        """
+        history = self.__history.get(token)
+        if not history:
+            return None
+
+        blocks = [h[0] for h in history]
+        predictions = []
+        for side in (0, 1):
+            offsets = [h[2][side] for h in history]
+            current = offsets[-1]
+            if current >= MAX_OFFSET or current <= MIN_OFFSET:
+                return 0
+            slope = _slope(blocks, offsets)
+            if slope > 0:
+                predictions.append((MAX_OFFSET - current) / slope)
+            elif slope < 0:
+                predictions.append((MIN_OFFSET - current) / slope)
+        return min(predictions) if predictions else None
+
+    def due_tokens(self):
+        """Return tokens which should be re-based now."""
+        due = []
+        for token, history in self.__history.items():
+            current = max(abs(offset) for offset in history[-1][2])
+            blocks = self.blocks_to_overflow(token)
+            if current >= self.threshold or (
+                    blocks is not None and blocks <= self.horizon):
+                due.append(token)
+        return due
+
+    def plan(self):
+        """Plan re-bases grouped by compact data array.
+
+        :return: OrderedDict of array index to tokens to re-base, by array
+            index
+        """
+        arrays = {}
+        for token in self.due_tokens():
+            array_idx = self.token_indices[token].array_idx
+            arrays.setdefault(array_idx, []).append(token)
+        return OrderedDict(
+            (array_idx, arrays[array_idx]) for array_idx in sorted(arrays))
+
+    def execute(self, pricing, rates):
+        """Re-base due tokens in one setBaseRate transaction.
+
+        setBaseRate writes whole compact data arrays, every listed token of
+        the re-based arrays is sent so their compact values are kept.
+
+        :arg pricing: ConversionRatesContract of the tokens
+        :arg dict rates: token address to its current (buy, sell) rates,
+            needed for every listed token of the re-based arrays
+        :return: the transaction hash, None if nothing is due
+        :raise ValueError: if rates of a token of the arrays are missing
+        """
+        arrays = self.plan()
+        if not arrays:
+            return None
+
+        tokens = [token for token in pricing.get_listed_tokens()
+                  if pricing.get_token_indices(token).array_idx in arrays]
+        missing = [token for token in tokens if token not in rates]
+        if missing:
+            raise ValueError('missing rates of {}'.format(missing))
+
+        due = [token for array_tokens in arrays.values()
+               for token in array_tokens]
+        return pricing.set_rates(
+            tokens,
+            [rates[token][0] for token in tokens],
+            [rates[token][1] for token in tokens],
+            rebase_tokens=due
+        )
+
+
+def _slope(xs, ys):
+    n = len(xs)
+    if n < 2:
+        return 0
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    var = sum((x - mean_x) ** 2 for x in xs)
+    if var == 0:
+        return 0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var
+
+
+def simulate(price_series, token_indices, planner=None, quiet_interval=10):
+    """Simulate rate updates of recorded prices and count setBaseRate usage.
+
+    Every block of the series updates all its tokens in one transaction. If
+    a planner is given, it re-bases due tokens every quiet_interval blocks in
+    a separate transaction.
+
+    :arg list(dict) price_series: per block, token address to (buy, sell)
+        rates
+    :arg dict token_indices: token address to TokenIndex
+    :arg planner: RebasePlanner sharing token_indices, None to simulate
+        without proactive re-basing
+    :arg int quiet_interval: number of blocks between planner runs
+    :return: SimulationResult
+    """
+    bases = {}
+    updates = base_rate_updates = rebase_updates = gas = 0
+
+    for block, rates in enumerate(price_series):
+        if planner is not None and block and block % quiet_interval == 0:
+            due = [token for token in planner.due_tokens()
+                   if token in rates]
+            if due:
+                for token in due:
+                    bases[token] = rates[token]
+                arrays = set(token_indices[token].array_idx for token in due)
+                rebase_updates += 1
+                gas += estimate_rate_update_gas(len(due), len(arrays))
+
+        base_changed = 0
+        for token, (buy, sell) in rates.items():
+            base_buy, base_sell = bases.get(token, (0, 0))
+            compact_buy = get_compact_data(buy, base_buy)
+            compact_sell = get_compact_data(sell, base_sell)
+            if compact_buy.base_changed or compact_sell.base_changed:
+                base_changed += 1
+                base_buy, base_sell = buy, sell
+                bases[token] = (buy, sell)
+            if planner is not None:
+                planner.observe(token, block, base_buy, base_sell, buy, sell)
+
+        if rates:
+            arrays = set(token_indices[token].array_idx for token in rates)
+            updates += 1
+            base_rate_updates += 1 if base_changed else 0
+            gas += estimate_rate_update_gas(base_changed, len(arrays))
+
+    return SimulationResult(len(price_series), updates + rebase_updates,
+                            base_rate_updates, rebase_updates, gas)
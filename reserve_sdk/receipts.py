@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+from concurrent import futures
+
+from hexbytes import HexBytes
+
+from .error import TransactionFailed, TransactionTimeout
+from .utils import batch_request, format_receipt
+
+
+class TxBatch:
+    """TxBatch is the handle of transactions tracked together."""
+
+    def __init__(self, tx_hashes, tx_futures):
+        """Create a TxBatch of given transactions and their futures."""
+        self.tx_hashes = tx_hashes
+        self.futures = tx_futures
+
+    def done(self):
+        """Return true if every transaction is confirmed or failed."""
+        return all(f.done() for f in self.futures)
+
+    def wait(self, timeout=None):
+        """Wait for every transaction to be confirmed or failed.
+
+        :return: true if all transactions are done
+        """
+        done, _ = futures.wait(self.futures, timeout)
+        return len(done) == len(self.futures)
+
+    def result(self, timeout=None):
+        """Wait for the transactions and return their receipts.
+
+        :return: list of receipts in transactions order, None for the failed
+            ones
+        """
+        self.wait(timeout)
+        return [None if f.exception(0) else f.result(0)
+                for f in self.futures]
+
+    def failures(self):
+        """Return failures of the done transactions.
+
+        :return: dict of transaction hash to the raised exception
+        """
+        return {
+            tx_hash: f.exception(0)
+            for tx_hash, f in zip(self.tx_hashes, self.futures)
+            if f.done() and f.exception(0) is not None
+        }
+
+
+class ReceiptTracker:
+    """ReceiptTracker waits for transaction receipts in a single thread.
+
+    All outstanding transactions are polled together at most once per block,
+    in one batched request with an HTTPProvider.
+    """
+
+    def __init__(self, w3, confirmations=0, timeout=180, poll_interval=1):
+        """Create a ReceiptTracker.
+
+        :arg w3: web3 instance
+        :arg int confirmations: number of blocks mined on top of the
+            transaction block before it is confirmed
+        :arg int timeout: default time to wait for a transaction, in seconds
+        :arg float poll_interval: time between two polls, in seconds
+        """
+        self.w3 = w3
+        self.confirmations = confirmations
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.__lock = threading.Lock()
+        self.__pending = {}
+        self.__last_block = None
+        self.__thread = None
+
+    def track(self, tx_hash, timeout=None):
+        """Track a transaction.
+
+        :arg tx_hash: the transaction hash
+        :arg int timeout: time to wait for confirmation, default to the
+            tracker timeout
+        :return: concurrent.futures.Future resolved with the receipt, or
+            failed with TransactionFailed or TransactionTimeout
+        """
+        tx_hash = HexBytes(tx_hash).hex()
+        deadline = time.time() + (timeout or self.timeout)
+        with self.__lock:
+            if tx_hash not in self.__pending:
+                self.__pending[tx_hash] = (futures.Future(), deadline)
+            future = self.__pending[tx_hash][0]
+            # poll new transactions without waiting for the next block
+            self.__last_block = None
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run,
+                                                 daemon=True)
+                self.__thread.start()
+        return future
+
+    def track_async(self, tx_hash, timeout=None, loop=None):
+        """Track a transaction and return an asyncio future."""
+        return asyncio.wrap_future(self.track(tx_hash, timeout), loop=loop)
+
+    def track_many(self, tx_hashes, timeout=None):
+        """Track transactions together.
+
+        :return: TxBatch of the transactions
+        """
+        return TxBatch(list(tx_hashes),
+                       [self.track(tx_hash, timeout) for tx_hash in tx_hashes])
+
+    def poll(self):
+        """Poll receipts of outstanding transactions once.
+
+        Receipts are requested only if a new block was mined since the last
+        poll, or new transactions are tracked.
+        """
+        block = self.w3.eth.blockNumber
+        with self.__lock:
+            pending = dict(self.__pending)
+            poll_receipts = block != self.__last_block
+            self.__last_block = block
+
+        receipts = [None] * len(pending)
+        if poll_receipts:
+            receipts = batch_request(
+                self.w3, 'eth_getTransactionReceipt',
+                [[tx_hash] for tx_hash in pending], format_receipt)
+
+        now = time.time()
+        resolved = []
+        for (tx_hash, (future, deadline)), receipt in zip(
+                pending.items(), receipts):
+            if isinstance(receipt, Exception):
+                receipt = None
+            if receipt is not None and receipt['blockNumber'] is not None \
+                    and block >= receipt['blockNumber'] + self.confirmations:
+                if receipt['status'] == 0:
+                    future.set_exception(TransactionFailed(receipt))
+                else:
+                    future.set_result(receipt)
+            elif now > deadline:
+                future.set_exception(TransactionTimeout(tx_hash))
+            else:
+                continue
+            resolved.append(tx_hash)
+
+        with self.__lock:
+            for tx_hash in resolved:
+                del self.__pending[tx_hash]
+
+    def __expire(self):
+        now = time.time()
+        with self.__lock:
+            for tx_hash, (future, deadline) in list(self.__pending.items()):
+                if now > deadline:
+                    future.set_exception(TransactionTimeout(tx_hash))
+                    del self.__pending[tx_hash]
+
+    def __run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                # connection errors are retried on the next poll
+                self.__expire()
+            with self.__lock:
+                if not self.__pending:
+                    self.__thread = None
+                    return
+            time.sleep(self.poll_interval)
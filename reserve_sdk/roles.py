@@ -0,0 +1,130 @@
+import threading
+import time
+
+from eth_utils import event_abi_to_log_topic
+from web3 import Web3
+from web3.utils.events import get_event_data
+
+# Events changing the roles of a contract.
+ROLE_EVENTS = (
+    'OperatorAdded', 'AlerterAdded', 'TransferAdminPending', 'AdminClaimed')
+
+
+class RoleCache:
+    """RoleCache keeps the admin, pending admin, operators and alerters of a
+    contract in memory.
+
+    The roles are read once, then updated from the role events of contract,
+    polled through a log filter at most once per sync_interval.
+    """
+
+    def __init__(self, w3, contract, sync_interval=1):
+        """Create a RoleCache and read the current roles.
+
+        :arg w3: web3 instance
+        :arg contract: the web3 contract
+        :arg float sync_interval: time between two polls of role events, in
+            seconds
+        """
+        self.w3 = w3
+        self.contract = contract
+        self.sync_interval = sync_interval
+        self.__lock = threading.RLock()
+        self.__event_abis = {
+            event_abi_to_log_topic(abi): abi for abi in contract.abi
+            if abi['type'] == 'event' and abi['name'] in ROLE_EVENTS
+        }
+        self.__filter = None
+        self.__last_sync = 0
+        self.reload()
+
+    def reload(self):
+        """Read the roles from contract and poll role events from there."""
+        with self.__lock:
+            block = self.w3.eth.blockNumber
+            functions = self.contract.functions
+            self.__admin = functions.admin().call(block_identifier=block)
+            self.__pending_admin = functions.pendingAdmin().call(
+                block_identifier=block)
+            self.__operators = functions.getOperators().call(
+                block_identifier=block)
+            self.__alerters = functions.getAlerters().call(
+                block_identifier=block)
+            self.__filter = self.w3.eth.filter({
+                'address': self.contract.address,
+                'fromBlock': block + 1,
+                'topics': [[Web3.toHex(topic) for topic in self.__event_abis]],
+            })
+            self.__last_sync = time.time()
+
+    def sync(self):
+        """Apply role events emitted since the last sync.
+
+        The roles are read again if the log filter is lost by the node.
+        """
+        with self.__lock:
+            try:
+                logs = self.__filter.get_new_entries()
+            except ValueError:
+                self.reload()
+                return
+            self.__last_sync = time.time()
+            pending_admin_block = None
+            for log in sorted(logs, key=lambda log: (
+                    log['blockNumber'], log['logIndex'])):
+                abi = self.__event_abis.get(log['topics'][0])
+                if abi is None:
+                    continue
+                event = get_event_data(abi, log)
+                args = event['args']
+                if event['event'] == 'OperatorAdded':
+                    self.__update(self.__operators, args['newOperator'],
+                                  args['isAdd'])
+                elif event['event'] == 'AlerterAdded':
+                    self.__update(self.__alerters, args['newAlerter'],
+                                  args['isAdd'])
+                else:
+                    if event['event'] == 'AdminClaimed':
+                        self.__admin = args['newAdmin']
+                    # TransferAdminPending carries the replaced pending
+                    # admin, the new one is read at the event block
+                    pending_admin_block = log['blockNumber']
+            if pending_admin_block is not None:
+                self.__pending_admin = \
+                    self.contract.functions.pendingAdmin().call(
+                        block_identifier=pending_admin_block)
+
+    @staticmethod
+    def __update(addresses, address, is_add):
+        if is_add and address not in addresses:
+            addresses.append(address)
+        elif not is_add and address in addresses:
+            addresses.remove(address)
+
+    def __synced(self):
+        if time.time() - self.__last_sync >= self.sync_interval:
+            self.sync()
+
+    def admin(self):
+        """Return the admin address."""
+        with self.__lock:
+            self.__synced()
+            return self.__admin
+
+    def pending_admin(self):
+        """Return the pending admin address."""
+        with self.__lock:
+            self.__synced()
+            return self.__pending_admin
+
+    def operators(self):
+        """Return the operator addresses."""
+        with self.__lock:
+            self.__synced()
+            return list(self.__operators)
+
+    def alerters(self):
+        """Return the alerter addresses."""
+        with self.__lock:
+            self.__synced()
+            return list(self.__alerters)
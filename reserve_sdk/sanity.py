@@ -0,0 +1,118 @@
+import threading
+from concurrent import futures
+
+# Precision of rates, 10**18 is a rate of 1.
+PRECISION = 10**18
+
+
+def midpoint_sanity_rate(buy, sell, slack_bps=0):
+    """Return the sanity rate of a token, in ETH wei per token, between its
+    buy and sell rates.
+
+    :arg int buy: token wei per ETH
+    :arg int sell: ETH wei per token
+    :arg int slack_bps: the midpoint is raised by slack_bps basis points
+    """
+    buy_price = PRECISION * PRECISION // buy
+    return (buy_price + sell) * (10000 + slack_bps) // 20000
+
+
+class SanitySync:
+    """SanitySync keeps sanity rates of tokens close to their rates.
+
+    Sanity rates are derived from the rates being set, only the tokens whose
+    sanity rate drifted more than threshold_bps from the current one are
+    sent, in one setSanityRates transaction. The threshold should stay well
+    under the reasonable diff of the tokens, trades fail sanity checks past
+    it.
+
+    The pricing contract set_rates keeps the last failure of a sanity update
+    in last_error, the rates are sent regardless.
+    """
+
+    def __init__(self, sanity, slack_bps=0, threshold_bps=50,
+                 max_workers=4):
+        """Create a SanitySync.
+
+        :arg sanity: the SanityRatesContract
+        :arg int slack_bps: raise of the derived rates over the midpoint of
+            buy and sell rates, in basis points
+        :arg int threshold_bps: drift of a sanity rate to send a new one, in
+            basis points
+        :arg int max_workers: number of current sanity rates read
+            concurrently
+        """
+        self.sanity = sanity
+        self.slack_bps = slack_bps
+        self.threshold_bps = threshold_bps
+        self.executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.last_tx_hash = None
+        self.last_error = None
+        self.__lock = threading.Lock()
+        self.__rates = {}
+
+    def drifted(self, tokens, buy_rates, sell_rates):
+        """Return the tokens whose sanity rate drifted, and their new sanity
+        rates.
+
+        Current sanity rates are read once, then the rates sent are used.
+        Tokens with a zero rate are skipped.
+
+        :return: (tokens, sanity rates) lists
+        """
+        with self.__lock:
+            unknown = [token for token in tokens if token not in self.__rates]
+        functions = self.sanity.contract.functions
+        rates = self.executor.map(
+            lambda token: self.sanity.read(functions.tokenRate(token)),
+            unknown)
+        with self.__lock:
+            self.__rates.update(zip(unknown, rates))
+            current = [self.__rates[token] for token in tokens]
+
+        drifted_tokens, drifted_rates = [], []
+        for token, buy, sell, rate in zip(
+                tokens, buy_rates, sell_rates, current):
+            if not buy or not sell:
+                continue
+            new_rate = midpoint_sanity_rate(buy, sell, self.slack_bps)
+            if abs(new_rate - rate) * 10000 > rate * self.threshold_bps:
+                drifted_tokens.append(token)
+                drifted_rates.append(new_rate)
+        return drifted_tokens, drifted_rates
+
+    def sync(self, tokens, buy_rates, sell_rates):
+        """Send sanity rates of the drifted tokens.
+
+        :return: the transaction hash, or None if no rate drifted
+        """
+        return self.send(*self.drifted(tokens, buy_rates, sell_rates))
+
+    def send(self, tokens, rates):
+        """Send sanity rates of tokens, as returned by drifted.
+
+        The rates are assumed set until the transaction fails.
+
+        :return: the transaction hash, or None if tokens is empty
+        """
+        if not tokens:
+            return None
+        tx_hash = self.sanity.set_sanity_rates(tokens, rates)
+        with self.__lock:
+            self.__rates.update(zip(tokens, rates))
+        self.sanity.track(tx_hash).add_done_callback(
+            self.__callback(tokens, rates))
+        self.last_tx_hash = tx_hash
+        return tx_hash
+
+    def __callback(self, tokens, rates):
+        """Return a receipt callback forgetting the rates of a failed
+        transaction, they are read again next time."""
+        def callback(future):
+            if future.exception() is None:
+                return
+            with self.__lock:
+                for token, rate in zip(tokens, rates):
+                    if self.__rates.get(token) == rate:
+                        del self.__rates[token]
+        return callback
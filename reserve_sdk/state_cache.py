@@ -0,0 +1,104 @@
+import json
+import sqlite3
+import threading
+
+
+# Token state fields kept by the cache.
+BASE_RATES = 'base_rates'
+CONTROL_INFO = 'control_info'
+QTY_STEP_FUNCTION = 'qty_step_function'
+IMBALANCE_STEP_FUNCTION = 'imbalance_step_function'
+
+
+class StateCache:
+    """StateCache persists the state of conversion rates contracts to a SQLite
+    database, so a restarted process does not need to read it again.
+
+    Token indices never change once a token is listed and are always valid.
+    Other token state is stored with the block number it was set at, readers
+    decide how old a value they accept.
+    """
+
+    def __init__(self, path):
+        """Open or create a state cache.
+
+        :arg str path: the database file path, ':memory:' for a cache not
+            persisted
+        """
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(path, check_same_thread=False)
+        with self.__lock, self.__conn:
+            self.__conn.execute(
+                'CREATE TABLE IF NOT EXISTS token_indices ('
+                'contract TEXT, token TEXT, array_idx INTEGER, '
+                'field_idx INTEGER, PRIMARY KEY (contract, token))'
+            )
+            self.__conn.execute(
+                'CREATE TABLE IF NOT EXISTS token_state ('
+                'contract TEXT, token TEXT, field TEXT, block INTEGER, '
+                'value TEXT, PRIMARY KEY (contract, token, field))'
+            )
+
+    def load_token_indices(self, contract):
+        """Return the cached token indices of a contract.
+
+        :arg str contract: the conversion rates contract address
+        :return: dict of token address to (array index, field index)
+        """
+        with self.__lock:
+            rows = self.__conn.execute(
+                'SELECT token, array_idx, field_idx FROM token_indices '
+                'WHERE contract = ?', (contract,)
+            ).fetchall()
+        return {token: (arr, field) for token, arr, field in rows}
+
+    def save_token_indices(self, contract, token_indices):
+        """Store token indices of a contract.
+
+        :arg str contract: the conversion rates contract address
+        :arg dict token_indices: token address to (array index, field index)
+        """
+        with self.__lock, self.__conn:
+            self.__conn.executemany(
+                'INSERT OR REPLACE INTO token_indices VALUES (?, ?, ?, ?)',
+                [(contract, token, arr, field)
+                 for token, (arr, field) in token_indices.items()]
+            )
+
+    def save_token_state(self, contract, token, field, value, block):
+        """Store a token state field.
+
+        :arg str contract: the conversion rates contract address
+        :arg str token: the token address
+        :arg str field: one of BASE_RATES, CONTROL_INFO, QTY_STEP_FUNCTION,
+            IMBALANCE_STEP_FUNCTION
+        :arg value: the JSON serializable value
+        :arg int block: the block number the value is valid from
+        """
+        with self.__lock, self.__conn:
+            self.__conn.execute(
+                'INSERT OR REPLACE INTO token_state VALUES (?, ?, ?, ?, ?)',
+                (contract, token, field, block, json.dumps(value))
+            )
+
+    def load_token_state(self, contract, field, min_block=0):
+        """Return a state field of all tokens of a contract.
+
+        :arg str contract: the conversion rates contract address
+        :arg str field: the state field
+        :arg int min_block: values set before this block are ignored
+        :return: dict of token address to the (block, value) tuple
+        """
+        with self.__lock:
+            rows = self.__conn.execute(
+                'SELECT token, block, value FROM token_state '
+                'WHERE contract = ? AND field = ? AND block >= ?',
+                (contract, field, min_block)
+            ).fetchall()
+        return {token: (block, json.loads(value))
+                for token, block, value in rows}
+
+    def close(self):
+        """Close the database connection."""
+        with self.__lock:
+            self.__conn.close()
@@ -0,0 +1,202 @@
+"""Local chain fixtures for tests, simulations and backtests.
+
+A ReserveFixture deploys a reserve, test tokens and liquidity once on an
+eth_tester chain, then reverts the chain to that state between scenarios::
+
+    fixture = ReserveFixture(num_tokens=3)
+    with fixture.scenario() as reserve:
+        reserve.pricing.set_rates(fixture.tokens, buy_rates, sell_rates)
+
+eth_tester, with py-evm, is required: pip install reserve_sdk[testing]
+"""
+import contextlib
+import json
+import os
+import time
+
+import eth_tester
+from eth_tester import EthereumTester, PyEVMBackend
+from web3 import Web3, EthereumTesterProvider
+
+from .contract import Reserve, TokenSpec
+from .contract_code import ContractCode
+from .deployer import Deployer
+from .imbalance import ETH_ADDRESS
+from .utils import call_contract, deploy_contract, token_wei
+
+__erc20_token_code_file_path = os.path.join(os.path.dirname(__file__),
+                                            'erc20_token_code.json')
+with open(__erc20_token_code_file_path) as f:
+    __erc20_token_code = json.load(f)
+
+# Code of the ERC20 token, with 18 decimals, deployed by fixtures.
+ERC20_TOKEN_CODE = ContractCode(
+    __erc20_token_code['abi'],
+    __erc20_token_code['bytecode']
+)
+# The default eth_tester block gas limit does not fit the reserve contracts.
+GAS_LIMIT = 10000000
+
+
+class ReserveFixture:
+    """ReserveFixture is a reserve deployed once on a local chain.
+
+    The test accounts play these roles:
+
+        * accounts[0]: admin of the reserve contracts, owns the tokens, also
+          operator of the pricing contract to list tokens in one batch
+        * accounts[1]: network, allowed to trade with the reserve
+        * accounts[2]: operator of the reserve contracts
+        * accounts[3]: alerter of the reserve contracts
+
+    Tokens are listed with flat step functions and initial rates, the
+    reserve holds token_liquidity of every token and eth_liquidity ETH, the
+    network account holds token_liquidity of every token too and allows the
+    reserve to take them.
+    """
+
+    def __init__(self, num_tokens=3, token_liquidity=10**6, eth_liquidity=100,
+                 rates=(500, 0.002)):
+        """Deploy the reserve and tokens and take a snapshot of the chain.
+
+        :arg int num_tokens: number of test tokens listed
+        :arg int token_liquidity: tokens given to the reserve and the network
+            account, in token units
+        :arg int eth_liquidity: ETH given to the reserve
+        :arg tuple rates: initial (buy, sell) rates of the tokens, in token
+            units
+        """
+        start = time.time()
+        pyevm = eth_tester.backends.pyevm.main
+        default_gas_limit = pyevm.GENESIS_GAS_LIMIT
+        pyevm.GENESIS_GAS_LIMIT = GAS_LIMIT
+        try:
+            backend = PyEVMBackend()
+        finally:
+            pyevm.GENESIS_GAS_LIMIT = default_gas_limit
+        self.tester = EthereumTester(backend)
+        self.provider = EthereumTesterProvider(self.tester)
+        self.w3 = Web3(self.provider)
+        self.accounts = [self.w3.eth.account.privateKeyToAccount(key.to_hex())
+                         for key in backend.account_keys]
+        admin, network, operator, alerter = self.accounts[:4]
+        self.admin, self.network = admin, network
+        self.operator, self.alerter = operator, alerter
+
+        self.addresses = Deployer(self.provider, admin).deploy(
+            network.address)
+        reserve = Reserve(self.provider, admin, self.addresses)
+        for contract in (reserve.fund, reserve.pricing, reserve.sanity):
+            contract.add_operator(operator.address)
+            contract.add_alerter(alerter.address)
+        reserve.pricing.add_operator(admin.address)
+        reserve.pricing.set_valid_rate_duration_in_blocks(10**6)
+        reserve.fund.enable_trade()
+
+        self.tokens = [
+            deploy_contract(self.w3, admin, ERC20_TOKEN_CODE,
+                            ['T{}'.format(i), 'T{}'.format(i), 18])
+            for i in range(num_tokens)
+        ]
+        flat = ([token_wei(10**6, 18)], [0], [token_wei(10**6, 18)], [0])
+        initial_rates = (token_wei(rates[0], 18), token_wei(rates[1], 18))
+        batch = reserve.pricing.add_new_tokens([
+            TokenSpec(token, token_wei(0.0001, 18),
+                      token_wei(token_liquidity, 18),
+                      token_wei(token_liquidity * 10, 18),
+                      flat, flat, initial_rates)
+            for token in self.tokens
+        ])
+        failures = batch.failures()
+        for tx_hash in batch.tx_hashes:
+            if tx_hash in failures:
+                raise failures[tx_hash]
+
+        liquidity = token_wei(token_liquidity, 18)
+        for token in self.tokens:
+            functions = self.w3.eth.contract(
+                address=token, abi=ERC20_TOKEN_CODE.abi).functions
+            call_contract(self.w3, admin, functions.transfer(
+                self.addresses.reserve, liquidity))
+            call_contract(self.w3, admin, functions.transfer(
+                network.address, liquidity))
+            call_contract(self.w3, network, functions.approve(
+                self.addresses.reserve, liquidity))
+        self.w3.eth.sendTransaction({
+            'from': admin.address, 'to': self.addresses.reserve,
+            'value': token_wei(eth_liquidity, 18)})
+
+        self.__snapshot = self.tester.take_snapshot()
+        self.reserve = self.connect(operator)
+        self.setup_seconds = time.time() - start
+        self.__reset_seconds = []
+
+    def trade(self, token, amount, buy=True):
+        """Trade with the reserve from the network account, at its current
+        rate.
+
+        :arg str token: the token address
+        :arg int amount: ETH wei paid to buy tokens, or token wei sold
+        :arg bool buy: true to buy tokens from the reserve
+        :return: the transaction hash
+        """
+        pricing = self.reserve.pricing
+        if buy:
+            src, dest = ETH_ADDRESS, token
+            rate = pricing.get_buy_rate(token, amount)
+        else:
+            src, dest = token, ETH_ADDRESS
+            rate = pricing.get_sell_rate(token, amount)
+        func = self.reserve.fund.contract.functions.trade(
+            src, amount, dest, self.network.address, rate, True)
+        params = {'from': self.network.address,
+                  'value': amount if buy else 0}
+        params['gas'] = func.estimateGas(params)
+        params['nonce'] = self.w3.eth.getTransactionCount(
+            self.network.address)
+        signed_tx = self.w3.eth.account.signTransaction(
+            func.buildTransaction(params), self.network.privateKey)
+        return self.w3.eth.sendRawTransaction(signed_tx.rawTransaction)
+
+    def connect(self, account):
+        """Return a new Reserve signing transactions with account."""
+        return Reserve(self.provider, account, self.addresses)
+
+    def reset(self):
+        """Revert the chain to its state right after setup.
+
+        The reserve attribute is replaced, as nonces and states kept in
+        memory by the previous one do not match the chain anymore.
+        """
+        start = time.time()
+        if not self.tester.auto_mine_transactions:
+            self.tester.enable_auto_mine_transactions()
+        self.tester.revert_to_snapshot(self.__snapshot)
+        self.reserve = self.connect(self.operator)
+        self.__reset_seconds.append(time.time() - start)
+        return self.reserve
+
+    @contextlib.contextmanager
+    def scenario(self):
+        """Run a scenario from the state after setup.
+
+        The operator Reserve is given to the scenario and the chain is reset
+        when it ends.
+        """
+        try:
+            yield self.reserve
+        finally:
+            self.reset()
+
+    def timings(self):
+        """Return the setup time and the reset times, in seconds.
+
+        :return: dict with setup, resets, reset_mean and reset_max keys
+        """
+        resets = self.__reset_seconds
+        return {
+            'setup': self.setup_seconds,
+            'resets': len(resets),
+            'reset_mean': sum(resets) / len(resets) if resets else None,
+            'reset_max': max(resets) if resets else None,
+        }
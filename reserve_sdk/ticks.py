@@ -0,0 +1,301 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+from .contract import RateBatch, get_compact_data
+
+
+def rate_of_compact(base, compact):
+    """Return a rate whose compact data against base is given compact byte.
+
+    The rate is half a step away from the step boundary, so the truncation
+    of get_compact_data gives back compact.
+    """
+    offset = compact - 256 if compact >= 128 else compact
+    if offset == 0:
+        return base
+    sign = 1 if offset > 0 else -1
+    return base + base * (2 * offset + sign) // 2000
+
+
+class _TokenRates:
+    """Compact data last sent for a token, and its current rates."""
+
+    __slots__ = ('index', 'base_buy', 'base_sell', 'compact_buy',
+                 'compact_sell', 'buy', 'sell')
+
+    def __init__(self, index, base_buy, base_sell, compact_buy,
+                 compact_sell):
+        self.index = index
+        self.base_buy = base_buy
+        self.base_sell = base_sell
+        self.compact_buy = compact_buy
+        self.compact_sell = compact_sell
+        self.buy = rate_of_compact(base_buy, compact_buy)
+        self.sell = rate_of_compact(base_sell, compact_sell)
+
+
+def _sent_of(rates):
+    """Return the base rates and compact data last sent of _TokenRates."""
+    return (rates.base_buy, rates.base_sell, rates.compact_buy,
+            rates.compact_sell)
+
+
+class TickFilter:
+    """TickFilter turns a stream of price ticks into per-block RateBatch.
+
+    Ticks are (token, buy, sell) rates. Only the last tick of a token in a
+    block counts, and it is dropped if its compact data, computed with the
+    rounding of the contract, gives the same base rates and bytes14 content
+    as the last ones sent. A compact data array is sent whole, tokens sharing
+    an array with an updated token are sent again with their current rates
+    to keep their compact bytes.
+
+    A batch is assumed sent once returned, every batch is then to be
+    confirmed with ack once its update is included, or given back with
+    reject if it is not sent or fails. A rejected batch restores the compact
+    data last sent of its tokens, and its changed tokens are pending again.
+    A batch neither confirmed nor given back within unconfirmed_timeout is
+    assumed set.
+    """
+
+    def __init__(self, pricing, state, poll_interval=1,
+                 unconfirmed_timeout=60):
+        """Create a TickFilter.
+
+        :arg pricing: ConversionRatesContract the batches are sent to
+        :arg state: ReserveState of the reserve, from Reserve.load_state
+        :arg float poll_interval: time between two reads of the latest block
+            number, in seconds
+        :arg float unconfirmed_timeout: time a batch can be given back with
+            reject, in seconds
+        """
+        self.pricing = pricing
+        self.poll_interval = poll_interval
+        self.unconfirmed_timeout = unconfirmed_timeout
+        self.__lock = threading.RLock()
+        self.__pending = OrderedDict()
+        self.__unconfirmed = OrderedDict()
+        self.__block = None
+        self.__last_poll = 0
+        self.__stats = dict.fromkeys((
+            'ticks', 'superseded', 'unchanged', 'changed', 'companions',
+            'batches'), 0)
+        self.reload(state)
+
+    def reload(self, state):
+        """Replace the base rates and compact data of tokens by the on-chain
+        ones, ticks not sent yet are kept and batches not confirmed are
+        forgotten.
+
+        :arg state: ReserveState of the reserve
+        """
+        with self.__lock:
+            self.__tokens = OrderedDict()
+            self.__arrays = {}
+            self.__unconfirmed = OrderedDict()
+            for token, token_state in state.tokens.items():
+                self.__tokens[token] = _TokenRates(
+                    token_state.index, token_state.base_buy,
+                    token_state.base_sell, token_state.compact_buy % 256,
+                    token_state.compact_sell % 256)
+                self.__arrays.setdefault(
+                    token_state.index.array_idx, []).append(token)
+
+    def push(self, token, buy, sell):
+        """Add a tick, it replaces the previous one of token not sent yet.
+
+        :raise ValueError: if token is not listed
+        """
+        with self.__lock:
+            if token not in self.__tokens:
+                raise ValueError('token {} not listed'.format(token))
+            self.__stats['ticks'] += 1
+            if token in self.__pending:
+                self.__stats['superseded'] += 1
+            self.__pending[token] = (buy, sell)
+
+    def flush(self):
+        """Return the RateBatch of the compact data arrays changed by the
+        pending ticks, or None if none is changed.
+
+        The batch is to be passed to ack or reject.
+        """
+        with self.__lock:
+            pending, self.__pending = self.__pending, OrderedDict()
+            if not pending:
+                return None
+            tokens = list(pending)
+            candidates = RateBatch(tokens, [pending[t][0] for t in tokens],
+                                   [pending[t][1] for t in tokens])
+            known = [self.__tokens[token] for token in tokens]
+            get_compact_data(candidates, ([k.base_buy for k in known],
+                                          [k.base_sell for k in known]))
+
+            arrays = set()
+            for i, token in enumerate(tokens):
+                rates = known[i]
+                rates.buy, rates.sell = pending[token]
+                if candidates.base_changed[i] or \
+                        candidates.compact_buy[i] != rates.compact_buy or \
+                        candidates.compact_sell[i] != rates.compact_sell:
+                    self.__stats['changed'] += 1
+                    arrays.add(rates.index.array_idx)
+                else:
+                    self.__stats['unchanged'] += 1
+            if not arrays:
+                return None
+
+            sent = [token for array_idx in sorted(arrays)
+                    for token in self.__arrays[array_idx]]
+            known = [self.__tokens[token] for token in sent]
+            batch = RateBatch(sent, [k.buy for k in known],
+                              [k.sell for k in known])
+            get_compact_data(batch, ([k.base_buy for k in known],
+                                     [k.base_sell for k in known]))
+            previous = [_sent_of(rates) for rates in known]
+            for i, rates in enumerate(known):
+                rates.base_buy = batch.base_buy[i]
+                rates.base_sell = batch.base_sell[i]
+                rates.compact_buy = batch.compact_buy[i]
+                rates.compact_sell = batch.compact_sell[i]
+            # the batch is kept as its id is the key
+            self.__expire_unconfirmed()
+            self.__unconfirmed[id(batch)] = (
+                batch, previous, [_sent_of(rates) for rates in known],
+                time.time())
+            self.__stats['companions'] += len(sent) - sum(
+                1 for token in sent if token in pending)
+            self.__stats['batches'] += 1
+            return batch
+
+    def ack(self, batch):
+        """Confirm a batch returned by flush was set on chain."""
+        with self.__lock:
+            self.__unconfirmed.pop(id(batch), None)
+
+    def reject(self, batch):
+        """Give back a batch returned by flush that was not set on chain.
+
+        The compact data of its tokens is restored, unless a later batch sent
+        them again, and the current rates of the tokens changed by the batch
+        are pending again, unless a newer tick is.
+        """
+        with self.__lock:
+            self.__expire_unconfirmed()
+            unconfirmed = self.__unconfirmed.pop(id(batch), None)
+            if unconfirmed is None:
+                return
+            _, previous, sent, _ = unconfirmed
+            for token, old, new in zip(batch.tokens, previous, sent):
+                rates = self.__tokens[token]
+                if _sent_of(rates) != new:
+                    continue
+                (rates.base_buy, rates.base_sell, rates.compact_buy,
+                 rates.compact_sell) = old
+                if old != new and token not in self.__pending:
+                    self.__pending[token] = (rates.buy, rates.sell)
+
+    def __expire_unconfirmed(self):
+        """Forget the batches returned for longer than
+        unconfirmed_timeout, they are assumed set."""
+        deadline = time.time() - self.unconfirmed_timeout
+        while self.__unconfirmed:
+            entry = next(iter(self.__unconfirmed.values()))
+            if entry[3] > deadline:
+                break
+            self.__unconfirmed.popitem(last=False)
+
+    def unconfirmed(self):
+        """Return the number of batches not confirmed nor given back."""
+        with self.__lock:
+            self.__expire_unconfirmed()
+            return len(self.__unconfirmed)
+
+    def block_advanced(self):
+        """Return true if a block was mined since the last call, the latest
+        block number is read at most once per poll_interval.
+        """
+        with self.__lock:
+            if time.time() - self.__last_poll < self.poll_interval:
+                return False
+            self.__last_poll = time.time()
+            block = self.pricing.w3.eth.blockNumber
+            advanced = self.__block is not None and block != self.__block
+            self.__block = block
+            return advanced
+
+    def filter(self, ticks):
+        """Generate a RateBatch per block from ticks.
+
+        The pending ticks are sent with the first tick of the next block,
+        and when ticks end. Every batch is to be passed to ack or reject.
+
+        :arg ticks: iterable of (token, buy, sell) ticks
+        """
+        for tick in ticks:
+            if self.block_advanced():
+                batch = self.flush()
+                if batch is not None:
+                    yield batch
+            self.push(*tick)
+        batch = self.flush()
+        if batch is not None:
+            yield batch
+
+    def filter_async(self, ticks, loop=None):
+        """Return an asynchronous iterator of a RateBatch per block, as
+        filter does for an asynchronous iterable of ticks.
+
+        :return: TickStream
+        """
+        return TickStream(self, ticks, loop)
+
+    def stats(self):
+        """Return tick counts and the share of ticks not sent.
+
+        :return: dict of ticks, superseded (replaced by a later tick in the
+            same block), unchanged (same compact data as sent), changed,
+            companions (tokens sent for sharing an array), batches and
+            suppression_ratio
+        """
+        with self.__lock:
+            stats = dict(self.__stats)
+        ticks = stats['ticks']
+        stats['suppression_ratio'] = \
+            1 - stats['changed'] / ticks if ticks else None
+        return stats
+
+
+class TickStream:
+    """TickStream is the asynchronous iterator of TickFilter.filter_async.
+
+    The latest block number is read in the default executor of loop.
+    """
+
+    def __init__(self, tick_filter, ticks, loop=None):
+        self.tick_filter = tick_filter
+        self.loop = loop or asyncio.get_event_loop()
+        self.__ticks = ticks.__aiter__()
+        self.__done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.__done:
+            try:
+                tick = await self.__ticks.__anext__()
+            except StopAsyncIteration:
+                self.__done = True
+                batch = self.tick_filter.flush()
+            else:
+                batch = None
+                if await self.loop.run_in_executor(
+                        None, self.tick_filter.block_advanced):
+                    batch = self.tick_filter.flush()
+                self.tick_filter.push(*tick)
+            if batch is not None:
+                return batch
+        raise StopAsyncIteration
@@ -1,21 +1,37 @@
 import binascii
+import json
 
+from web3 import HTTPProvider
+from web3.middleware.pythonic import receipt_formatter
+from web3.utils.datastructures import AttributeDict
+from web3.utils.request import make_post_request
 
-def call_contract(w3, account, func):
+
+def call_contract(w3, account, func, nonce=None, gas=None, on_signed=None):
     """Send transaction to execute smart contract function.
 
     Args:
         w3: web3 instance
         account: local account
         func: the smart contract function
+        nonce: the transaction nonce, read from chain if not given
+        gas: the gas limit, estimated from the account if not given
+        on_signed: function called with the signed transaction before it
+            is broadcast
 
     Returns transaction hash.
     """
+    if nonce is None:
+        nonce = w3.eth.getTransactionCount(account.address)
+    if gas is None:
+        gas = func.estimateGas({'from': account.address})
     tx = func.buildTransaction({
-        'nonce': w3.eth.getTransactionCount(account.address),
-        'gas': func.estimateGas()
+        'nonce': nonce,
+        'gas': gas
     })
     signed_tx = w3.eth.account.signTransaction(tx, account.privateKey)
+    if on_signed is not None:
+        on_signed(signed_tx)
     tx_hash = w3.eth.sendRawTransaction(signed_tx.rawTransaction)
     return tx_hash
 
@@ -48,3 +64,56 @@ def hexlify(arr):
 
 def token_wei(value, decimals):
     return int(value * 10**decimals)
+
+
+def batch_request(w3, method, params_list, formatter=None):
+    """Send many JSON-RPC requests of the same method.
+
+    With an HTTPProvider, all requests are sent in one JSON-RPC batch. The
+    batched results are not processed by web3 middlewares, the formatter is
+    applied to them instead. Other providers get one request per params,
+    through web3 middlewares.
+
+    Args:
+        w3: web3 instance
+        method: the JSON-RPC method
+        params_list: list of request params
+        formatter: function applied to raw batched results
+
+    Returns list of results, or exceptions for failed requests, in params
+    order.
+    """
+    provider = w3.providers[0]
+    if len(w3.providers) > 1 or not isinstance(provider, HTTPProvider):
+        results = []
+        for params in params_list:
+            try:
+                results.append(w3.manager.request_blocking(method, params))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    if not params_list:
+        return []
+    request_data = json.dumps([
+        {'jsonrpc': '2.0', 'method': method, 'params': params, 'id': idx}
+        for idx, params in enumerate(params_list)
+    ]).encode()
+    raw_response = make_post_request(
+        provider.endpoint_uri, request_data, **provider.get_request_kwargs())
+
+    results = [None] * len(params_list)
+    for response in json.loads(raw_response.decode()):
+        if 'error' in response:
+            result = ValueError(response['error'])
+        elif response['result'] is None or formatter is None:
+            result = response['result']
+        else:
+            result = formatter(response['result'])
+        results[response['id']] = result
+    return results
+
+
+def format_receipt(receipt):
+    """Format a raw transaction receipt as returned by web3."""
+    return AttributeDict.recursive(receipt_formatter(receipt))
@@ -0,0 +1,98 @@
+import functools
+import threading
+import time
+from concurrent import futures
+
+from web3 import Web3
+
+
+@functools.lru_cache(maxsize=4096)
+def withdraw_key(token, address):
+    """Return the approvedWithdrawAddresses key of a (token, address) pair."""
+    return Web3.soliditySha3(['address', 'address'], [token, address])
+
+
+class WithdrawApprovals:
+    """WithdrawApprovals keeps withdraw approvals of a reserve contract in
+    memory.
+
+    Approvals are read once per (token, address) pair, then updated from
+    WithdrawAddressApproved events polled through a log filter at most once
+    per sync_interval.
+    """
+
+    def __init__(self, w3, contract, sync_interval=1, max_workers=4):
+        """Create an empty WithdrawApprovals.
+
+        :arg w3: web3 instance
+        :arg contract: the web3 reserve contract
+        :arg float sync_interval: time between two polls of approval events,
+            in seconds
+        :arg int max_workers: number of approvals read concurrently
+        """
+        self.w3 = w3
+        self.contract = contract
+        self.sync_interval = sync_interval
+        self.executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.__lock = threading.RLock()
+        self.__approvals = {}
+        self.__filter = None
+        self.__last_sync = 0
+
+    def sync(self):
+        """Apply approval events emitted since the last sync.
+
+        Known approvals are dropped if the log filter is lost by the node.
+        """
+        with self.__lock:
+            if self.__filter is None:
+                return
+            try:
+                entries = self.__filter.get_new_entries()
+            except ValueError:
+                self.__approvals.clear()
+                self.__filter = None
+                return
+            self.__last_sync = time.time()
+            for event in sorted(entries, key=lambda e: (
+                    e['blockNumber'], e['logIndex'])):
+                args = event['args']
+                self.__approvals[args['token'], args['addr']] = \
+                    args['approve']
+
+    def matrix(self, addresses, tokens):
+        """Return withdraw approvals of every address for every token.
+
+        Approvals not known yet are read concurrently at the same block.
+
+        :arg list(str) addresses: the destination addresses
+        :arg list(str) tokens: the token addresses
+        :return: list of rows, one per address, of booleans, one per token
+        """
+        addresses = [Web3.toChecksumAddress(a) for a in addresses]
+        tokens = [Web3.toChecksumAddress(t) for t in tokens]
+        with self.__lock:
+            if time.time() - self.__last_sync >= self.sync_interval:
+                self.sync()
+            unknown = [(token, address) for address in addresses
+                       for token in tokens
+                       if (token, address) not in self.__approvals]
+            if unknown:
+                block = self.w3.eth.blockNumber
+                if self.__filter is None:
+                    self.__filter = self.contract.events \
+                        .WithdrawAddressApproved.createFilter(
+                            fromBlock=block + 1)
+                    self.__last_sync = time.time()
+                functions = self.contract.functions
+                for pair, approved in zip(unknown, self.executor.map(
+                        lambda pair: functions.approvedWithdrawAddresses(
+                            withdraw_key(*pair)
+                        ).call(block_identifier=block), unknown)):
+                    self.__approvals[pair] = approved
+            return [[self.__approvals[token, address] for token in tokens]
+                    for address in addresses]
+
+    def is_approved(self, address, token):
+        """Return true if address is allowed to withdraw token."""
+        return self.matrix([address], [token])[0][0]
@@ -26,6 +26,8 @@ REQUIRED = [
 
 # What packages are optional?
 EXTRAS = {
+    'numpy': ['numpy'],
+    'testing': ['eth-tester[py-evm]'],
 }
 
 # The rest you shouldn't have to touch too much :)
@@ -0,0 +1,133 @@
+import unittest
+
+from reserve_sdk.accounts import AccountPool
+from reserve_sdk.error import AccountNotOperator, WithdrawRejected
+from reserve_sdk.testing import ReserveFixture
+from reserve_sdk.utils import token_wei
+
+
+def test_account_pool_lanes():
+    pool = AccountPool(['a', 'b', 'c'])
+    assert pool.lane(4) == 1
+    assert pool.account_for('0x0000000000000000000000000000000000000005') \
+        == 'c'
+
+
+class TestAccountPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # two compact data arrays
+        cls.fixture = ReserveFixture(num_tokens=15)
+
+    def tearDown(self):
+        self.fixture.reset()
+
+    def connect_pool(self):
+        fixture = self.fixture
+        second = fixture.accounts[4]
+        admin = fixture.connect(fixture.admin)
+        admin.pricing.add_operator(second.address)
+        admin.fund.add_operator(second.address)
+        reserve = fixture.connect(fixture.operator)
+        pool = reserve.enable_account_pool([fixture.operator, second])
+        return reserve, pool
+
+    def test_enable_rejects_non_operator(self):
+        fixture = self.fixture
+        reserve = fixture.connect(fixture.operator)
+        with self.assertRaises(AccountNotOperator) as cm:
+            reserve.enable_account_pool(
+                [fixture.operator, fixture.accounts[4]])
+        self.assertEqual(cm.exception.addresses, [fixture.accounts[4].address])
+        self.assertIsNone(reserve.pricing.account_pool)
+        self.assertIsNone(reserve.fund.account_pool)
+
+    def test_set_rates_by_array(self):
+        fixture = self.fixture
+        w3 = fixture.w3
+        tokens = fixture.tokens
+        reserve, pool = self.connect_pool()
+        buy_rates = [token_wei(510, 18)] * 15
+        sell_rates = [token_wei(0.0021, 18)] * 15
+        fixture.tester.disable_auto_mine_transactions()
+
+        tx_hashes = reserve.pricing.set_rates(tokens, buy_rates, sell_rates)
+
+        # one transaction per array, both pending in the same block
+        self.assertEqual(len(tx_hashes), 2)
+        senders = [w3.eth.getTransaction(tx_hash)['from']
+                   for tx_hash in tx_hashes]
+        self.assertEqual(senders, [pool.account_for(0).address,
+                                   pool.account_for(1).address])
+        fixture.tester.mine_blocks()
+        blocks = [w3.eth.getTransactionReceipt(tx_hash)['blockNumber']
+                  for tx_hash in tx_hashes]
+        self.assertEqual(blocks[0], blocks[1])
+        for token in (tokens[0], tokens[14]):
+            self.assertEqual(reserve.pricing.get_buy_rate(token, 10**16),
+                             token_wei(510, 18))
+
+    def test_step_functions_by_token(self):
+        fixture = self.fixture
+        w3 = fixture.w3
+        tokens = fixture.tokens[:4]
+        reserve, pool = self.connect_pool()
+        step_function = ([token_wei(100, 18)], [-10],
+                         [token_wei(100, 18)], [-10])
+
+        batch = reserve.pricing.set_step_functions(
+            qty_step_functions={token: step_function for token in tokens})
+
+        self.assertEqual(batch.failures(), {})
+        for token, tx_hash in zip(tokens, batch.tx_hashes):
+            self.assertEqual(w3.eth.getTransaction(tx_hash)['from'],
+                             pool.account_for(token).address)
+        self.assertEqual(
+            reserve.pricing.get_step_functions(tokens[:1])[tokens[0]],
+            [list(points) for points in step_function])
+
+    def test_withdraw_many_checks_sending_accounts(self):
+        fixture = self.fixture
+        reserve, pool = self.connect_pool()
+        second = fixture.accounts[4]
+        fixture.connect(fixture.admin).fund.remove_operator(second.address)
+        # sent by different accounts
+        tokens = fixture.tokens[2:4]
+        dest = fixture.accounts[4].address
+
+        with self.assertRaises(WithdrawRejected) as cm:
+            reserve.fund.withdraw_many(
+                [(token, 1, dest) for token in tokens])
+
+        # only the withdrawal sent by the removed operator lacks the role
+        for idx, token in enumerate(tokens):
+            if pool.account_for(token).address == second.address:
+                reason = 'account is not operator'
+            else:
+                reason = 'destination not approved'
+            self.assertEqual(cm.exception.rejected[idx], reason)
+
+    def test_pool_estimates_gas_from_sending_accounts(self):
+        fixture = self.fixture
+        w3 = fixture.w3
+        tokens = fixture.tokens
+        self.connect_pool()
+        admin = fixture.connect(fixture.admin)
+        dest = fixture.accounts[4].address
+        for token in tokens[2:4]:
+            admin.fund.approve_withdraw_address(dest, token)
+        # the account of the reserve is no operator, only the pool is
+        reserve = fixture.connect(fixture.alerter)
+        reserve.enable_account_pool([fixture.operator, fixture.accounts[4]])
+
+        tx_hashes = reserve.pricing.set_rates(
+            tokens, [token_wei(510, 18)] * 15, [token_wei(0.0021, 18)] * 15)
+        batch = reserve.fund.withdraw_many(
+            [(token, token_wei(1, 18), dest) for token in tokens[2:4]])
+
+        for tx_hash in tx_hashes:
+            self.assertEqual(
+                w3.eth.getTransactionReceipt(tx_hash)['status'], 1)
+        batch.wait()
+        self.assertEqual(batch.failures(), {})
@@ -1,6 +1,9 @@
 import random
 
-from reserve_sdk.contract import get_compact_data, build_compact_price
+from reserve_sdk.contract import (
+    get_compact_data, build_compact_price, split_prices, plan_rate_update,
+    RateBatch)
+from reserve_sdk.gas import estimate_rate_update_gas, OVERFLOW_GAS
 from reserve_sdk.contract import TokenIndex, CompactData
 from reserve_sdk.utils import hexlify
 
@@ -81,3 +84,149 @@ def test_build_compact_price():
         hexlify([0, 0, 0, 0, 0, 0, 0, 0, 0, 26, 0, 0, 0, 0]),
         hexlify([0, 0, 0, 0, 0, 27, 28, 0, 0, 0, 0, 0, 0, 0])
     ])
+
+
+def test_split_prices_along_compact_arrays():
+    token_indices = {
+        str(i): TokenIndex(i // 14, i % 14) for i in range(42)
+    }
+    prices = [
+        {
+            'token': str(i),
+            'compact_buy': 1,
+            'compact_sell': 1,
+            'base_changed': i in (3, 17)
+        } for i in range(42)
+    ]
+
+    max_gas = estimate_rate_update_gas(1, 1)
+    chunks = split_prices(prices, token_indices, max_gas)
+
+    assert [[token_indices[p['token']].array_idx for p in chunk]
+            for chunk in chunks] == [[0] * 14, [1] * 14, [2] * 14]
+
+    max_gas = estimate_rate_update_gas(2, 2)
+    chunks = split_prices(prices, token_indices, max_gas)
+    assert [len(chunk) for chunk in chunks] == [28, 14]
+
+    chunks = split_prices(prices, token_indices, 10**9)
+    assert len(chunks) == 1 and len(chunks[0]) == 42
+
+
+def test_plan_rate_update_rebases_tokens_near_overflow():
+    token_indices = {'a': TokenIndex(0, 0), 'b': TokenIndex(0, 1),
+                     'c': TokenIndex(1, 0)}
+    rates = {'a': (200, 20), 'b': (110, 11), 'c': (101, 10)}
+    prices = [
+        {'token': 'a', 'base_buy': 200, 'base_sell': 20,
+         'compact_buy': 0, 'compact_sell': 0, 'base_changed': True},
+        {'token': 'b', 'base_buy': 100, 'base_sell': 10,
+         'compact_buy': 100, 'compact_sell': 100, 'base_changed': False},
+        {'token': 'c', 'base_buy': 100, 'base_sell': 10,
+         'compact_buy': 10, 'compact_sell': 0, 'base_changed': False},
+    ]
+
+    plan = plan_rate_update(prices, rates, token_indices)
+
+    assert plan.strategy == 'rebase'
+    # re-basing costs gas now, to avoid a later overflow
+    assert plan.gas_saved == (estimate_rate_update_gas(1, 2) -
+                              estimate_rate_update_gas(2, 2))
+    assert plan.gas_saved < 0
+    assert plan.expected_overflow_cost == 0
+    assert len(plan.updates) == 1
+    rebased = {p['token']: p for p in plan.updates[0]}
+    assert rebased['b']['base_changed']
+    assert rebased['b']['base_buy'] == 110
+    assert rebased['b']['compact_buy'] == 0
+    assert not rebased['c']['base_changed']
+
+
+def test_plan_rate_update_keeps_compact_arrays_in_one_transaction():
+    token_indices = {'a': TokenIndex(0, 0), 'c': TokenIndex(1, 0)}
+    rates = {'a': (200, 20), 'c': (101, 10)}
+    prices = [
+        {'token': 'a', 'base_buy': 200, 'base_sell': 20,
+         'compact_buy': 0, 'compact_sell': 0, 'base_changed': True},
+        {'token': 'c', 'base_buy': 100, 'base_sell': 10,
+         'compact_buy': 10, 'compact_sell': 0, 'base_changed': False},
+    ]
+
+    plan = plan_rate_update(prices, rates, token_indices)
+
+    # a second transaction for the compact only array never saves gas
+    assert plan.strategy == 'single'
+    assert plan.updates == [prices]
+    assert plan.gas == estimate_rate_update_gas(1, 2)
+
+
+def test_plan_rate_update_without_base_change():
+    token_indices = {'a': TokenIndex(0, 0)}
+    prices = [{'token': 'a', 'base_buy': 100, 'base_sell': 10,
+               'compact_buy': 120, 'compact_sell': 0, 'base_changed': False}]
+
+    plan = plan_rate_update(prices, {'a': (112, 10)}, token_indices)
+
+    assert plan.strategy == 'single'
+    assert plan.updates == [prices]
+    assert plan.gas_saved == 0
+    # the token stays about to overflow
+    assert plan.expected_overflow_cost == OVERFLOW_GAS
+
+
+def test_rate_batch_compact_data_matches_single_rates():
+    tokens = ['a', 'b', 'c', 'd']
+    buy_rates = [505, 700, 100, 0]
+    sell_rates = [10, 9, 100, 0]
+    base_buy = [500, 500, 0, 0]
+    base_sell = [10, 10, 100, 0]
+
+    batch = get_compact_data(RateBatch(tokens, buy_rates, sell_rates),
+                             (base_buy, base_sell))
+
+    for i, token in enumerate(tokens):
+        buy = get_compact_data(buy_rates[i], base_buy[i])
+        sell = get_compact_data(sell_rates[i], base_sell[i])
+        assert batch.base_buy[i] == buy.base
+        assert batch.compact_buy[i] == buy.compact
+        assert batch.base_sell[i] == sell.base
+        assert batch.compact_sell[i] == sell.compact
+        assert batch.base_changed[i] == (
+            buy.base_changed or sell.base_changed)
+
+
+def test_rate_batch_matches_price_lists():
+    token_indices = {
+        str(i): TokenIndex(i // 14, i % 14) for i in range(30)
+    }
+    prices = [
+        {
+            'token': str(i),
+            'base_buy': 100 + i,
+            'base_sell': 10 + i,
+            'compact_buy': (i * 7) % 256,
+            'compact_sell': (i * 11) % 256,
+            'base_changed': i in (3, 17)
+        } for i in range(30)
+    ]
+    batch = RateBatch.from_prices(prices)
+    rates = {p['token']: (p['base_buy'] + 1, p['base_sell'] + 1)
+             for p in prices}
+    batch.buy_rates = [rates[token][0] for token in batch.tokens]
+    batch.sell_rates = [rates[token][1] for token in batch.tokens]
+
+    assert batch.to_prices() == prices
+    assert build_compact_price(batch, token_indices) == build_compact_price(
+        prices, token_indices)
+
+    max_gas = estimate_rate_update_gas(1, 1)
+    assert [chunk.to_prices() for chunk in split_prices(
+        batch, token_indices, max_gas)] == split_prices(
+            prices, token_indices, max_gas)
+
+    plan = plan_rate_update(batch, None, token_indices)
+    list_plan = plan_rate_update(prices, rates, token_indices)
+    assert plan.strategy == list_plan.strategy
+    assert plan.gas == list_plan.gas
+    assert [update.to_prices() for update in plan.updates] == \
+        list_plan.updates
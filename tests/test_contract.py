@@ -1,15 +1,20 @@
 import unittest
-import json
-import os
 from functools import wraps
 import random
+import time
 
 from eth_tester import EthereumTester, PyEVMBackend
 from web3 import Web3, EthereumTesterProvider
 
-from reserve_sdk import Deployer, ReserveContract, Reserve
+from reserve_sdk import (
+    Deployer, ReserveContract, ConversionRatesContract, Reserve)
 from reserve_sdk.utils import deploy_contract, token_wei
-from reserve_sdk.contract_code import ContractCode
+from reserve_sdk.contract import TokenSpec, RateBatch, get_compact_data
+from reserve_sdk.error import WithdrawRejected
+from reserve_sdk.read_cache import ReadCache
+from reserve_sdk.receipts import ReceiptTracker
+from reserve_sdk.state_cache import StateCache, BASE_RATES, CONTROL_INFO
+from reserve_sdk.testing import ERC20_TOKEN_CODE
 from reserve_sdk.token import Token
 
 random.seed(0)
@@ -34,14 +39,7 @@ addresses = d.deploy(NETWORK_ADDR)
 reserve = Reserve(provider, deployer, addresses)
 
 # deploy test tokens
-token_code_file_path = os.path.join(os.path.dirname(__file__),
-                                    'erc20_token_code.json')
-
-with open(token_code_file_path) as f:
-    token_code = json.load(f)
-    erc20_token_code = ContractCode(
-        abi=token_code['abi'], bin=token_code['bytecode'])
-
+erc20_token_code = ERC20_TOKEN_CODE
 tokens = []
 for i in range(3):
     token_addr = deploy_contract(
@@ -124,6 +122,57 @@ class TestBaseContract(unittest.TestCase):
         self.contract.remove_alerter(alerter.address)
         self.assertNotIn(alerter.address, self.contract.alerters())
 
+    def test_read_cache(self):
+        cached = Reserve(provider, deployer, addresses)
+        read_cache = cached.enable_read_cache(ReadCache(block_interval=0))
+
+        self.assertEqual(cached.fund.admin(), deployer.address)
+        rpc_count = cached.fund.rpc_counter.count
+        self.assertEqual(cached.fund.admin(), deployer.address)
+        # only the latest block number is read
+        self.assertEqual(cached.fund.rpc_counter.count, rpc_count + 1)
+        self.assertEqual((read_cache.hits, read_cache.misses), (1, 1))
+
+        # results read at an explicit block number are kept
+        block = w3.eth.blockNumber
+        admin_func = cached.pricing.contract.functions.admin()
+        cached.pricing.read(admin_func, block)
+        tester.mine_blocks()
+        cached.pricing.read(admin_func, block)
+        self.assertEqual((read_cache.hits, read_cache.misses), (2, 2))
+
+        # a new block expires results of the latest block
+        self.assertEqual(cached.fund.admin(), deployer.address)
+        self.assertEqual((read_cache.hits, read_cache.misses), (2, 3))
+
+    def test_role_cache_follows_role_events(self):
+        cached = ReserveContract(provider, deployer, addresses.reserve)
+        cached.enable_role_cache(sync_interval=0)
+        self.assertTrue(cached.is_admin())
+        self.assertFalse(cached.is_operator(admin_2.address))
+
+        self.contract.add_operator(admin_2.address)
+        self.contract.add_alerter(admin_2.address)
+        self.assertTrue(cached.is_operator(admin_2.address))
+        self.assertTrue(cached.is_alerter(admin_2.address))
+        self.contract.remove_operator(admin_2.address)
+        self.contract.remove_alerter(admin_2.address)
+        self.assertEqual(cached.operators(), self.contract.operators())
+        self.assertEqual(cached.alerters(), self.contract.alerters())
+
+        self.contract.transfer_admin(admin_1.address)
+        self.assertEqual(cached.pending_admin(), admin_1.address)
+        self.contract.change_account(admin_1)
+        self.contract.claim_admin()
+        self.assertTrue(cached.is_admin(admin_1.address))
+        self.assertEqual(cached.pending_admin(),
+                         self.contract.pending_admin())
+
+        self.contract.transfer_admin(deployer.address)
+        self.contract.change_account(deployer)
+        self.contract.claim_admin()
+        self.assertTrue(cached.is_admin())
+
 
 class TestReserveContract(unittest.TestCase):
 
@@ -184,6 +233,65 @@ class TestReserveContract(unittest.TestCase):
             operator.address, token.address
         ))
 
+    def test_approved_withdraw_matrix(self):
+        cached = ReserveContract(provider, deployer, addresses.reserve)
+        dests = [admin_1.address, admin_2.address]
+        token_addresses = [token.address for token in tokens[:2]]
+        self.assertEqual(
+            cached.approved_withdraw_matrix(dests, token_addresses),
+            [[False, False], [False, False]])
+
+        self.contract.approve_withdraw_address(admin_2.address,
+                                               tokens[1].address)
+        cached.withdraw_approvals.sync_interval = 0
+        self.assertEqual(
+            cached.approved_withdraw_matrix(dests, token_addresses),
+            [[False, False], [False, True]])
+
+        # repeated checks are lookups
+        cached.withdraw_approvals.sync_interval = 3600
+        rpc_count = cached.rpc_counter.count
+        self.assertTrue(cached.withdraw_approvals.is_approved(
+            admin_2.address, tokens[1].address))
+        self.assertEqual(cached.rpc_counter.count, rpc_count)
+        self.contract.disapprove_withdraw_address(admin_2.address,
+                                                  tokens[1].address)
+
+    def test_withdraw_many(self):
+        for token in tokens[1:]:
+            self.contract.approve_withdraw_address(admin_1.address,
+                                                   token.address)
+        balances = [token.balanceOf(admin_1.address) for token in tokens]
+        withdrawer = ReserveContract(provider, operator, addresses.reserve)
+
+        batch = withdrawer.withdraw_many([
+            (tokens[1].address, 10, admin_1.address),
+            (tokens[2].address, 20, admin_1.address),
+            (tokens[1].address, 30, admin_1.address),
+        ])
+
+        self.assertTrue(batch.wait())
+        self.assertEqual(batch.failures(), {})
+        self.assertEqual(tokens[1].balanceOf(admin_1.address),
+                         balances[1] + 40)
+        self.assertEqual(tokens[2].balanceOf(admin_1.address),
+                         balances[2] + 20)
+
+        balance = withdrawer.get_balance(tokens[1].address)
+        with self.assertRaises(WithdrawRejected) as ctx:
+            withdrawer.withdraw_many([
+                (tokens[0].address, 10, admin_1.address),
+                (tokens[1].address, balance, admin_1.address),
+                (tokens[1].address, 1, admin_1.address),
+                (tokens[1].address, 1, admin_1.address),
+            ])
+        self.assertEqual(ctx.exception.rejected, {
+            0: 'destination not approved',
+            2: 'insufficient balance',
+            3: 'insufficient balance',
+        })
+        self.assertEqual(tokens[0].balanceOf(admin_1.address), balances[0])
+
     def test_withdraw_token_from_reserve(self):
         token = tokens[0]
         blc = token.balanceOf(operator.address)
@@ -433,6 +541,343 @@ class TestConversionRatesContract(unittest.TestCase):
             token_wei(500, 18) * (1 - 30 * 0.01 / 100)
         )
 
+    @role(operator)
+    def test_set_rates_split_by_gas_ceiling(self):
+        token_addresses = [token.address for token in tokens[:2]]
+        # far from other tests rates to force setting base rates
+        buy_rates = [token_wei(1000, 18), token_wei(800, 18)]
+        sell_rates = [token_wei(0.01, 18), token_wei(0.012, 18)]
+
+        tx_hashes = self.contract.set_rates(
+            token_addresses, buy_rates, sell_rates, max_gas_per_tx=500000)
+
+        self.assertEqual(len(tx_hashes), 1)
+        for token, buy, sell in zip(token_addresses, buy_rates, sell_rates):
+            self.assertEqual(self.contract.get_basic_rate(token), buy)
+            self.assertEqual(self.contract.get_basic_rate(token, False), sell)
+
+    @role(operator)
+    def test_set_rates_rebase_tokens_near_overflow(self):
+        token_addresses = [token.address for token in tokens[:2]]
+        base_buy_rates = [token_wei(700, 18), token_wei(600, 18)]
+        base_sell_rates = [token_wei(0.0014, 18), token_wei(0.0016, 18)]
+        self.contract.set_rates(
+            token_addresses, base_buy_rates, base_sell_rates)
+
+        # the first token overflows, the second one is about to overflow
+        buy_rates = [int(base_buy_rates[0] * 1.2),
+                     int(base_buy_rates[1] * 1.1)]
+        tx_hashes = self.contract.set_rates(
+            token_addresses, buy_rates, base_sell_rates, optimize_gas=True)
+
+        self.assertEqual(len(tx_hashes), 1)
+        plan = self.contract.last_rate_plan
+        self.assertEqual(plan.strategy, 'rebase')
+        # the second token is re-based, at a gas cost
+        self.assertLess(plan.gas_saved, 0)
+        self.assertEqual(plan.expected_overflow_cost, 0)
+        for token, buy in zip(token_addresses, buy_rates):
+            self.assertEqual(self.contract.get_basic_rate(token), buy)
+
+    @role(operator)
+    def test_set_rates_with_rate_batch(self):
+        token_addresses = [token.address for token in tokens[:2]]
+        # far from other tests rates to force setting base rates
+        batch = RateBatch(token_addresses,
+                          [token_wei(3000, 18), token_wei(2400, 18)],
+                          [token_wei(0.03, 18), token_wei(0.036, 18)])
+
+        self.contract.set_rates(batch)
+
+        self.assertEqual(list(batch.base_changed), [1, 1])
+        for token, buy, sell in zip(token_addresses, batch.buy_rates,
+                                    batch.sell_rates):
+            self.assertEqual(self.contract.get_basic_rate(token), buy)
+            self.assertEqual(self.contract.get_basic_rate(token, False), sell)
+
+        # a small change is set as compact data on the same base rates
+        batch = RateBatch(token_addresses,
+                          [token_wei(3030, 18), token_wei(2400, 18)],
+                          [token_wei(0.03, 18), token_wei(0.036, 18)])
+        self.contract.set_rates(batch)
+
+        self.assertEqual(list(batch.base_changed), [0, 0])
+        self.assertEqual(batch.compact_buy[0], get_compact_data(
+            token_wei(3030, 18), token_wei(3000, 18)).compact)
+        self.assertGreater(batch.compact_buy[0], 0)
+        self.assertEqual(self.contract.get_basic_rate(token_addresses[0]),
+                         token_wei(3000, 18))
+
+    @role(operator)
+    def test_state_cache_restores_token_indices(self):
+        cache = StateCache(':memory:')
+        contract = ConversionRatesContract(
+            provider, operator, addresses.conversion_rates,
+            state_cache=cache)
+        token_addresses = [token.address for token in tokens[:2]]
+        tx_hash = contract.set_rates(
+            token_addresses, [token_wei(2000, 18), token_wei(1600, 18)],
+            [token_wei(0.02, 18), token_wei(0.024, 18)])
+        # the base rates are saved from the receipt
+        contract.track(tx_hash).result()
+        deadline = time.time() + 5
+        while len(contract.base_rates) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+
+        restarted = ConversionRatesContract(
+            provider, operator, addresses.conversion_rates,
+            state_cache=cache)
+        for token in token_addresses:
+            self.assertEqual(restarted.token_indices[token],
+                             self.contract.get_token_indices(token))
+        base_rates = cache.load_token_state(addresses.conversion_rates,
+                                            BASE_RATES)
+        self.assertEqual(base_rates[token_addresses[0]][1],
+                         [token_wei(2000, 18), token_wei(0.02, 18)])
+        # set_rates uses the cached base rates
+        self.assertEqual(restarted.base_rates[token_addresses[0]],
+                         (token_wei(2000, 18), token_wei(0.02, 18)))
+        batch = RateBatch(token_addresses,
+                          [token_wei(2020, 18), token_wei(1600, 18)],
+                          [token_wei(0.02, 18), token_wei(0.024, 18)])
+        restarted.set_rates(batch)
+        self.assertEqual(list(batch.base_changed), [0, 0])
+        self.assertEqual(restarted.get_basic_rate(token_addresses[0]),
+                         token_wei(2000, 18))
+
+        # base rates set by another sender are read again
+        self.contract.set_rates(token_addresses[:1], [token_wei(3000, 18)],
+                                [token_wei(0.03, 18)])
+        batch = RateBatch(token_addresses[:1], [token_wei(2020, 18)],
+                          [token_wei(0.02, 18)])
+        restarted.set_rates(batch)
+        self.assertEqual(list(batch.base_changed), [1])
+        self.assertEqual(restarted.get_basic_rate(token_addresses[0]),
+                         token_wei(2020, 18))
+
+    @role(operator)
+    def test_load_state(self):
+        token = tokens[0]
+        self.contract.set_rates([token.address], [token_wei(3000, 18)],
+                                [token_wei(0.03, 18)])
+
+        state = reserve.load_state()
+
+        self.assertEqual(state.block_number, w3.eth.blockNumber)
+        self.assertEqual(list(state.tokens),
+                         self.contract.get_listed_tokens())
+        self.assertGreater(state.rpc_count, len(state.tokens))
+        token_state = state.tokens[token.address]
+        self.assertEqual(token_state.index,
+                         self.contract.get_token_indices(token.address))
+        self.assertTrue(token_state.listed)
+        self.assertTrue(token_state.enabled)
+        self.assertEqual(token_state.control_info.minimal_record_resolution,
+                         token_wei(0.0001, 18))
+        self.assertEqual(token_state.base_buy, token_wei(3000, 18))
+        self.assertEqual(token_state.base_sell, token_wei(0.03, 18))
+        self.assertEqual(token_state.compact_buy, 0)
+        # rates are set with the block number known when sending
+        self.assertEqual(token_state.rate_update_block, state.block_number - 1)
+
+    def test_add_new_tokens(self):
+        contract = ConversionRatesContract(
+            provider, deployer, addresses.conversion_rates)
+        contract.add_operator(deployer.address)
+        new_tokens = [
+            deploy_contract(w3, deployer, erc20_token_code,
+                            ['new{}'.format(i), 'new{}'.format(i), 18])
+            for i in range(3)
+        ]
+        listed_count = len(contract.get_listed_tokens())
+        compact_data = contract.get_compact_data(tokens[0].address)
+        step_function = ([token_wei(10, 18)], [-10],
+                         [token_wei(10, 18)], [-20])
+        control_info = (token_wei(0.0001, 18), token_wei(439.79, 18),
+                        token_wei(922.36, 18))
+
+        batch = contract.add_new_tokens([
+            TokenSpec(new_tokens[0], *control_info,
+                      qty_step_function=step_function,
+                      rates=(token_wei(400, 18), token_wei(0.0025, 18))),
+            (new_tokens[1],) + control_info,
+            (new_tokens[2],) + control_info,
+        ])
+        contract.remove_operator(deployer.address)
+
+        self.assertTrue(batch.done())
+        self.assertEqual(batch.failures(), {})
+        self.assertEqual(len(batch.tx_hashes), 11)
+        self.assertEqual(contract.get_listed_tokens()[listed_count:],
+                         new_tokens)
+        for token in new_tokens:
+            arr, field, _, _ = contract.get_compact_data(token)
+            self.assertEqual(contract.token_indices[token], (arr, field))
+        self.assertEqual(contract.get_basic_rate(new_tokens[0]),
+                         token_wei(400, 18))
+        self.assertEqual(contract.get_basic_rate(new_tokens[0], False),
+                         token_wei(0.0025, 18))
+        # qty step function sell y of the first point
+        self.assertEqual(
+            contract.get_step_function_data(new_tokens[0], 7, 0), -20)
+        # compact data of listed tokens sharing the array is kept
+        self.assertEqual(contract.get_compact_data(tokens[0].address),
+                         compact_data)
+
+    def test_add_new_tokens_timeout_caches_no_state(self):
+        cache = StateCache(':memory:')
+        contract = ConversionRatesContract(
+            provider, deployer, addresses.conversion_rates,
+            state_cache=cache)
+        # receipts are not confirmed in time
+        contract.receipt_tracker = ReceiptTracker(w3, confirmations=1000)
+        contract.add_operator(deployer.address)
+        new_token = deploy_contract(w3, deployer, erc20_token_code,
+                                    ['late', 'late', 18])
+
+        batch = contract.add_new_tokens([TokenSpec(
+            new_token, token_wei(0.0001, 18), token_wei(439.79, 18),
+            token_wei(922.36, 18),
+            rates=(token_wei(400, 18), token_wei(0.0025, 18)))],
+            timeout=0.5)
+        contract.remove_operator(deployer.address)
+
+        self.assertFalse(batch.done())
+        # the listing order is read from chain
+        self.assertEqual(list(contract.token_indices[new_token]),
+                         contract.get_compact_data(new_token)[:2])
+        self.assertNotIn(new_token, contract.base_rates)
+        for field in (BASE_RATES, CONTROL_INFO):
+            self.assertEqual(cache.load_token_state(
+                addresses.conversion_rates, field), {})
+
+    def test_set_step_functions_skips_known_curves(self):
+        contract = ConversionRatesContract(
+            provider, operator, addresses.conversion_rates)
+        token_addresses = [token.address for token in tokens[:2]]
+        curves = {
+            token: [[token_wei(50 + idx, 18), token_wei(150, 18)], [-5, -15],
+                    [token_wei(50, 18)], [-10 - idx]]
+            for idx, token in enumerate(token_addresses)
+        }
+
+        batch = contract.set_step_functions(qty_step_functions=curves)
+
+        self.assertTrue(batch.wait())
+        self.assertEqual(len(batch.tx_hashes), 2)
+        self.assertEqual(batch.failures(), {})
+        self.assertEqual(contract.get_step_functions(token_addresses),
+                         curves)
+
+        batch = contract.set_step_functions(qty_step_functions=curves)
+        self.assertEqual(batch.tx_hashes, [])
+
+        # a new instance compares with the curves on pricing contract
+        restarted = ConversionRatesContract(
+            provider, operator, addresses.conversion_rates)
+        curves[token_addresses[1]][3] = [-30]
+        batch = restarted.set_step_functions(qty_step_functions=curves)
+        self.assertTrue(batch.wait())
+        self.assertEqual(len(batch.tx_hashes), 1)
+        self.assertEqual(restarted.get_step_functions(token_addresses),
+                         curves)
+
+    @role(operator)
+    def test_read_cache_keeps_rate_semantics(self):
+        token = tokens[0].address
+        flat = ([token_wei(10**6, 18)], [0], [token_wei(10**6, 18)], [0])
+        self.contract.set_step_functions({token: flat}, {token: flat}).wait()
+        self.contract.set_rates([token], [token_wei(500, 18)],
+                                [token_wei(0.002, 18)])
+        old_block = w3.eth.blockNumber
+        self.contract.set_rates([token], [token_wei(510, 18)],
+                                [token_wei(0.002, 18)])
+        cached = ConversionRatesContract(
+            provider, operator, addresses.conversion_rates)
+        cached.enable_read_cache(ReadCache())
+
+        # the rates are read at the latest state, with or without cache
+        for block in (old_block, w3.eth.blockNumber + 1):
+            self.assertEqual(cached.get_buy_rate(token, 10**16, block),
+                             self.contract.get_buy_rate(token, 10**16, block))
+        self.assertEqual(cached.get_buy_rate(token, 10**16, old_block),
+                         token_wei(510, 18))
+
+    @role(operator)
+    def test_sample_rate_curves(self):
+        token_addresses = [token.address for token in tokens[:2]]
+        # getRate fails on tokens without step functions
+        flat = ([token_wei(10**6, 18)], [0], [token_wei(10**6, 18)], [0])
+        self.contract.set_step_functions(
+            {token: flat for token in token_addresses},
+            {token: flat for token in token_addresses}).wait()
+        self.contract.set_rates(token_addresses,
+                                [token_wei(510, 18), token_wei(610, 18)],
+                                [token_wei(0.0018, 18), token_wei(0.0019, 18)])
+        block = w3.eth.blockNumber
+        qtys = [int(0.1 * 10**18), int(0.3 * 10**18), 10**18]
+
+        curves = self.contract.sample_rate_curves(token_addresses, qtys,
+                                                  'sell', block)
+
+        self.assertEqual(len(curves), 2)
+        self.assertGreater(curves[0][0], 0)
+        for row, token in zip(curves, token_addresses):
+            self.assertEqual(
+                list(row),
+                [self.contract.get_sell_rate(token, qty, block)
+                 for qty in qtys])
+
+        # sampled rates of a block are cached
+        rpc_count = self.contract.rpc_counter.count
+        cached = self.contract.sample_rate_curves(token_addresses[1:],
+                                                  qtys[:1], 'sell', block)
+        self.assertEqual(self.contract.rpc_counter.count, rpc_count)
+        self.assertEqual(cached[0][0], curves[1][0])
+        with self.assertRaises(ValueError):
+            self.contract.sample_rate_curves(token_addresses, qtys, 'swap')
+
+    def test_rate_update_latency_metrics(self):
+        contract = ConversionRatesContract(
+            provider, operator, addresses.conversion_rates)
+        metrics = contract.enable_latency_metrics(confirmations=1)
+        # far from other tests rates to force setting base rates
+        contract.set_rates([tokens[0].address], [token_wei(5200, 18)],
+                           [token_wei(0.021, 18)])
+        tester.mine_blocks()
+
+        for _ in range(100):
+            snapshot = metrics.snapshot()
+            if snapshot['stages']['confirmed'] is not None:
+                break
+            time.sleep(0.1)
+
+        self.assertEqual(snapshot['count'], 1)
+        self.assertEqual(snapshot['pending'], 0)
+        # rates are computed at the block before the one including them
+        self.assertEqual(snapshot['blocks']['max'], 1)
+        self.assertGreater(snapshot['seconds']['max'], 0)
+        for stage in ('reads_done', 'signed', 'broadcast', 'included'):
+            self.assertLessEqual(snapshot['stages'][stage]['max'],
+                                 snapshot['stages']['confirmed']['max'])
+
+    def test_rate_update_latency_metrics_failure_before_broadcast(self):
+        contract = ConversionRatesContract(
+            provider, operator, addresses.conversion_rates)
+        metrics = contract.enable_latency_metrics(confirmations=1)
+
+        def get_token_indices(token):
+            raise ValueError(token)
+        contract.get_token_indices = get_token_indices
+        # the reads fail, nothing is sent
+        with self.assertRaises(ValueError):
+            contract.set_rates([tokens[0].address], [token_wei(500, 18)],
+                               [token_wei(0.002, 18)])
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['pending'], 0)
+        self.assertEqual(snapshot['failed'], 1)
+
     @unittest.skip('need to perform trade action')
     def test_rate_with_imbalance_step_function(self):
         pass
@@ -0,0 +1,86 @@
+import threading
+import unittest
+
+from eth_tester import EthereumTester, PyEVMBackend
+from web3 import Web3, EthereumTesterProvider
+
+from reserve_sdk import Deployer, ReserveFleet
+from reserve_sdk.testing import ERC20_TOKEN_CODE
+from reserve_sdk.utils import deploy_contract, token_wei
+
+
+NETWORK_ADDR = '0x91a502C678605fbCe581eae053319747482276b9'
+
+
+class TestReserveFleet(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        backend = PyEVMBackend()
+        provider = EthereumTesterProvider(EthereumTester(backend))
+        # eth_tester does not support concurrent requests, they are
+        # serialized while the fleet workers run concurrently
+        lock = threading.Lock()
+        make_request = provider.make_request
+
+        def locked_make_request(method, params):
+            with lock:
+                return make_request(method, params)
+        provider.make_request = locked_make_request
+        w3 = Web3(provider)
+        cls.w3 = w3
+        accounts = [w3.eth.account.privateKeyToAccount(key.to_hex())
+                    for key in backend.account_keys[:2]]
+
+        cls.token = deploy_contract(
+            w3, accounts[0], ERC20_TOKEN_CODE, ['T', 'T', 18])
+
+        # two reserves sharing the first account, one using the second
+        cls.fleet = ReserveFleet(max_workers=2)
+        owners = [accounts[0], accounts[0], accounts[1]]
+        for idx, account in enumerate(owners):
+            addresses = Deployer(provider, account).deploy(NETWORK_ADDR)
+            reserve = cls.fleet.add(str(idx), provider, account, addresses)
+            reserve.pricing.add_operator(account.address)
+            reserve.pricing.set_valid_rate_duration_in_blocks(60)
+            reserve.pricing.add_new_token(
+                token=cls.token,
+                minimal_record_resolution=token_wei(0.0001, 18),
+                max_per_block_imbalance=token_wei(439.79, 18),
+                max_total_imbalance=token_wei(922.36, 18)
+            )
+
+    def test_set_rates_for_all_reserves(self):
+        rates = {
+            name: ([self.token], [token_wei(500 + idx, 18)],
+                   [token_wei(0.00182, 18)])
+            for idx, name in enumerate(self.fleet.reserves)
+        }
+        results = self.fleet.set_rates(rates)
+
+        self.assertEqual(list(results), list(self.fleet.reserves))
+        for idx, (name, result) in enumerate(results.items()):
+            self.assertIsNone(result.error)
+            self.assertGreaterEqual(result.latency, 0)
+            self.assertEqual(
+                self.fleet.reserves[name].pricing.get_basic_rate(self.token),
+                token_wei(500 + idx, 18)
+            )
+
+        # reserves sharing an account send in the order they were added
+        txs = {name: self.w3.eth.getTransaction(result.result)
+               for name, result in results.items()}
+        self.assertEqual(txs['0']['from'], txs['1']['from'])
+        self.assertEqual(txs['1']['nonce'], txs['0']['nonce'] + 1)
+        self.assertNotEqual(txs['2']['from'], txs['0']['from'])
+
+    def test_read_reports_errors_per_reserve(self):
+        def get_balance(name, reserve):
+            if name == '1':
+                raise ValueError(name)
+            return reserve.fund.get_balance(self.token)
+
+        results = self.fleet.read(get_balance)
+        self.assertEqual(results['0'].result, 0)
+        self.assertIsInstance(results['1'].error, ValueError)
+        self.assertIsNone(results['2'].error)
@@ -0,0 +1,73 @@
+import unittest
+
+from reserve_sdk.imbalance import (
+    ImbalanceRecord, decode_imbalance_record, encode_imbalance_record,
+    SLIDING_WINDOW_SIZE)
+from reserve_sdk.testing import ReserveFixture
+from reserve_sdk.utils import token_wei
+
+
+def test_imbalance_record_round_trip():
+    record = ImbalanceRecord(-30000, 1234, 20000, 1200)
+    assert decode_imbalance_record(encode_imbalance_record(record)) == \
+        record
+
+
+class TestImbalanceTracker(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fixture = ReserveFixture(num_tokens=2)
+
+    def tearDown(self):
+        self.fixture.reset()
+
+    def test_imbalance_follows_trades(self):
+        fixture = self.fixture
+        token = fixture.tokens[0]
+        fixture.connect(fixture.admin).pricing.set_token_control_info(
+            token, token_wei(0.0001, 18), token_wei(10, 18),
+            token_wei(8, 18))
+        reserve = fixture.connect(fixture.operator)
+        tracker = reserve.enable_imbalance_tracker(
+            fixture.tokens, sync_interval=0)
+
+        fixture.trade(token, token_wei(0.01, 18))  # buy 5 tokens
+        fixture.trade(token, token_wei(3, 18), buy=False)
+        self.assertEqual(tracker.imbalance(token).total, token_wei(2, 18))
+
+        # the imbalance is counted from the last rate update, which is the
+        # latest block when rates are sent
+        fixture.tester.mine_blocks()
+        reserve.pricing.set_rates([token], [token_wei(500.5, 18)],
+                                  [token_wei(0.002, 18)])
+        fixture.trade(token, token_wei(0.006, 18))  # about 3 tokens
+
+        pricing = reserve.pricing
+        records = [decode_imbalance_record(
+            pricing.contract.functions.tokenImbalanceData(token, idx).call())
+            for idx in range(SLIDING_WINDOW_SIZE)]
+        self.assertEqual(tracker.records(token), records)
+
+        imbalance = tracker.imbalance(token)
+        self.assertGreater(imbalance.total, token_wei(2.9, 18))
+        self.assertLess(imbalance.total, token_wei(3.1, 18))
+        self.assertEqual(imbalance.block, 0)
+        self.assertEqual(imbalance.buy_headroom,
+                         token_wei(8, 18) - imbalance.total - 1)
+        self.assertEqual(imbalance.sell_headroom, token_wei(10, 18) - 1)
+
+        block = fixture.w3.eth.blockNumber + 1
+        get_rate = pricing.contract.functions.getRate
+        self.assertGreater(get_rate(
+            token, block, False, imbalance.sell_headroom).call(), 0)
+        self.assertEqual(get_rate(
+            token, block, False, imbalance.sell_headroom + 1).call(), 0)
+        # buy quantities are in ETH
+        rate = pricing.get_basic_rate(token)
+        self.assertGreater(get_rate(
+            token, block, True,
+            imbalance.buy_headroom * 10**18 // rate * 99 // 100).call(), 0)
+        self.assertEqual(get_rate(
+            token, block, True,
+            imbalance.buy_headroom * 10**18 // rate * 101 // 100).call(), 0)
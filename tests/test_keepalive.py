@@ -0,0 +1,114 @@
+import time
+import unittest
+
+from reserve_sdk.testing import ReserveFixture
+from reserve_sdk.utils import token_wei
+
+
+class TestRateKeepalive(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # two compact data arrays
+        cls.fixture = ReserveFixture(num_tokens=15)
+
+    def tearDown(self):
+        self.fixture.reset()
+
+    def test_refresh_expiring_arrays(self):
+        fixture = self.fixture
+        tokens = fixture.tokens
+        fixture.connect(fixture.admin).pricing \
+            .set_valid_rate_duration_in_blocks(20)
+        reserve = fixture.connect(fixture.operator)
+        pricing = reserve.pricing
+        functions = pricing.contract.functions
+        buy_rates = [token_wei(500 * 1.0015 ** i, 18) for i in range(15)]
+        sell_rates = [token_wei(0.002, 18)] * 15
+        pricing.set_rates(tokens, buy_rates, sell_rates)
+
+        keepalive = reserve.enable_rate_keepalive(margin_blocks=5)
+        self.assertIs(pricing.rate_keepalive, keepalive)
+        fixture.tester.mine_blocks(5)
+        pricing.set_rates(tokens[14:], buy_rates[14:], sell_rates[14:])
+        first = functions.getRateUpdateBlock(tokens[0]).call()
+        second = functions.getRateUpdateBlock(tokens[14]).call()
+        self.assertEqual(keepalive.rate_update_block(1), second)
+        self.assertEqual(keepalive.next_refresh_block(second), first + 15)
+
+        self.assertIsNone(keepalive.refresh(first + 14))
+        compact = [functions.getCompactData(token).call() for token in tokens]
+        rate = pricing.get_buy_rate(tokens[1], 10**16)
+        fixture.tester.mine_blocks(first + 15 - fixture.w3.eth.blockNumber)
+        tx_hash = keepalive.refresh()
+
+        # only the first array is sent, with its compact data unchanged
+        receipt = fixture.w3.eth.getTransactionReceipt(tx_hash)
+        self.assertEqual(receipt['status'], 1)
+        self.assertEqual(functions.getRateUpdateBlock(tokens[0]).call(),
+                         first + 15)
+        self.assertEqual(functions.getRateUpdateBlock(tokens[14]).call(),
+                         second)
+        self.assertEqual(
+            [functions.getCompactData(token).call() for token in tokens],
+            compact)
+
+        fixture.tester.mine_blocks(second + 20 - fixture.w3.eth.blockNumber)
+        block = fixture.w3.eth.blockNumber
+        self.assertEqual(pricing.get_buy_rate(tokens[1], 10**16, block), rate)
+        self.assertEqual(pricing.get_buy_rate(tokens[14], 10**16, block), 0)
+        # expired rates are left alone
+        self.assertEqual(keepalive.expiring(block), [])
+        self.assertEqual(keepalive.next_refresh_block(block), first + 30)
+
+    def test_failed_update_reads_array_again(self):
+        fixture = self.fixture
+        tokens = fixture.tokens
+        fixture.connect(fixture.admin).pricing \
+            .set_valid_rate_duration_in_blocks(20)
+        reserve = fixture.connect(fixture.operator)
+        pricing = reserve.pricing
+        functions = pricing.contract.functions
+        pricing.set_rates(tokens, [token_wei(500, 18)] * 15,
+                          [token_wei(0.002, 18)] * 15)
+        first = functions.getRateUpdateBlock(tokens[0]).call()
+        keepalive = reserve.enable_rate_keepalive(margin_blocks=5)
+        compact = [functions.getCompactData(token).call() for token in tokens]
+
+        # not operator, the update fails on chain
+        other = fixture.connect(fixture.accounts[4]).pricing
+        block = fixture.w3.eth.blockNumber
+        tx_hash = other.call_contract_func(
+            functions.setCompactData(['0x' + '11' * 14], ['0x' + '11' * 14],
+                                     block, [0]),
+            gas=100000)
+        keepalive.observe(['0x' + '11' * 14], ['0x' + '11' * 14], [0],
+                          block, tx_hash)
+
+        for _ in range(100):
+            if keepalive.rate_update_block(0) == first:
+                break
+            time.sleep(0.1)
+        self.assertEqual(keepalive.rate_update_block(0), first)
+        fixture.tester.mine_blocks(first + 15 - fixture.w3.eth.blockNumber)
+        keepalive.refresh()
+        self.assertEqual(functions.getRateUpdateBlock(tokens[0]).call(),
+                         first + 15)
+        self.assertEqual(
+            [functions.getCompactData(token).call() for token in tokens],
+            compact)
+
+    def test_background_errors_are_kept(self):
+        keepalive = self.fixture.reserve.enable_rate_keepalive()
+        keepalive.poll_interval = 0.01
+
+        def refresh():
+            raise ValueError('refresh')
+        keepalive.refresh = refresh
+        keepalive.start()
+        for _ in range(100):
+            if keepalive.last_error is not None:
+                break
+            time.sleep(0.01)
+        keepalive.stop()
+        self.assertIsInstance(keepalive.last_error, ValueError)
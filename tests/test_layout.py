@@ -0,0 +1,44 @@
+from reserve_sdk.contract import TokenIndex
+from reserve_sdk.layout import (
+    plan_token_layout, predict_token_indices, update_cost)
+
+
+TOKENS = ['token{}'.format(i) for i in range(30)]
+
+
+def test_predict_token_indices_after_listed_tokens():
+    indices = predict_token_indices(TOKENS[:3], listed_count=13)
+    assert indices == {
+        'token0': TokenIndex(0, 13),
+        'token1': TokenIndex(1, 0),
+        'token2': TokenIndex(1, 1),
+    }
+
+
+def test_plan_token_layout_keeps_co_updated_tokens_together():
+    hot = TOKENS[15:25]
+    warm = TOKENS[2:6]
+    frequencies = {token: 10 for token in hot}
+    frequencies.update({token: 1 for token in warm})
+
+    order = plan_token_layout(TOKENS, frequencies, groups=[warm, hot],
+                              listed_count=9)
+    indices = predict_token_indices(order, listed_count=9)
+
+    assert sorted(order) == sorted(TOKENS)
+    assert update_cost(hot, indices).arrays == 1
+    assert update_cost(warm, indices).arrays == 1
+
+    # listing in the given order spreads both groups over two arrays
+    naive = predict_token_indices(TOKENS, listed_count=9)
+    assert update_cost(hot, naive).arrays == 2
+    assert update_cost(warm, naive).arrays == 2
+    assert update_cost(hot, naive).gas > update_cost(hot, indices).gas
+    assert (update_cost(hot, naive).calldata_gas >
+            update_cost(hot, indices).calldata_gas)
+
+
+def test_plan_token_layout_splits_groups_larger_than_an_array():
+    order = plan_token_layout(TOKENS[:20], groups=[TOKENS[:20]])
+    indices = predict_token_indices(order)
+    assert update_cost(TOKENS[:20], indices).arrays == 2
@@ -0,0 +1,40 @@
+import io
+import json
+
+from reserve_sdk.metrics import (
+    LatencyMetrics, percentile, READS_DONE, INCLUDED, CONFIRMED)
+
+
+def test_percentile_by_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 0) == 1
+    assert percentile([3], 90) == 3
+
+
+def test_latency_metrics_snapshot():
+    metrics = LatencyMetrics(window=2)
+    for idx, tokens in enumerate([['a'], ['a', 'b'], ['b']]):
+        trace = metrics.begin(tokens)
+        trace.mark(READS_DONE, 100)
+        trace.mark(INCLUDED, 101 + idx)
+    trace.mark(CONFIRMED, 110)
+    metrics.failure(metrics.begin(['c']))
+    metrics.begin(['c'])
+
+    snapshot = metrics.snapshot()
+    # the first update is out of the window
+    assert snapshot['count'] == 2
+    assert snapshot['pending'] == 1
+    assert snapshot['failed'] == 1
+    assert snapshot['blocks'] == {'p50': 2, 'p90': 3, 'p99': 3, 'max': 3}
+    assert snapshot['stages'][CONFIRMED]['max'] >= \
+        snapshot['seconds']['max']
+
+    assert metrics.snapshot(tokens=['a'])['count'] == 1
+    assert metrics.snapshot(tokens=['c'])['seconds'] is None
+
+    fp = io.StringIO()
+    metrics.export(fp)
+    assert json.loads(fp.getvalue())['count'] == 2
@@ -0,0 +1,86 @@
+import pytest
+
+from reserve_sdk.contract import TokenIndex
+from reserve_sdk.rebase import RebasePlanner, simulate
+
+
+def trending_series(num_tokens, num_blocks, drift):
+    """Rates of tokens moving by drift thousandths every block."""
+    return [
+        {
+            str(token): (int(10**18 * (1 + drift / 1000) ** block),
+                         int(10**15 * (1 - drift / 1000) ** block))
+            for token in range(num_tokens)
+        } for block in range(num_blocks)
+    ]
+
+
+def test_planner_predicts_overflow():
+    planner = RebasePlanner({'a': TokenIndex(0, 0)})
+    for block in range(5):
+        rate = 1000 + 10 * block
+        planner.observe('a', block, 1000, 1000, rate, 1000)
+
+    # offset is 40 and grows by 10 every block
+    assert abs(planner.blocks_to_overflow('a') - 8.7) < 0.01
+    assert planner.plan() == {0: ['a']}
+
+
+def test_planner_ignores_stable_tokens():
+    planner = RebasePlanner({'a': TokenIndex(0, 0)})
+    for block in range(5):
+        planner.observe('a', block, 1000, 1000, 1010, 990)
+
+    assert planner.blocks_to_overflow('a') is None
+    assert planner.due_tokens() == []
+
+
+def test_simulate_moves_base_rate_updates_to_quiet_blocks():
+    token_indices = {str(token): TokenIndex(token // 14, token % 14)
+                     for token in range(20)}
+    series = trending_series(20, 200, 2)
+
+    reactive = simulate(series, token_indices)
+    planned = simulate(series, token_indices,
+                       RebasePlanner(token_indices), quiet_interval=10)
+
+    assert reactive.blocks == planned.blocks == 200
+    assert planned.rebase_updates > 0
+    # only the first update, setting the initial base rates, is left
+    assert planned.base_rate_updates == 1
+    assert planned.base_rate_updates < reactive.base_rate_updates
+
+
+class FakePricing:
+    """Pricing contract recording set_rates calls."""
+
+    def __init__(self, token_indices):
+        self.token_indices = token_indices
+        self.calls = []
+
+    def get_listed_tokens(self):
+        return list(self.token_indices)
+
+    def get_token_indices(self, token):
+        return self.token_indices[token]
+
+    def set_rates(self, tokens, buy_rates, sell_rates, rebase_tokens=None):
+        self.calls.append((tokens, buy_rates, sell_rates, rebase_tokens))
+        return '0x1'
+
+
+def test_execute_sends_every_token_of_rebased_arrays():
+    token_indices = {'a': TokenIndex(0, 0), 'b': TokenIndex(0, 1),
+                     'c': TokenIndex(1, 0)}
+    # only a is tracked, b shares its array
+    planner = RebasePlanner({'a': TokenIndex(0, 0)})
+    for block in range(5):
+        planner.observe('a', block, 1000, 1000, 1000 + 10 * block, 1000)
+    pricing = FakePricing(token_indices)
+
+    with pytest.raises(ValueError):
+        planner.execute(pricing, {'a': (1040, 1000)})
+
+    rates = {'a': (1040, 1000), 'b': (500, 2), 'c': (600, 3)}
+    assert planner.execute(pricing, rates) == '0x1'
+    assert pricing.calls == [(['a', 'b'], [1040, 500], [1000, 2], ['a'])]
@@ -0,0 +1,77 @@
+import asyncio
+import unittest
+
+from eth_tester import EthereumTester, PyEVMBackend
+from web3 import Web3, EthereumTesterProvider
+
+from reserve_sdk import Deployer
+from reserve_sdk.contract import ConversionRatesContract
+from reserve_sdk.error import TransactionFailed, TransactionTimeout
+from reserve_sdk.receipts import ReceiptTracker
+
+
+NETWORK_ADDR = '0x91a502C678605fbCe581eae053319747482276b9'
+
+
+class TestReceiptTracker(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        backend = PyEVMBackend()
+        cls.tester = EthereumTester(backend)
+        provider = EthereumTesterProvider(cls.tester)
+        cls.w3 = Web3(provider)
+        cls.admin, cls.other = [
+            cls.w3.eth.account.privateKeyToAccount(key.to_hex())
+            for key in backend.account_keys[:2]
+        ]
+        addresses = Deployer(provider, cls.admin).deploy(NETWORK_ADDR)
+        cls.contract = ConversionRatesContract(
+            provider, cls.admin, addresses.conversion_rates)
+
+    def setUp(self):
+        self.tracker = ReceiptTracker(self.w3, poll_interval=0.01)
+        self.contract.change_account(self.admin)
+
+    def test_track_many_transactions(self):
+        tx_hashes = self.contract.call_contract_funcs([
+            self.contract.contract.functions.setValidRateDurationInBlocks(
+                duration) for duration in (10, 20, 30)
+        ])
+        batch = self.tracker.track_many(tx_hashes)
+
+        receipts = batch.result(timeout=5)
+        self.assertTrue(batch.done())
+        self.assertEqual([r['transactionHash'] for r in receipts], tx_hashes)
+        self.assertEqual(batch.failures(), {})
+
+    def test_failed_transaction(self):
+        # only admin can set the duration, skip gas estimation to send it
+        self.contract.change_account(self.other)
+        tx_hash = self.contract.call_contract_func(
+            self.contract.contract.functions.setValidRateDurationInBlocks(1),
+            gas=100000
+        )
+
+        with self.assertRaises(TransactionFailed):
+            self.tracker.track(tx_hash).result(timeout=5)
+
+    def test_unknown_transaction_timeout(self):
+        future = self.tracker.track('0x' + '11' * 32, timeout=0.05)
+
+        with self.assertRaises(TransactionTimeout):
+            future.result(timeout=5)
+
+    def test_confirmation_depth_and_asyncio(self):
+        self.tracker.confirmations = 2
+        tx_hash = self.contract.set_valid_rate_duration_in_blocks(60)
+        future = self.tracker.track(tx_hash)
+        self.assertFalse(future.done())
+
+        self.tester.mine_blocks(2)
+        loop = asyncio.new_event_loop()
+        receipt = loop.run_until_complete(asyncio.wait_for(
+            self.tracker.track_async(tx_hash, loop=loop), 5, loop=loop))
+        loop.close()
+        self.assertEqual(receipt['status'], 1)
+        self.assertTrue(future.done())
@@ -0,0 +1,75 @@
+import unittest
+
+from reserve_sdk.sanity import midpoint_sanity_rate
+from reserve_sdk.testing import ReserveFixture
+from reserve_sdk.utils import token_wei
+
+
+def test_midpoint_sanity_rate():
+    # 1 ETH buys 500 tokens, 1 token sells for 0.0018 ETH
+    rate = midpoint_sanity_rate(token_wei(500, 18), token_wei(0.0018, 18))
+    assert rate == token_wei(0.0019, 18)
+    assert midpoint_sanity_rate(
+        token_wei(500, 18), token_wei(0.0018, 18), slack_bps=100
+    ) == rate * 10100 // 10000
+
+
+class TestSanitySync(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fixture = ReserveFixture(num_tokens=2)
+
+    def tearDown(self):
+        self.fixture.reset()
+
+    def test_sanity_rates_follow_rates(self):
+        reserve = self.fixture.reserve
+        tokens = self.fixture.tokens
+        w3 = self.fixture.w3
+        token_rate = reserve.sanity.contract.functions.tokenRate
+        sanity_sync = reserve.enable_sanity_sync(threshold_bps=50)
+        buy_rates = [token_wei(500, 18), token_wei(400, 18)]
+        sell_rates = [token_wei(0.0018, 18), token_wei(0.0024, 18)]
+
+        tx_hash = reserve.pricing.set_rates(tokens, buy_rates, sell_rates)
+
+        sanity_tx = w3.eth.getTransaction(sanity_sync.last_tx_hash)
+        self.assertEqual(sanity_tx['nonce'],
+                         w3.eth.getTransaction(tx_hash)['nonce'] + 1)
+        for token, buy, sell in zip(tokens, buy_rates, sell_rates):
+            self.assertEqual(reserve.sanity.read(token_rate(token)),
+                             midpoint_sanity_rate(buy, sell))
+
+        # under the threshold, no sanity rate is sent
+        sent = sanity_sync.last_tx_hash
+        reserve.pricing.set_rates(
+            tokens, [int(rate * 1.002) for rate in buy_rates], sell_rates)
+        self.assertEqual(sanity_sync.last_tx_hash, sent)
+
+        buy_rates[1] = int(buy_rates[1] * 1.05)
+        reserve.pricing.set_rates(tokens, buy_rates, sell_rates)
+        self.assertNotEqual(sanity_sync.last_tx_hash, sent)
+        self.assertEqual(sanity_sync.drifted(tokens, buy_rates, sell_rates),
+                         ([], []))
+        self.assertEqual(reserve.sanity.read(token_rate(tokens[1])),
+                         midpoint_sanity_rate(buy_rates[1], sell_rates[1]))
+
+    def test_sanity_failure_keeps_rates(self):
+        reserve = self.fixture.reserve
+        tokens = self.fixture.tokens
+        sanity_sync = reserve.enable_sanity_sync(threshold_bps=50)
+
+        def set_sanity_rates(tokens, rates):
+            raise ValueError(tokens)
+        reserve.sanity.set_sanity_rates = set_sanity_rates
+        buy_rates = [token_wei(300, 18), token_wei(200, 18)]
+        sell_rates = [token_wei(0.003, 18), token_wei(0.0048, 18)]
+
+        tx_hash = reserve.pricing.set_rates(tokens, buy_rates, sell_rates)
+
+        self.assertIsNotNone(tx_hash)
+        self.assertIsInstance(sanity_sync.last_error, ValueError)
+        self.assertIsNone(sanity_sync.last_tx_hash)
+        self.assertEqual(reserve.pricing.get_basic_rate(tokens[0]),
+                         buy_rates[0])
@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+from reserve_sdk.state_cache import StateCache, BASE_RATES, CONTROL_INFO
+
+
+CONTRACT = '0x14535eE720e329f66071B86486763Da4637034aE'
+TOKEN = '0x24535eE720e329f66071B86486763Da4637034aE'
+
+
+def test_state_persisted_across_restarts():
+    path = os.path.join(tempfile.mkdtemp(), 'state.db')
+    cache = StateCache(path)
+    cache.save_token_indices(CONTRACT, {TOKEN: (3, 9)})
+    cache.save_token_state(CONTRACT, TOKEN, BASE_RATES,
+                           [500 * 10**18, 182 * 10**13], 100)
+    cache.close()
+
+    cache = StateCache(path)
+    assert cache.load_token_indices(CONTRACT) == {TOKEN: (3, 9)}
+    assert cache.load_token_state(CONTRACT, BASE_RATES) == {
+        TOKEN: (100, [500 * 10**18, 182 * 10**13])
+    }
+    assert cache.load_token_indices(TOKEN) == {}
+
+
+def test_token_state_older_than_min_block_ignored():
+    cache = StateCache(':memory:')
+    cache.save_token_state(CONTRACT, TOKEN, CONTROL_INFO, [1, 2, 3], 100)
+
+    assert cache.load_token_state(CONTRACT, CONTROL_INFO, min_block=100)
+    assert cache.load_token_state(CONTRACT, CONTROL_INFO, min_block=101) == {}
+
+    cache.save_token_state(CONTRACT, TOKEN, CONTROL_INFO, [4, 5, 6], 200)
+    assert cache.load_token_state(CONTRACT, CONTROL_INFO, min_block=101) == {
+        TOKEN: (200, [4, 5, 6])
+    }
@@ -0,0 +1,48 @@
+import unittest
+
+from reserve_sdk.testing import ReserveFixture
+from reserve_sdk.utils import token_wei
+
+
+class TestReserveFixture(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fixture = ReserveFixture(num_tokens=2)
+
+    def test_reserve_ready_to_trade(self):
+        reserve = self.fixture.reserve
+        token = self.fixture.tokens[0]
+
+        self.assertEqual(reserve.fund.get_balance(token),
+                         token_wei(10**6, 18))
+        self.assertEqual(reserve.pricing.get_buy_rate(token, 10**17),
+                         token_wei(500, 18))
+        self.assertIn(self.fixture.operator.address,
+                      reserve.pricing.operators())
+
+    def test_scenario_changes_are_reverted(self):
+        token = self.fixture.tokens[1]
+        block = self.fixture.w3.eth.blockNumber
+
+        with self.fixture.scenario() as reserve:
+            reserve.pricing.set_rates([token], [token_wei(700, 18)],
+                                      [token_wei(0.0014, 18)])
+            self.assertEqual(reserve.pricing.get_basic_rate(token),
+                             token_wei(700, 18))
+
+        reserve = self.fixture.reserve
+        self.assertEqual(self.fixture.w3.eth.blockNumber, block)
+        self.assertEqual(reserve.pricing.get_basic_rate(token),
+                         token_wei(500, 18))
+
+        # nonces of the new reserve follow the reverted chain
+        reserve.pricing.set_rates([token], [token_wei(800, 18)],
+                                  [token_wei(0.0012, 18)])
+        self.assertEqual(reserve.pricing.get_basic_rate(token),
+                         token_wei(800, 18))
+        self.fixture.reset()
+
+        timings = self.fixture.timings()
+        self.assertGreaterEqual(timings['resets'], 2)
+        self.assertLess(timings['reset_max'], timings['setup'])
@@ -0,0 +1,158 @@
+import asyncio
+import unittest
+
+from reserve_sdk.contract import get_compact_data
+from reserve_sdk.testing import ReserveFixture
+from reserve_sdk.ticks import TickFilter, rate_of_compact
+from reserve_sdk.utils import token_wei
+
+
+def test_rate_of_compact_gives_back_compact():
+    base = token_wei(0.0018243, 18)
+    for compact in range(256):
+        if 127 <= compact <= 128:
+            continue
+        rate = rate_of_compact(base, compact)
+        assert get_compact_data(rate, base).compact == compact
+
+
+class TestTickFilter(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fixture = ReserveFixture(num_tokens=2)
+
+    def tearDown(self):
+        self.fixture.reset()
+
+    def test_drop_ticks_with_same_compact_data(self):
+        reserve = self.fixture.reserve
+        first, second = self.fixture.tokens
+        tick_filter = TickFilter(reserve.pricing, reserve.load_state())
+        buy, sell = token_wei(500, 18), token_wei(0.002, 18)
+
+        # less than the compact data step
+        tick_filter.push(first, buy + buy // 10**5, sell)
+        tick_filter.push(second, buy, sell - sell // 10**5)
+        self.assertIsNone(tick_filter.flush())
+
+        tick_filter.push(first, buy + buy // 10**5, sell)
+        tick_filter.push(first, int(buy * 1.0105), sell)
+        batch = tick_filter.flush()
+
+        # the second token shares the compact data array
+        self.assertEqual(batch.tokens, [first, second])
+        self.assertEqual(list(batch.base_changed), [0, 0])
+        self.assertEqual(list(batch.compact_buy), [10, 0])
+        self.assertEqual(list(batch.compact_sell), [0, 0])
+        reserve.pricing.set_rates(batch)
+        tick_filter.ack(batch)
+        compact = reserve.pricing.get_compact_data(first)
+        self.assertEqual(compact[2], bytes([10]))
+
+        tick_filter.push(first, int(buy * 1.0105), sell)
+        self.assertIsNone(tick_filter.flush())
+        stats = tick_filter.stats()
+        self.assertEqual(stats['ticks'], 5)
+        self.assertEqual(stats['superseded'], 1)
+        self.assertEqual(stats['changed'], 1)
+        self.assertEqual(stats['companions'], 1)
+        self.assertAlmostEqual(stats['suppression_ratio'], 4 / 5)
+
+    def test_rejected_batch_is_sent_again(self):
+        reserve = self.fixture.reserve
+        first, second = self.fixture.tokens
+        tick_filter = TickFilter(reserve.pricing, reserve.load_state())
+        buy, sell = token_wei(500, 18), token_wei(0.002, 18)
+
+        tick_filter.push(first, int(buy * 1.0105), sell)
+        rejected = tick_filter.flush()
+        tick_filter.push(second, buy, int(sell * 1.0205))
+        tick_filter.reject(rejected)
+
+        # the rejected token is pending again, along with the new tick
+        batch = tick_filter.flush()
+        self.assertEqual(batch.tokens, [first, second])
+        self.assertEqual(list(batch.compact_buy), [10, 0])
+        self.assertEqual(list(batch.compact_sell), [0, 20])
+        tick_filter.ack(batch)
+        tick_filter.push(first, int(buy * 1.0105), sell)
+        self.assertIsNone(tick_filter.flush())
+
+        # a batch rejected after a later one sent its tokens changes nothing
+        tick_filter.push(first, int(buy * 1.0305), sell)
+        older = tick_filter.flush()
+        tick_filter.push(first, int(buy * 1.0405), sell)
+        newer = tick_filter.flush()
+        tick_filter.reject(older)
+        tick_filter.ack(newer)
+        self.assertIsNone(tick_filter.flush())
+        tick_filter.push(first, int(buy * 1.0405), sell)
+        self.assertIsNone(tick_filter.flush())
+
+    def test_unconfirmed_batches_expire(self):
+        reserve = self.fixture.reserve
+        first = self.fixture.tokens[0]
+        buy, sell = token_wei(500, 18), token_wei(0.002, 18)
+        tick_filter = TickFilter(reserve.pricing, reserve.load_state())
+
+        tick_filter.push(first, int(buy * 1.0105), sell)
+        batch = tick_filter.flush()
+        self.assertEqual(tick_filter.unconfirmed(), 1)
+        tick_filter.ack(batch)
+        self.assertEqual(tick_filter.unconfirmed(), 0)
+
+        # batches never confirmed are assumed set after the timeout
+        tick_filter.unconfirmed_timeout = 0
+        for step in range(2, 5):
+            tick_filter.push(first, int(buy * (1 + step / 100 + 0.0005)),
+                             sell)
+            batch = tick_filter.flush()
+            self.assertEqual(tick_filter.unconfirmed(), 0)
+        tick_filter.reject(batch)
+        tick_filter.push(first, int(buy * 1.0405), sell)
+        self.assertIsNone(tick_filter.flush())
+
+    def test_one_batch_per_block(self):
+        reserve = self.fixture.reserve
+        token = self.fixture.tokens[0]
+        tester = self.fixture.tester
+        buy, sell = token_wei(500, 18), token_wei(0.002, 18)
+
+        def ticks():
+            for step in range(1, 4):
+                yield token, int(buy * (1 + step / 100)), sell
+                yield token, int(buy * (1 + step / 100 + 0.0055)), sell
+                tester.mine_blocks()
+
+        tick_filter = TickFilter(reserve.pricing, reserve.load_state(),
+                                 poll_interval=0)
+        batches = list(tick_filter.filter(ticks()))
+        self.assertEqual([list(batch.compact_buy) for batch in batches],
+                         [[15, 0], [25, 0], [35, 0]])
+
+        tick_filter = TickFilter(reserve.pricing, reserve.load_state(),
+                                 poll_interval=0)
+
+        class AsyncTicks:
+            def __init__(self):
+                self.ticks = ticks()
+
+            def __aiter__(self):
+                return self
+
+            async def __anext__(self):
+                try:
+                    return next(self.ticks)
+                except StopIteration:
+                    raise StopAsyncIteration
+
+        async def collect():
+            batches = []
+            async for batch in tick_filter.filter_async(AsyncTicks()):
+                batches.append(batch)
+            return batches
+
+        batches = asyncio.get_event_loop().run_until_complete(collect())
+        self.assertEqual(len(batches), 3)
+        self.assertEqual(tick_filter.stats()['superseded'], 3)